@@ -1,60 +1,95 @@
+import os
+
 import dash_bootstrap_components as dbc
 from dash import Dash, html
-from flask_caching import Cache
 
 from . import callbacks
+from .cache import (
+    RELOAD_INTERVAL,
+    cache,
+    current_snapshot,
+    start_live_timing,
+    start_workers,
+    watch_data
+)
+from .routes import PROFILE_MODE, admin, api, export, profiling, static_views
 from .components import (
-    age_pie_chart,
     collapse_button,
-    crime_bar_chart,
+    crosstab_heatmap,
+    data_stores,
     footer_toggle_button,
     footer_content,
-    gender_pie_chart,
     map_chart,
     sidebar,
+    summary_charts,
     title_comp
 )
 
-from .utils.helpers import filter_data_by_date_range
-
 # Initialization
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 server = app.server
+server.register_blueprint(export)
+server.register_blueprint(api)
+server.register_blueprint(admin)
+server.register_blueprint(static_views)
+
+# Opt-in callback profiling, nothing is hooked in when it is off
+if PROFILE_MODE:
+    server.register_blueprint(profiling)
+
+cache.init_app(server)
 
-cache = Cache(app.server, config={'CACHE_TYPE': 'simple'}) 
+# Optionally count month partitions of the data in a process pool
+if int(os.environ.get('ARREST_TRACKER_WORKERS', 0)) > 1:
+    start_workers(int(os.environ['ARREST_TRACKER_WORKERS']))
+
+# Offer live updates once the startup data is timed, without waiting for it
+start_live_timing(current_snapshot())
+
+# Optionally pick up new processed data without a restart
+if RELOAD_INTERVAL > 0:
+    watch_data(server, RELOAD_INTERVAL)
 
 
 app.title = "Arrest Tracker"
 
-# Cache the filter_data_by_date_range function
-@cache.memoize(timeout=60*60)  # Cache for 1 hour
-def cached_filter_data_by_date_range(data, start_date, end_date):
-    return filter_data_by_date_range(data, start_date, end_date)
 
+def serve_layout():
+    """
+    Build the page from the current data, so pages opened after a reload
+    get its version, prebuilt views and default charts.
+    """
+    snapshot = current_snapshot()
+    crime_bar_chart, gender_pie_chart, age_pie_chart = summary_charts(snapshot)
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col(title_comp),
+            collapse_button
+        ]),
+        sidebar,
+        *data_stores(snapshot),
+        dbc.Row([
+            dbc.Col(map_chart, md=6),
+            dbc.Col([
+                crime_bar_chart,
+                html.Br(),
+                dbc.Row([
+                    dbc.Col(gender_pie_chart, md=6),
+                    dbc.Col(age_pie_chart, md=6)
+                ])
+            ], md=6)
+        ]),
+        html.Br(),
+        dbc.Row(dbc.Col(crosstab_heatmap, width=12)),
+        dbc.Row(footer_toggle_button),
+        html.Br(),
+        html.Br(),
+        dbc.Row(dbc.Col(footer_content, width=12))
+    ], fluid=True)
 
-# Layout
-app.layout = dbc.Container([
-    dbc.Row([
-        dbc.Col(title_comp),
-        collapse_button
-    ]),
-    sidebar,
-    dbc.Row([
-        dbc.Col(map_chart, md=6),
-        dbc.Col([
-            crime_bar_chart,
-            html.Br(),
-            dbc.Row([
-                dbc.Col(gender_pie_chart, md=6),
-                dbc.Col(age_pie_chart, md=6)
-            ])
-        ], md=6)
-    ]),
-    dbc.Row(footer_toggle_button),
-    html.Br(),
-    html.Br(),
-    dbc.Row(dbc.Col(footer_content, width=12))
-], fluid=True)
+
+# Layout, built on every page load
+app.layout = serve_layout
 
 # Run the app/dashboard
 if __name__ == '__main__':
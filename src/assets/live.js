@@ -0,0 +1,21 @@
+// Live updates: wait until the filters have not changed for a short pause,
+// then bump the live-trigger store so the server recomputes once.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    live: {
+        delay: 400,
+        count: 0,
+        timer: null,
+        debounce: function(crimeTypes, startDate, endDate, live) {
+            const state = window.dash_clientside.live;
+            clearTimeout(state.timer);
+            if (!live) {
+                return window.dash_clientside.no_update;
+            }
+            state.timer = setTimeout(function() {
+                state.count += 1;
+                window.dash_clientside.set_props('live-trigger', {data: state.count});
+            }, state.delay);
+            return window.dash_clientside.no_update;
+        }
+    }
+});
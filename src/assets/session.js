@@ -0,0 +1,15 @@
+// Session id: a random id per browser tab, so the server can refine the
+// tab's last query when its filters narrow.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    session: {
+        start: function(timestamp, sessionId) {
+            if (sessionId) {
+                return window.dash_clientside.no_update;
+            }
+            if (window.crypto && window.crypto.randomUUID) {
+                return window.crypto.randomUUID();
+            }
+            return Date.now().toString(36) + Math.random().toString(36).slice(2);
+        }
+    }
+});
@@ -0,0 +1,125 @@
+// Prebuilt default views: when the filters are the defaults and the data
+// version matches the manifest, fetch the view from its static file instead
+// of asking the server to draw it. Anything else bumps the request store so
+// the server draws the view as before.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    static_views: {
+        count: 0,
+        sequence: {},
+
+        // Default filters, exact counts of the prebuilt data version, and no
+        // estimate for newer filters waiting on screen
+        isDefault: function(exact, estimate, manifest) {
+            if (!manifest || !exact || exact.version !== manifest.version) {
+                return false;
+            }
+            if (Object.keys(exact.filters).length > 0 || exact.comparison) {
+                return false;
+            }
+            const sum = function(token) {
+                return token.reduce(function(a, b) { return a + b; }, 0);
+            };
+            return !(estimate && sum(estimate.token) > sum(exact.token));
+        },
+
+        // Same selection rules as get_selected_location; several selected
+        // regions are never prebuilt
+        regionKey: function(signalData) {
+            const selection = signalData && signalData.select_region;
+            if (!selection) {
+                return 'all';
+            }
+            let kind = 'borough';
+            let regions = selection.Borough;
+            if (!regions || regions.length === 0) {
+                kind = 'precinct';
+                regions = selection.Precinct;
+            }
+            if (regions === undefined || regions === null || regions.length === 0) {
+                return 'all';
+            }
+            if (!Array.isArray(regions)) {
+                regions = [regions];
+            }
+            return regions.length === 1 ? kind + '/' + regions[0] : null;
+        },
+
+        // Fetch the view's file and apply it, or ask the server for it
+        route: function(request, view, manifest, apply) {
+            const state = window.dash_clientside.static_views;
+            const ask = function() {
+                state.count += 1;
+                return state.count;
+            };
+            const sequence = (state.sequence[request] || 0) + 1;
+            state.sequence[request] = sequence;
+
+            const file = view && manifest.views[view];
+            if (!file) {
+                return ask();
+            }
+            fetch(manifest.base + file)
+                .then(function(response) {
+                    if (!response.ok) {
+                        throw new Error(response.statusText);
+                    }
+                    return response.json();
+                })
+                .then(function(content) {
+                    // Drop files that arrive after a newer view was asked for
+                    if (state.sequence[request] === sequence) {
+                        apply(content);
+                    }
+                })
+                .catch(function() {
+                    if (state.sequence[request] === sequence) {
+                        window.dash_clientside.set_props(request, {data: ask()});
+                    }
+                });
+            return window.dash_clientside.no_update;
+        },
+
+        map: function(toggle, exact, estimate, manifest) {
+            const state = window.dash_clientside.static_views;
+            if (!exact && !estimate) {
+                return window.dash_clientside.no_update;
+            }
+            const view = state.isDefault(exact, estimate, manifest)
+                ? 'map/' + (toggle ? 'precinct' : 'borough')
+                : null;
+            return state.route('map-request', view, manifest, function(spec) {
+                window.dash_clientside.set_props('map', {spec: spec});
+            });
+        },
+
+        charts: function(signalData, exact, estimate, manifest) {
+            const state = window.dash_clientside.static_views;
+            if (!exact && !estimate) {
+                return window.dash_clientside.no_update;
+            }
+            const region = state.regionKey(signalData);
+            const view = state.isDefault(exact, estimate, manifest) && region
+                ? 'charts/' + region
+                : null;
+            return state.route('charts-request', view, manifest, function(figures) {
+                window.dash_clientside.set_props('crime-bar-chart', {figure: figures[0]});
+                window.dash_clientside.set_props('gender-pie-chart', {figure: figures[1]});
+                window.dash_clientside.set_props('age-pie-chart', {figure: figures[2]});
+            });
+        },
+
+        crosstab: function(pair, signalData, aggregate, manifest) {
+            const state = window.dash_clientside.static_views;
+            if (!aggregate) {
+                return window.dash_clientside.no_update;
+            }
+            const region = state.regionKey(signalData);
+            const view = state.isDefault(aggregate, null, manifest) && region
+                ? 'crosstab/' + pair + '/' + region
+                : null;
+            return state.route('crosstab-request', view, manifest, function(figure) {
+                window.dash_clientside.set_props('crosstab-heatmap', {figure: figure});
+            });
+        }
+    }
+});
@@ -0,0 +1,138 @@
+"""
+Compare the JSON encode time and response size of the precinct view before
+and after typed-array encoding.
+
+Run from the repository root:
+
+    python -m src.benchmarks.encoding --repeats 20
+
+Plotly figures carry their numeric arrays as base64 typed arrays; the old
+payload spells every number out as a decimal. The map spec carries only
+the counts per region and fetches the precinct shapes once from a cached
+URL; the old payload inlined every shape's coordinates in each spec.
+
+Figures are compared as the plain dicts that go over the wire. Turning a
+Figure object into that dict costs the same either way and is left out.
+"""
+import argparse
+import base64
+import gzip
+import json
+import time
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+from src.app import server
+from src.callbacks.aggregate import stored_aggregate
+from src.callbacks.charts import update_all_pie_charts, update_crosstab_heatmap
+from src.callbacks.map import create_map_chart
+from src.data import map_geometry
+
+
+def plain_arrays(value):
+    """Turn typed arrays in an encoded figure back into lists of numbers."""
+    if isinstance(value, dict):
+        if 'bdata' in value and 'dtype' in value:
+            array = np.frombuffer(
+                base64.b64decode(value['bdata']), dtype=value['dtype']
+            )
+            if 'shape' in value:
+                shape = [int(size) for size in str(value['shape']).split(',')]
+                array = array.reshape(shape)
+            return array.tolist()
+        return {key: plain_arrays(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [plain_arrays(item) for item in value]
+    return value
+
+
+def wire_dict(value):
+    """A figure dict with label arrays as lists, as it goes over the wire."""
+    if isinstance(value, dict):
+        return {key: wire_dict(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [wire_dict(item) for item in value]
+    if isinstance(value, np.ndarray) and value.dtype == object:
+        return value.tolist()
+    return value
+
+
+def inline_geometry(spec, dimension, key):
+    """The map spec with each region's shape inlined, as it used to be sent."""
+    shapes = {
+        feature['properties'][key]: feature['geometry']
+        for feature in json.loads(map_geometry[dimension]['content'])['features']
+    }
+    label = spec['transform'][0]['lookup']
+    datasets = {
+        name: [
+            {**row, 'type': 'Feature', 'geometry': shapes.get(row[label])}
+            for row in rows
+        ]
+        for name, rows in spec['datasets'].items()
+    }
+    inlined = {**spec, 'datasets': datasets}
+    inlined.pop('transform')
+    return inlined
+
+
+def measure(view, repeats):
+    """Median encode time (ms), size and gzipped size (KB) of a payload."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        content = to_json_plotly(view)
+        times.append((time.perf_counter() - start) * 1000)
+    content = content.encode()
+    return (
+        float(np.median(times)),
+        len(content) / 1e3,
+        len(gzip.compress(content)) / 1e3
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    with server.test_request_context():
+        aggregate = stored_aggregate([0, 0, 0], {})
+        region = {'select_region': {'Precinct': [75]}}
+        spec = create_map_chart(True, aggregate, None)
+        charts = wire_dict([
+            figure.to_plotly_json()
+            for figure in update_all_pie_charts(region, aggregate, None)
+        ])
+        heatmap = wire_dict(update_crosstab_heatmap(
+            'precinct-race', None, aggregate
+        ).to_plotly_json())
+
+    views = {
+        'map spec': (inline_geometry(spec, 'precinct', 'precinct'), spec),
+        'bar + pies': (plain_arrays(json.loads(to_json_plotly(charts))), charts),
+        'heatmap': (plain_arrays(json.loads(to_json_plotly(heatmap))), heatmap)
+    }
+
+    print(f"Precinct view, median of {args.repeats} encodes")
+    print(
+        f"{'payload':<12} {'old KB':>9} {'new KB':>9} {'old gz KB':>10} "
+        f"{'new gz KB':>10} {'old ms':>8} {'new ms':>8}"
+    )
+    for name, (old, new) in views.items():
+        old_ms, old_kb, old_gz = measure(old, args.repeats)
+        new_ms, new_kb, new_gz = measure(new, args.repeats)
+        print(
+            f"{name:<12} {old_kb:>9.1f} {new_kb:>9.1f} {old_gz:>10.1f} "
+            f"{new_gz:>10.1f} {old_ms:>8.2f} {new_ms:>8.2f}"
+        )
+    shapes = map_geometry['precinct']['content'].encode()
+    print(
+        f"Precinct shapes, fetched once and cached: {len(shapes) / 1e3:.1f} KB, "
+        f"{len(gzip.compress(shapes)) / 1e3:.1f} KB gzipped"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Compare the fused filter-and-count kernel with the DataFrame path it
+replaced in the charts and map callbacks.
+
+Run from the repository root:
+
+    python -m src.benchmarks.kernel --scale 1
+
+The old path filters a DataFrame copy, runs value_counts on OFNS_DESC,
+PERP_SEX and AGE_GROUP, and groups by precinct for the map. The fused path
+computes all of these counts with one bincount over precomputed codes.
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from src.data import nyc_arrests
+from src.utils import build_code_table, filter_data, fused_aggregate
+
+
+def dataframe_path(data, **filters):
+    """Counts the way the callbacks computed them before the fused kernel."""
+    filtered = filter_data(data, **filters)
+    counts = {}
+    for column in ['OFNS_DESC', 'PERP_SEX', 'AGE_GROUP']:
+        column_counts = filtered[column].value_counts().reset_index()
+        column_counts.columns = [column, 'Arrests']
+        counts[column] = column_counts
+    counts['ARREST_PRECINCT'] = (
+        filtered
+        .groupby('ARREST_PRECINCT', as_index=False)
+        .agg(counts=('ARREST_PRECINCT', 'size'))
+    )
+    return counts
+
+
+def measure(function, repeats, *args, **filters):
+    """Median wall time (ms) and peak traced allocation (MB) of a call."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(*args, **filters)
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    function(*args, **filters)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return float(np.median(times)), peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', type=int, default=1,
+                        help='Repeat the data this many times')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    data = pd.concat([nyc_arrests] * args.scale, ignore_index=True)
+    table = build_code_table(data)
+    top_crimes = nyc_arrests['OFNS_DESC'].value_counts().index[:5].tolist()
+    scenarios = {
+        'no filters': {},
+        'date range': {
+            'start_date': nyc_arrests['ARREST_DATE'].min(),
+            'end_date': nyc_arrests['ARREST_DATE'].median()
+        },
+        'date + 5 crimes': {
+            'start_date': nyc_arrests['ARREST_DATE'].min(),
+            'end_date': nyc_arrests['ARREST_DATE'].median(),
+            'crime_types': top_crimes
+        }
+    }
+
+    print(f"{len(data):,} rows, median of {args.repeats} runs")
+    print(
+        f"{'scenario':<18} {'frame ms':>9} {'fused ms':>9} {'speed-up':>9} "
+        f"{'frame MB':>9} {'fused MB':>9}"
+    )
+    for name, filters in scenarios.items():
+        frame_ms, frame_mb = measure(dataframe_path, args.repeats, data, **filters)
+        fused_ms, fused_mb = measure(fused_aggregate, args.repeats, table, **filters)
+        print(
+            f"{name:<18} {frame_ms:>9.1f} {fused_ms:>9.1f} "
+            f"{frame_ms / fused_ms:>8.1f}x {frame_mb:>9.1f} {fused_mb:>9.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
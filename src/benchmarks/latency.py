@@ -0,0 +1,50 @@
+"""
+Check that live updates meet the server-side latency budget.
+
+Run from the repository root:
+
+    python -m src.benchmarks.latency --budget-ms 50 --years 1
+
+Times the server-side work behind one live update (filter, count and
+compact the per-precinct aggregate and count the cross-tab, uncached) for a
+set of representative filters at full dataset size, repeated --years times.
+Exits with status 1 when the slowest query is over the budget. The app runs
+the same timing for each data version and falls back to Apply-only when it
+fails, and tests/test_live_latency.py checks it on the processed data.
+
+The whole path, with building and encoding the map spec and figures, is
+printed alongside. It is not held to the budget.
+"""
+import argparse
+import sys
+
+from src.callbacks.latency import render_live_update
+from src.utils import build_code_table, live_queries, live_update_latency
+from .parallel import multi_year_arrests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--budget-ms', type=float, default=50)
+    parser.add_argument('--years', type=int, default=1,
+                        help='Copies of the data, one per year')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    table = build_code_table(multi_year_arrests(args.years))
+    latency = live_update_latency(table, repeats=args.repeats)
+    whole = live_update_latency(
+        table, repeats=args.repeats, render=render_live_update
+    )
+    print(
+        f"{len(table['key']):,} rows, {len(live_queries(table))} queries: "
+        f"slowest median {latency:.1f} ms, budget {args.budget_ms:.0f} ms "
+        f"({whole:.1f} ms with figures)"
+    )
+    if latency > args.budget_ms:
+        print("Over the live update latency budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+"""
+Load test the dashboard with concurrent simulated analyst sessions.
+
+Run from the repository root:
+
+    python -m src.benchmarks.loadtest --concurrency 1 2 4 8 --duration 30 \
+        --output loadtest.json
+
+The app is started locally with gunicorn (or pass --url to test a running
+instance). Each session replays map toggles, Apply clicks with random crime
+types and date ranges, and map region clicks through the
+_dash-update-component endpoint, following chained callbacks like the
+browser does. Throughput, p50/p95/p99 latency and error
+rates per callback are written as JSON for every concurrency level.
+"""
+import argparse
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+
+def free_port():
+    """Pick a free local port for the app."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_app(workers, threads, timeout=180):
+    """
+    Start the app with gunicorn and wait until it answers.
+
+    Returns:
+    tuple: (process, base url)
+    """
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn',
+        '--workers', str(workers),
+        '--threads', str(threads),
+        '--bind', f'127.0.0.1:{port}',
+        'src.app:server'
+    ])
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('The app exited before it started serving')
+        try:
+            requests.get(url, timeout=5)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(1)
+    process.terminate()
+    raise RuntimeError('The app did not start in time')
+
+
+def find_component(layout, component_id):
+    """Find a component's props in the serialized Dash layout."""
+    if isinstance(layout, dict):
+        props = layout.get('props', {})
+        if props.get('id') == component_id:
+            return props
+        children = list(props.values()) if props else list(layout.values())
+        for child in children:
+            found = find_component(child, component_id)
+            if found is not None:
+                return found
+    elif isinstance(layout, list):
+        for child in layout:
+            found = find_component(child, component_id)
+            if found is not None:
+                return found
+    return None
+
+
+def parse_outputs(output):
+    """Turn a dependency output string into Dash's outputs payload."""
+    def split(prop_id):
+        component_id, prop = prop_id.rsplit('.', 1)
+        return {'id': component_id, 'property': prop}
+
+    if output.startswith('..'):
+        return [split(part) for part in output.strip('.').split('...')]
+    return split(output)
+
+
+class Scenario:
+    """What a session can do: the callbacks and the values to pick from."""
+
+    def __init__(self, url):
+        dependencies = requests.get(f'{url}/_dash-dependencies').json()
+        layout = requests.get(f'{url}/_dash-layout').json()
+
+        # Index callbacks by the input props that trigger them. Static view
+        # routers run in the browser and ask the server to draw the view, so
+        # they are followed as a plain forward to their request store
+        self.callbacks = {}
+        self.forwards = {}
+        for dependency in dependencies:
+            function = dependency.get('clientside_function')
+            if function and function['namespace'] == 'static_views':
+                for prop in dependency['inputs']:
+                    self.forwards.setdefault(
+                        f"{prop['id']}.{prop['property']}", []
+                    ).append(dependency['output'])
+                continue
+            if function:
+                continue
+            for prop in dependency['inputs']:
+                self.callbacks.setdefault(
+                    f"{prop['id']}.{prop['property']}", []
+                ).append(dependency)
+
+        dates = find_component(layout, 'date-picker-range')
+        self.min_date = np.datetime64(dates['min_date_allowed'][:10])
+        self.max_date = np.datetime64(dates['max_date_allowed'][:10])
+
+        counts = requests.get(f'{url}/api/v1/counts').json()['counts']
+        self.crime_types = list(counts['offense'])
+        self.precincts = [int(precinct) for precinct in counts['precinct']]
+        self.boroughs = list(counts['borough'])
+
+
+def callback_name(dependency):
+    """Readable callback name from its outputs."""
+    outputs = parse_outputs(dependency['output'])
+    if isinstance(outputs, dict):
+        outputs = [outputs]
+    return '+'.join(f"{output['id']}.{output['property']}" for output in outputs)
+
+
+class Session(threading.Thread):
+    """One simulated analyst clicking through the dashboard."""
+
+    def __init__(self, url, scenario, stop_at, think_time, results, seed):
+        super().__init__(daemon=True)
+        self.url = url
+        self.scenario = scenario
+        self.stop_at = stop_at
+        self.think_time = think_time
+        self.results = results
+        self.random = random.Random(seed)
+        self.http = requests.Session()
+        self.values = {
+            'map-toggle.value': False,
+            'apply-button.n_clicks': 0,
+            'reset-button.n_clicks': 0,
+            'crime-type-dropdown.value': [],
+            'date-picker-range.start_date': str(scenario.min_date),
+            'date-picker-range.end_date': str(scenario.max_date),
+            'compare-toggle.value': False,
+            'area-type.value': 'none',
+            'area-radius.value': 500,
+            'crosstab-dropdown.value': 'precinct-race',
+            'map.signalData': None,
+            'session-id.data': f'loadtest-{seed}'
+        }
+        self.requests = 0
+
+    def trigger(self, prop_id, value):
+        """Change a prop and fire every callback it triggers."""
+        self.values[prop_id] = value
+        for dependency in self.scenario.callbacks.get(prop_id, []):
+            payload = {
+                'output': dependency['output'],
+                'outputs': parse_outputs(dependency['output']),
+                'inputs': [
+                    {**prop, 'value': self.values.get(
+                        f"{prop['id']}.{prop['property']}"
+                    )}
+                    for prop in dependency['inputs']
+                ],
+                'state': [
+                    {**prop, 'value': self.values.get(
+                        f"{prop['id']}.{prop['property']}"
+                    )}
+                    for prop in dependency['state']
+                ],
+                'changedPropIds': [prop_id]
+            }
+            start = time.perf_counter()
+            outputs = {}
+            try:
+                response = self.http.post(
+                    f'{self.url}/_dash-update-component',
+                    json=payload,
+                    timeout=60
+                )
+                error = response.status_code not in (200, 204)
+                if response.status_code == 200:
+                    outputs = response.json().get('response', {})
+            except (requests.RequestException, ValueError):
+                error = True
+            self.results.append((
+                callback_name(dependency),
+                (time.perf_counter() - start) * 1000,
+                error
+            ))
+
+            # Outputs that are inputs elsewhere (e.g. the aggregate store)
+            # fire the next callbacks, like in the browser
+            for component_id, props in outputs.items():
+                for prop, value in props.items():
+                    if f'{component_id}.{prop}' in self.scenario.callbacks or (
+                        f'{component_id}.{prop}' in self.scenario.forwards
+                    ):
+                        self.trigger(f'{component_id}.{prop}', value)
+
+        # Simulated sessions never keep the default filters, so static view
+        # routers always ask the server
+        for request in self.scenario.forwards.get(prop_id, []):
+            self.requests += 1
+            self.trigger(request, self.requests)
+
+    def random_filters(self):
+        """Pick a random crime set and date range, like an analyst would."""
+        days = int((self.scenario.max_date - self.scenario.min_date).astype(int))
+        start = self.random.randint(0, days)
+        end = self.random.randint(start, days)
+        crimes = self.random.sample(
+            self.scenario.crime_types,
+            self.random.choice([0, 1, 2, 3, 5])
+        )
+        # Editing the filters fires the callbacks that listen to them
+        self.trigger(
+            'date-picker-range.start_date', str(self.scenario.min_date + start)
+        )
+        self.trigger(
+            'date-picker-range.end_date', str(self.scenario.min_date + end)
+        )
+        self.trigger('crime-type-dropdown.value', crimes)
+
+    def click_region(self):
+        """Click (or shift-click) regions in the current map view."""
+        if self.values['map-toggle.value']:
+            regions = {'Precinct': self.random.sample(
+                self.scenario.precincts, self.random.choice([1, 1, 3, 8])
+            )}
+        else:
+            regions = {'Borough': self.random.sample(
+                self.scenario.boroughs, self.random.choice([1, 1, 2])
+            )}
+        self.trigger('map.signalData', {'select_region': regions})
+
+    def run(self):
+        actions = [
+            lambda: self.trigger(
+                'map-toggle.value', not self.values['map-toggle.value']
+            ),
+            lambda: (
+                self.random_filters(),
+                self.trigger(
+                    'apply-button.n_clicks',
+                    self.values['apply-button.n_clicks'] + 1
+                )
+            ),
+            self.click_region
+        ]
+        weights = [1, 3, 3]
+        while time.time() < self.stop_at:
+            self.random.choices(actions, weights)[0]()
+            time.sleep(self.random.uniform(0, self.think_time))
+
+
+def summarize(results, concurrency, elapsed):
+    """Throughput, latency percentiles and error rates per callback."""
+    summary = {
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2),
+        'requests': len(results),
+        'throughput_rps': round(len(results) / elapsed, 2),
+        'error_rate': (
+            round(sum(error for _, _, error in results) / len(results), 4)
+            if results else 0.0
+        ),
+        'callbacks': {}
+    }
+    for name in sorted({name for name, _, _ in results}):
+        latencies = np.array([ms for n, ms, _ in results if n == name])
+        errors = sum(error for n, _, error in results if n == name)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary['callbacks'][name] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'error_rate': round(errors / len(latencies), 4),
+            'p50_ms': round(float(p50), 1),
+            'p95_ms': round(float(p95), 1),
+            'p99_ms': round(float(p99), 1)
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help='Test a running app instead')
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 2, 4, 8, 16])
+    parser.add_argument('--duration', type=float, default=30,
+                        help='Seconds per concurrency level')
+    parser.add_argument('--think-time', type=float, default=0.5,
+                        help='Maximum pause between actions in seconds')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='gunicorn threads per worker')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report here')
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_app(args.workers, args.threads)
+
+    try:
+        scenario = Scenario(url)
+        report = {
+            'url': url,
+            'workers': args.workers if process else None,
+            'threads': args.threads if process else None,
+            'think_time_s': args.think_time,
+            'levels': []
+        }
+        for concurrency in args.concurrency:
+            results = []
+            start = time.time()
+            sessions = [
+                Session(
+                    url, scenario, start + args.duration, args.think_time,
+                    results, seed=args.seed * 1000 + session
+                )
+                for session in range(concurrency)
+            ]
+            for session in sessions:
+                session.start()
+            for session in sessions:
+                session.join()
+            level = summarize(results, concurrency, time.time() - start)
+            report['levels'].append(level)
+            print(
+                f"concurrency {concurrency}: {level['throughput_rps']} req/s, "
+                f"error rate {level['error_rate']}",
+                file=sys.stderr
+            )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
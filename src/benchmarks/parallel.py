@@ -0,0 +1,107 @@
+"""
+Scaling benchmark for process-pool aggregation over month partitions.
+
+Run from the repository root:
+
+    python -m src.benchmarks.parallel --years 5 --max-workers 8
+
+The year-to-date data is repeated with shifted dates to simulate a
+multi-year table.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data import nyc_arrests
+from src.utils import (
+    build_code_table,
+    fused_aggregate,
+    parallel_aggregate,
+    start_pool
+)
+
+
+def multi_year_arrests(years):
+    """Repeat the arrest data once per year, shifting the dates back."""
+    return pd.concat(
+        [
+            nyc_arrests.assign(
+                ARREST_DATE=nyc_arrests['ARREST_DATE'] - pd.DateOffset(years=year)
+            )
+            for year in range(years)
+        ],
+        ignore_index=True
+    )
+
+
+def time_call(function, repeats, **filters):
+    """Median wall time of a call in milliseconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(**filters)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+def run(years, workers, repeats):
+    """Time one configuration: 0 workers means the serial code path."""
+    table = build_code_table(multi_year_arrests(years))
+    filters = {
+        'crime_types': nyc_arrests['OFNS_DESC'].value_counts().index[:5].tolist()
+    }
+
+    if workers == 0:
+        return time_call(
+            lambda **filters: fused_aggregate(table, **filters),
+            repeats,
+            **filters
+        )
+
+    start_pool(table, workers)
+    parallel_aggregate(**filters)  # Warm up the workers
+    return time_call(parallel_aggregate, repeats, **filters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--workers', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Each configuration runs in a fresh process so pools do not pile up
+    if args.workers is not None:
+        print(run(args.years, args.workers, args.repeats))
+        return
+
+    rows = len(nyc_arrests) * args.years
+    print(f"{rows:,} rows, {args.years} years, median of {args.repeats} runs")
+    print(f"{'workers':>8} {'ms':>10} {'speed-up':>10}")
+    baseline = None
+    for workers in [0, *range(1, args.max_workers + 1)]:
+        output = subprocess.run(
+            [
+                sys.executable, '-m', 'src.benchmarks.parallel',
+                '--years', str(args.years),
+                '--repeats', str(args.repeats),
+                '--workers', str(workers)
+            ],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        elapsed = float(output.stdout.strip().splitlines()[-1])
+        baseline = baseline or elapsed
+        label = 'serial' if workers == 0 else str(workers)
+        print(f"{label:>8} {elapsed:>10.1f} {baseline / elapsed:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Time a typical narrowing flow with and without refining the previous
+query's rows.
+
+Run from the repository root:
+
+    python -m src.benchmarks.refine --scale 4
+
+An analyst applies a date range and crime types, then shrinks the dates,
+drops crime types and clicks into a borough's cross-tab. Without
+refinement, every step filters the whole code table. With refinement, each
+step only filters the rows the step before it matched.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data import nyc_arrests
+from src.utils import (
+    build_code_table,
+    crosstab_matrix,
+    fused_region_counts,
+    fused_region_rows,
+    kernel_mask
+)
+
+
+def timed(function, repeats, *args, **kwargs):
+    """Median wall time (ms) of a call, and its last result."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times)), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', type=int, default=1,
+                        help='Repeat the data this many times')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    data = pd.concat([nyc_arrests] * args.scale, ignore_index=True)
+    table = build_code_table(data)
+    dates = nyc_arrests['ARREST_DATE'].quantile([0, 0.25, 0.5, 0.75, 1])
+    dates = [date.strftime('%Y-%m-%d') for date in dates]
+    crimes = nyc_arrests['OFNS_DESC'].value_counts().index[:10].tolist()
+    borough = nyc_arrests['borough'].mode()[0]
+
+    steps = [
+        ('apply 10 crimes', (dates[0], dates[4], crimes, None)),
+        ('shrink dates', (dates[1], dates[3], crimes, None)),
+        ('5 crimes', (dates[1], dates[3], crimes[:5], None)),
+        ('shrink dates', (dates[1], dates[2], crimes[:5], None)),
+        ('1 crime', (dates[1], dates[2], crimes[:1], None))
+    ]
+
+    print(f"{len(data):,} rows, median of {args.repeats} runs")
+    print(f"{'step':<18} {'rows':>10} {'full ms':>9} {'refined ms':>11}")
+    rows = None
+    for name, filters in steps:
+        full_ms, _ = timed(fused_region_counts, args.repeats, table, *filters)
+        refined_ms, (_, matched) = timed(
+            fused_region_rows, args.repeats, table, *filters, rows=rows
+        )
+        rows = matched
+        print(f"{name:<18} {len(rows):>10,} {full_ms:>9.2f} {refined_ms:>11.2f}")
+
+    # Click into a borough: the cross-tab of the last filters in it
+    start_date, end_date, crime_types, _ = steps[-1][1]
+    full_ms, _ = timed(
+        lambda: crosstab_matrix(table, 'precinct', 'race', kernel_mask(
+            table, start_date, end_date, crime_types, [borough]
+        )),
+        args.repeats
+    )
+    refined_ms, _ = timed(
+        lambda: crosstab_matrix(table, 'precinct', 'race', kernel_mask(
+            table, start_date, end_date, crime_types, [borough], rows=rows
+        ), rows),
+        args.repeats
+    )
+    print(f"{'click ' + borough:<18} {'':>10} {full_ms:>9.2f} {refined_ms:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Prebuild the map, charts and cross-tabs of the default (unfiltered) view as
+static JSON files, so first page loads do not ask the server to draw them.
+Run it after each data refresh, once the anomalies are detected:
+
+    python -m src.build_static
+
+Files are written to data/static/views, named by a hash of their content,
+and listed in data/static/manifest.json with the data version they were
+built from. Serve that directory from a CDN by pointing
+ARREST_TRACKER_STATIC_URL at it.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+from plotly.io.json import to_json_plotly
+
+from src.app import server
+from src.callbacks.aggregate import stored_aggregate
+from src.callbacks.charts import update_all_pie_charts, update_crosstab_heatmap
+from src.callbacks.map import create_map_chart
+from src.data import STATIC_DIR, borough_names, nyc_precinct
+from src.utils import CROSSTAB_PAIRS
+
+
+def default_views(precincts=True):
+    """
+    Draw every prebuilt view of the default filters.
+
+    Parameters:
+    precincts (bool): Also draw the charts of each single precinct
+
+    Returns:
+    tuple: (data version, dict of view name to its figure or spec)
+    """
+    aggregate = stored_aggregate([0, 0, 0], {})
+
+    regions = {'all': None}
+    regions.update({
+        f'borough/{name}': {'select_region': {'Borough': [name]}}
+        for name in borough_names
+    })
+    precinct_regions = {
+        f'precinct/{number}': {'select_region': {'Precinct': [number]}}
+        for number in sorted(nyc_precinct['precinct'].astype(int))
+    }
+
+    views = {
+        'map/precinct': create_map_chart(True, aggregate, None),
+        'map/borough': create_map_chart(False, aggregate, None)
+    }
+    chart_regions = {**regions, **precinct_regions} if precincts else regions
+    for region, signal_data in chart_regions.items():
+        views[f'charts/{region}'] = list(
+            update_all_pie_charts(signal_data, aggregate, None)
+        )
+    # Per-precinct cross-tabs are rarely opened and stay live
+    for pair in CROSSTAB_PAIRS:
+        for region, signal_data in regions.items():
+            views[f'crosstab/{pair}/{region}'] = update_crosstab_heatmap(
+                pair, signal_data, aggregate
+            )
+    return aggregate['version'], views
+
+
+def write_views(version, views, output):
+    """
+    Write each view to a content-hashed file, then the manifest, and remove
+    files no view refers to any more.
+
+    Parameters:
+    version (str): Data version the views were drawn from
+    views (dict): View name to its figure or spec
+    output (str): Directory for manifest.json and the views directory
+
+    Returns:
+    dict: The manifest
+    """
+    view_dir = os.path.join(output, 'views')
+    os.makedirs(view_dir, exist_ok=True)
+
+    files = {}
+    for name, view in views.items():
+        content = to_json_plotly(view).encode()
+        file_name = f"{hashlib.sha256(content).hexdigest()[:16]}.json"
+        path = os.path.join(view_dir, file_name)
+        if not os.path.exists(path):
+            with open(f"{path}.tmp", 'wb') as file:
+                file.write(content)
+            os.replace(f"{path}.tmp", path)
+        files[name] = file_name
+
+    # The manifest goes last, so it never lists a file that is not there yet
+    manifest = {'version': version, 'views': files}
+    with open(os.path.join(output, 'manifest.json.tmp'), 'w') as file:
+        json.dump(manifest, file)
+    os.replace(
+        os.path.join(output, 'manifest.json.tmp'),
+        os.path.join(output, 'manifest.json')
+    )
+
+    for file_name in set(os.listdir(view_dir)) - set(files.values()):
+        os.remove(os.path.join(view_dir, file_name))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', default=STATIC_DIR)
+    parser.add_argument('--no-precincts', action='store_true',
+                        help='Skip the charts of single precincts')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with server.test_request_context():
+        version, views = default_views(precincts=not args.no_precincts)
+    manifest = write_views(version, views, args.output)
+    size = sum(
+        os.path.getsize(os.path.join(args.output, 'views', file_name))
+        for file_name in set(manifest['views'].values())
+    )
+    print(
+        f"{len(views)} views for data version {version}, "
+        f"{size / 1e6:.1f} MB, {time.perf_counter() - start:.2f}s",
+        file=sys.stderr
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,668 @@
+import os
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+from flask_caching import Cache
+
+from src.data import (
+    anomalies,
+    data_signature,
+    default_charts,
+    filter_options,
+    history,
+    loaded_signature,
+    nyc_arrests,
+    read_anomalies,
+    read_arrests,
+    read_history,
+    read_year,
+    version_of
+)
+from src.utils import (
+    CROSSTAB_PAIRS,
+    add_regions,
+    area_rows,
+    build_code_table,
+    build_offense_hierarchy,
+    build_sample,
+    compact_aggregate,
+    crosstab_from_matrix,
+    drill_counts,
+    estimate_region_counts,
+    estimated_rows,
+    fused_aggregate,
+    fused_period_region_counts,
+    fused_region_counts,
+    fused_region_rows,
+    kernel_mask,
+    live_update_latency,
+    merge_labels,
+    parallel_aggregate,
+    parallel_region_counts,
+    pool_started,
+    precinct_crosstab_matrix,
+    restart_pool,
+    select_precincts,
+    split_date_range,
+    start_pool,
+    store_aggregates,
+    SessionRows
+)
+
+# Entries the shared cache holds, lowered while memory is short (see
+# routes/admin.py)
+CACHE_THRESHOLD = 500
+
+# Shared cache, bound to the Flask server in app.py
+cache = Cache(config={
+    'CACHE_TYPE': 'src.utils.SizedCache',
+    'CACHE_THRESHOLD': CACHE_THRESHOLD
+})
+
+# Historic years kept in memory at once, loaded on first use. Memory follows
+# the years being looked at, not the length of the history.
+HISTORY_CACHED_YEARS = int(
+    os.environ.get('ARREST_TRACKER_HISTORY_CACHED_YEARS', 3)
+)
+
+# Stratified sample for quick estimates, used while exact counts are computed
+# for queries over at least APPROXIMATE_MIN_ROWS rows
+SAMPLE_FRACTION = float(os.environ.get('ARREST_TRACKER_SAMPLE_FRACTION', 0.02))
+APPROXIMATE_MIN_ROWS = int(
+    os.environ.get('ARREST_TRACKER_APPROXIMATE_MIN_ROWS', 1_000_000)
+)
+
+# Rows matched by each session's last query, so narrower follow-up queries
+# only filter those. Least recently used sessions go first past the budget.
+REFINE_MAX_MB = float(os.environ.get('ARREST_TRACKER_REFINE_MB', 64))
+session_rows = SessionRows(int(REFINE_MAX_MB * 1e6))
+
+# Seconds between checks for new processed data, 0 turns reloading off
+RELOAD_INTERVAL = float(os.environ.get('ARREST_TRACKER_RELOAD_INTERVAL', 0))
+
+
+class DataSnapshot:
+    """
+    One version of the arrest data and everything derived from it.
+
+    Requests take the current snapshot once and use it until they finish,
+    so a reload never mixes two versions in one response.
+
+    Parameters:
+    signature (str): Output of data_signature for the files read
+    arrests (pd.DataFrame): Current arrest data
+    anomalies (pd.DataFrame): Flagged weekly spikes
+    history (dict): Output of read_history
+    """
+
+    def __init__(self, signature, arrests, anomalies, history):
+        self.signature = signature
+        self.version = version_of(signature)
+        self.arrests = arrests
+        self.anomalies = anomalies
+        self.history_years = sorted(int(year) for year in history['years'])
+        self.history_rows = {
+            int(year): summary['rows']
+            for year, summary in history['years'].items()
+        }
+        self.options = filter_options(arrests, history)
+
+        # Citywide counts the charts show before any filter is applied
+        charts = default_charts(arrests)
+        self.gender_data = charts['gender']
+        self.age_data = charts['age']
+        self.crime_pie_data = charts['crimes']
+
+        # Integer codes for the fused filter-and-count kernel. With historic
+        # data, all years share one set of labels so their counts can be added.
+        self.labels = (
+            merge_labels(arrests, history['labels'])
+            if self.history_years else None
+        )
+        self.codes = build_code_table(arrests, categories=self.labels)
+        self.sample = build_sample(self.codes, fraction=SAMPLE_FRACTION)
+        self.hierarchy = build_offense_hierarchy(arrests)
+
+        # Slowest live update in milliseconds, None until it is timed
+        self.live_latency_ms = None
+
+    def split_dates(self, start_date, end_date):
+        """Split a date range with split_date_range."""
+        return split_date_range(
+            start_date, end_date, self.history_years, self.options['min_date']
+        )
+
+
+def load_snapshot():
+    """Read the processed data files into a new snapshot."""
+    # Taken first, so a file replaced while reading is picked up next time
+    signature = data_signature()
+    return DataSnapshot(signature, read_arrests(), read_anomalies(), read_history())
+
+
+_snapshot = DataSnapshot(loaded_signature, nyc_arrests, anomalies, history)
+
+
+def current_snapshot():
+    """The data version that new requests use."""
+    return _snapshot
+
+
+@lru_cache(maxsize=HISTORY_CACHED_YEARS)
+def year_codes(snapshot, year):
+    """Code table of one historic year, with the labels of the snapshot."""
+    return build_code_table(read_year(year), categories=snapshot.labels)
+
+
+# Live updates recompute on every filter edit, so they are only offered when
+# the server aggregation meets the latency budget on this machine and data.
+# Building the figures is not covered, see src/benchmarks/latency.py.
+LIVE_BUDGET_MS = float(os.environ.get('ARREST_TRACKER_LIVE_BUDGET_MS', 50))
+
+
+def live_available(snapshot):
+    """Whether live updates met the latency budget on a snapshot."""
+    return (
+        snapshot.live_latency_ms is not None and
+        snapshot.live_latency_ms <= LIVE_BUDGET_MS
+    )
+
+
+def time_live_updates(snapshot):
+    """Time the server aggregation of live updates, for live_available."""
+    snapshot.live_latency_ms = live_update_latency(snapshot.codes)
+
+
+def start_live_timing(snapshot):
+    """
+    Time live updates on a snapshot in a background thread, so startup does
+    not wait for it. Live updates stay unavailable until it finishes.
+    """
+    threading.Thread(
+        target=time_live_updates, args=(snapshot,), name='live-latency',
+        daemon=True
+    ).start()
+
+
+# Version whose code table the process pool holds, if it is running
+pool_version = None
+
+
+def start_workers(workers):
+    """Start the process pool on the code table of the current snapshot."""
+    global pool_version
+    start_pool(_snapshot.codes, workers)
+    pool_version = _snapshot.version
+
+
+def use_pool(snapshot, area):
+    """Whether a query on the snapshot can be counted in the process pool."""
+    # Area queries only touch a few rows, the pool would not help
+    return pool_started() and not area and snapshot.version == pool_version
+
+
+def move_pool(snapshot):
+    """
+    Restart the process pool, if it is running, on a new snapshot's code
+    table and release the shared memory of the old one.
+    """
+    global pool_version
+    if not pool_started():
+        return
+    # The old snapshot is counted serially until the new one is swapped in
+    pool_version = None
+    restart_pool(snapshot.codes)
+    pool_version = snapshot.version
+
+
+# Run on every new snapshot before it is swapped in, after its cache is
+# warm. Reloads already run in the background, so reloaded data is timed
+# here and is ready when it is swapped in.
+snapshot_hooks = [time_live_updates, move_pool]
+
+
+def normalize_filters(start_date=None, end_date=None, crime_types=None,
+                      selected_locations=None, area=None):
+    """
+    Put filters in a canonical form so equal filters share cache entries.
+
+    Returns:
+    tuple: (start_date, end_date, crime_types, selected_locations, area)
+    """
+    return (
+        start_date if start_date and end_date else None,
+        end_date if start_date and end_date else None,
+        tuple(sorted(crime_types)) if crime_types else None,
+        tuple(sorted(selected_locations, key=str)) if selected_locations else None,
+        tuple(area) if area else None
+    )
+
+
+# Cache aggregates per dataset version and filter combination. The snapshot
+# is left out of the key, its version identifies it.
+@cache.memoize(timeout=60*60, args_to_ignore=['snapshot'])  # Cache for 1 hour
+def cached_aggregates(snapshot, version, start_date, end_date, crime_types,
+                      selected_locations, area):
+    if use_pool(snapshot, area):
+        aggregates = parallel_aggregate(
+            start_date, end_date, crime_types, selected_locations,
+            snapshot.codes
+        )
+        if aggregates is not None:
+            return aggregates
+
+    return fused_aggregate(
+        snapshot.codes,
+        start_date=start_date,
+        end_date=end_date,
+        crime_types=crime_types,
+        selected_locations=selected_locations,
+        area=area
+    )
+
+
+def get_aggregates(start_date=None, end_date=None, crime_types=None,
+                   selected_locations=None, area=None, snapshot=None):
+    """
+    Get the arrest counts for a filter combination, computing them at most
+    once per dataset version.
+
+    Returns:
+    dict: Output of aggregate_arrests
+    """
+    snapshot = snapshot or current_snapshot()
+    start_date, end_date, crime_types, selected_locations, area = (
+        normalize_filters(
+            start_date, end_date, crime_types, selected_locations, area
+        )
+    )
+    # Historic years are counted per precinct, locations are applied after
+    if snapshot.split_dates(start_date, end_date)[0]:
+        return store_aggregates(
+            cached_region_counts(
+                snapshot, snapshot.version, start_date, end_date, crime_types,
+                area
+            ),
+            selected_locations
+        )
+    return cached_aggregates(
+        snapshot, snapshot.version, start_date, end_date, crime_types,
+        selected_locations, area
+    )
+
+
+def current_region_counts(snapshot, start_date, end_date, crime_types, area,
+                          session=None):
+    """
+    Count the current data by precinct x offense/sex/age group. With a
+    session, a query that narrows the session's last one only filters the
+    rows that query matched.
+    """
+    if use_pool(snapshot, area):
+        counts = parallel_region_counts(
+            start_date, end_date, crime_types, snapshot.codes
+        )
+        if counts is not None:
+            return counts
+    if session is None:
+        return fused_region_counts(
+            snapshot.codes,
+            start_date=start_date,
+            end_date=end_date,
+            crime_types=crime_types,
+            area=area
+        )
+
+    filters = (start_date, end_date, crime_types, area)
+    regions, rows = fused_region_rows(
+        snapshot.codes, *filters,
+        rows=session_rows.get(session, snapshot.version, filters)
+    )
+    # Narrowing from every row saves nothing, so those are not kept
+    if len(rows) < len(snapshot.codes['key']):
+        session_rows.put(session, snapshot.version, filters, rows)
+    else:
+        session_rows.forget(session)
+    return regions
+
+
+# Cache the counts of each historic year separately, so overlapping date
+# ranges reuse the years they share
+@cache.memoize(timeout=60*60, args_to_ignore=['snapshot'])  # Cache for 1 hour
+def cached_year_region_counts(snapshot, version, year, start_date, end_date,
+                              crime_types, area):
+    return fused_region_counts(
+        year_codes(snapshot, year),
+        start_date=start_date,
+        end_date=end_date,
+        crime_types=crime_types,
+        area=area
+    )
+
+
+# Cache the compact per-precinct aggregate behind the dashboard's store. The
+# session only picks which earlier rows to refine, not the result.
+@cache.memoize(timeout=60*60, args_to_ignore=['snapshot', 'session'])
+def cached_region_counts(snapshot, version, start_date, end_date, crime_types,
+                         area, session=None):
+    years, current = snapshot.split_dates(start_date, end_date)
+    if not years:
+        return compact_aggregate(
+            snapshot.codes,
+            current_region_counts(
+                snapshot, start_date, end_date, crime_types, area, session
+            )
+        )
+
+    # Only the years in the date range are opened
+    parts = [
+        cached_year_region_counts(
+            snapshot, version, year, year_start, year_end, crime_types, area
+        )
+        for year, year_start, year_end in years
+    ]
+    if current:
+        parts.append(
+            current_region_counts(snapshot, *current, crime_types, area)
+        )
+    return compact_aggregate(snapshot.codes, add_regions(snapshot.codes, parts))
+
+
+def get_region_counts(start_date=None, end_date=None, crime_types=None,
+                      area=None, snapshot=None, session=None):
+    """
+    Get the compact per-precinct aggregate for a filter combination. Region
+    selections are applied to it when rendering, so they need no new pass
+    over the data. Pass the session id to refine the session's last query
+    when the filters narrow it.
+
+    Returns:
+    dict: Output of compact_aggregate
+    """
+    snapshot = snapshot or current_snapshot()
+    start_date, end_date, crime_types, _, area = normalize_filters(
+        start_date, end_date, crime_types, None, area
+    )
+    # Passed by position: flask_caching keeps ignored keyword arguments in
+    # the cache key
+    return cached_region_counts(
+        snapshot, snapshot.version, start_date, end_date, crime_types, area,
+        session
+    )
+
+
+# Cache the compact aggregates of a selected and a comparison period together
+@cache.memoize(timeout=60*60, args_to_ignore=['snapshot'])  # Cache for 1 hour
+def cached_period_region_counts(snapshot, version, period, comparison_period,
+                                crime_types, area):
+    # Each partition touched by either period is read once for both
+    selected_years, selected_current = snapshot.split_dates(*period)
+    comparison_years, comparison_current = snapshot.split_dates(
+        *comparison_period
+    )
+    selected_years = {year: dates for year, *dates in selected_years}
+    comparison_years = {year: dates for year, *dates in comparison_years}
+    parts = [
+        fused_period_region_counts(
+            year_codes(snapshot, year),
+            selected_years.get(year),
+            comparison_years.get(year),
+            crime_types=crime_types,
+            area=area
+        )
+        for year in sorted(selected_years.keys() | comparison_years.keys())
+    ]
+    if selected_current or comparison_current:
+        parts.append(fused_period_region_counts(
+            snapshot.codes,
+            selected_current,
+            comparison_current,
+            crime_types=crime_types,
+            area=area
+        ))
+    return tuple(
+        compact_aggregate(
+            snapshot.codes,
+            add_regions(snapshot.codes, [part[index] for part in parts])
+        )
+        for index in (0, 1)
+    )
+
+
+def get_period_region_counts(start_date=None, end_date=None,
+                             compare_start_date=None, compare_end_date=None,
+                             crime_types=None, area=None, snapshot=None):
+    """
+    Get the compact per-precinct aggregates of a selected and a comparison
+    period. Both are counted in one pass over each part of the data they
+    touch.
+
+    Returns:
+    tuple: (selected, comparison) outputs of compact_aggregate
+    """
+    snapshot = snapshot or current_snapshot()
+    start_date, end_date, crime_types, _, area = normalize_filters(
+        start_date, end_date, crime_types, None, area
+    )
+    compare_start_date, compare_end_date, *_ = normalize_filters(
+        compare_start_date, compare_end_date
+    )
+    return cached_period_region_counts(
+        snapshot, snapshot.version, (start_date, end_date),
+        (compare_start_date, compare_end_date), crime_types, area
+    )
+
+
+def get_estimated_region_counts(start_date=None, end_date=None,
+                                crime_types=None, snapshot=None):
+    """
+    Estimate the compact per-precinct aggregate from the sample, or return
+    None when the query is small enough to answer exactly right away.
+
+    Returns:
+    dict: Output of compact_aggregate with variances, or None
+    """
+    snapshot = snapshot or current_snapshot()
+    start_date, end_date, crime_types, _, _ = normalize_filters(
+        start_date, end_date, crime_types
+    )
+    # The sample only covers the current data
+    if snapshot.split_dates(start_date, end_date)[0]:
+        return None
+    if estimated_rows(snapshot.sample, start_date, end_date) < APPROXIMATE_MIN_ROWS:
+        return None
+    estimates, variances = estimate_region_counts(
+        snapshot.sample, start_date, end_date, crime_types
+    )
+    return compact_aggregate(snapshot.codes, estimates, variances)
+
+
+# Cache drill-down counts the same way as the aggregates
+@cache.memoize(timeout=60*60, args_to_ignore=['snapshot'])  # Cache for 1 hour
+def cached_drill_counts(snapshot, version, path, start_date, end_date,
+                        selected_locations):
+    return drill_counts(
+        snapshot.hierarchy, list(path), start_date, end_date,
+        selected_locations
+    )
+
+
+def get_drill_counts(path, start_date=None, end_date=None,
+                     selected_locations=None, snapshot=None):
+    """
+    Count the arrests of each child of an offense drill-down node from the
+    precomputed hierarchy, or return None when the date range reaches into
+    historic years, which have no PD descriptions or law codes.
+
+    Returns:
+    pd.DataFrame: Output of drill_counts, or None
+    """
+    snapshot = snapshot or current_snapshot()
+    start_date, end_date, _, selected_locations, _ = normalize_filters(
+        start_date, end_date, selected_locations=selected_locations
+    )
+    if snapshot.split_dates(start_date, end_date)[0]:
+        return None
+    return cached_drill_counts(
+        snapshot, snapshot.version, tuple(path), start_date, end_date,
+        selected_locations
+    )
+
+
+def crosstab_part(table, row_dimension, column_dimension, start_date,
+                  end_date, crime_types, area, rows=None):
+    """
+    Per-precinct cross-tab counts of one code table, from
+    precinct_crosstab_matrix, optionally only over the sorted rows of an
+    earlier, wider query.
+    """
+    if area:
+        selected = area_rows(table['grid'], area)
+        if rows is not None:
+            selected = np.intersect1d(rows, selected, assume_unique=True)
+        rows = selected
+    elif rows is None:
+        rows = slice(None)
+    mask = kernel_mask(
+        table,
+        start_date=start_date,
+        end_date=end_date,
+        crime_types=crime_types,
+        rows=rows
+    )
+    return precinct_crosstab_matrix(
+        table, row_dimension, column_dimension, mask, rows
+    )
+
+
+# Cache cross-tabs the same way as the aggregates. The counts are kept per
+# precinct, so region clicks only sum the cached counts.
+@cache.memoize(timeout=60*60, args_to_ignore=['snapshot', 'session'])
+def cached_crosstab(snapshot, version, row_dimension, column_dimension,
+                    start_date, end_date, crime_types, area, session=None):
+    years, current = snapshot.split_dates(start_date, end_date)
+    if not years and session is not None:
+        # Narrowed queries only look at the rows of the session's last query
+        rows = session_rows.get(
+            session, version, (start_date, end_date, crime_types, area)
+        )
+        if rows is not None:
+            return crosstab_part(
+                snapshot.codes, row_dimension, column_dimension,
+                start_date, end_date, crime_types, area, rows=rows
+            )
+    filters = (crime_types, area)
+    parts = [
+        crosstab_part(
+            year_codes(snapshot, year), row_dimension, column_dimension,
+            year_start, year_end, *filters
+        )
+        for year, year_start, year_end in years
+    ]
+    if current:
+        parts.append(crosstab_part(
+            snapshot.codes, row_dimension, column_dimension, *current,
+            *filters
+        ))
+    return sum(parts)
+
+
+def get_crosstab(row_dimension, column_dimension, start_date=None,
+                 end_date=None, crime_types=None, selected_locations=None,
+                 area=None, snapshot=None, session=None):
+    """
+    Get the cross-tab of two dimensions for a filter combination. The
+    per-precinct counts of the filters are computed at most once per dataset
+    version, and selected locations only sum them. Pass the session id to
+    only look at the rows of the session's last aggregate when the filters
+    narrow it.
+
+    Returns:
+    dict: Output of crosstab_counts
+    """
+    snapshot = snapshot or current_snapshot()
+    start_date, end_date, crime_types, selected_locations, area = (
+        normalize_filters(
+            start_date, end_date, crime_types, selected_locations, area
+        )
+    )
+    counts = cached_crosstab(
+        snapshot,
+        snapshot.version,
+        row_dimension,
+        column_dimension,
+        start_date,
+        end_date,
+        crime_types,
+        area,
+        session
+    )
+    return crosstab_from_matrix(
+        snapshot.codes, row_dimension, column_dimension,
+        select_precincts(counts, row_dimension, selected_locations)
+    )
+
+
+def warm_cache(snapshot):
+    """
+    Compute the default dashboard view of a snapshot before it is swapped
+    in, so the first visitors after a reload do not all miss the cache, and
+    run the snapshot_hooks on it.
+    """
+    dates = (snapshot.options['min_date'], snapshot.options['max_date'])
+    get_region_counts(*dates, snapshot=snapshot)
+    get_crosstab(*CROSSTAB_PAIRS['precinct-race'], *dates, snapshot=snapshot)
+    for hook in snapshot_hooks:
+        hook(snapshot)
+
+
+def reload_snapshot():
+    """
+    Load the processed data again if its files changed, warm the cache for
+    it and swap it in. Requests that already took the old snapshot finish
+    on it.
+
+    Returns:
+    bool: Whether a new snapshot was swapped in
+    """
+    global _snapshot
+    if data_signature() == _snapshot.signature:
+        return False
+    snapshot = load_snapshot()
+    warm_cache(snapshot)
+    # Rebinding the name is atomic, new requests see the new version
+    _snapshot = snapshot
+    year_codes.cache_clear()
+    return True
+
+
+def watch_data(server, interval):
+    """
+    Check the processed data for changes every `interval` seconds in a
+    background thread, and reload it when it changes. Files that fail to
+    load are skipped until they change again.
+
+    Parameters:
+    server (flask.Flask): Server whose cache is warmed
+    interval (float): Seconds between checks
+    """
+    def watch():
+        failed_signature = None
+        while True:
+            time.sleep(interval)
+            signature = None
+            try:
+                signature = data_signature()
+                # Files that failed to load are only tried again once they
+                # change, for example when they were still being written
+                if signature == failed_signature:
+                    continue
+                with server.app_context():
+                    reload_snapshot()
+            except Exception:
+                failed_signature = signature
+                server.logger.exception("Reloading the arrest data failed")
+
+    threading.Thread(target=watch, name='data-reload', daemon=True).start()
@@ -1,3 +1,5 @@
+from . import aggregate
 from . import buttons
 from . import charts
-from . import map
\ No newline at end of file
+from . import map
+from . import latency
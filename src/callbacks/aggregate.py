@@ -0,0 +1,236 @@
+from dash import (
+    ClientsideFunction,
+    Input,
+    Output,
+    State,
+    callback,
+    callback_context,
+    clientside_callback
+)
+from dash.exceptions import PreventUpdate
+
+from src.cache import (
+    current_snapshot,
+    get_estimated_region_counts,
+    get_period_region_counts,
+    get_region_counts,
+    live_available
+)
+
+# Apply, Reset and debounced live edits feed both the exact and the
+# estimated aggregate
+FILTER_INPUTS = [
+    Input('apply-button', 'n_clicks'),
+    Input('reset-button', 'n_clicks'),
+    Input('live-trigger', 'data')
+]
+FILTER_STATES = [
+    State('date-picker-range', 'start_date'),
+    State('date-picker-range', 'end_date'),
+    State('crime-type-dropdown', 'value'),
+    State('compare-toggle', 'value'),
+    State('compare-date-picker-range', 'start_date'),
+    State('compare-date-picker-range', 'end_date'),
+    State('area-store', 'data')
+]
+
+
+def applied_filters(start_date, end_date, crime_types, compare,
+                    compare_start_date, compare_end_date, area):
+    """
+    Get the filters of an Apply or Reset click.
+
+    Returns:
+    tuple: (filters, comparison filters or None)
+    """
+    ctx = callback_context
+    triggered_id = None
+    if ctx.triggered:
+        triggered_id = ctx.triggered[0]['prop_id'].split('.')[0]
+
+    # Live edits are refused when the server is over the latency budget
+    if (triggered_id == 'live-trigger' and
+            not live_available(current_snapshot())):
+        raise PreventUpdate
+
+    # Filters only apply when the apply button was clicked, or in live mode
+    if triggered_id not in ('apply-button', 'live-trigger'):
+        return {}, None
+
+    filters = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'crime_types': crime_types if crime_types else None,
+        'area': area
+    }
+    comparison = None
+    if compare and compare_start_date and compare_end_date:
+        comparison = {
+            **filters,
+            'start_date': compare_start_date,
+            'end_date': compare_end_date
+        }
+    return filters, comparison
+
+
+def latest_aggregate(exact, estimate):
+    """
+    Pick the aggregate to render: the exact one, unless an estimate for
+    newer filters is waiting for its exact counts.
+
+    Returns:
+    dict: Stored aggregate
+    """
+    if exact is None and estimate is None:
+        raise PreventUpdate
+    if estimate is None:
+        return exact
+    # Click and live update counts only grow, so their sum orders the
+    # filter changes
+    if exact is None or sum(estimate['token']) > sum(exact['token']):
+        return estimate
+    return exact
+
+
+def stored_aggregate(token, filters, comparison=None, session=None):
+    """
+    Count the arrests for applied filters into the aggregate-store layout.
+
+    Parameters:
+    token (list): Apply, Reset and live update counts, to order the stores
+    filters (dict): Output of applied_filters
+    comparison (dict): Comparison filters, or None
+    session (str): Browser tab id, to refine the tab's last query
+
+    Returns:
+    dict: 'token', data 'version', 'filters', 'selected' and 'comparison'
+    compact aggregates
+    """
+    snapshot = current_snapshot()
+    if comparison:
+        # Both periods are counted in one pass, on the same data version
+        selected, compared = get_period_region_counts(
+            **filters,
+            compare_start_date=comparison['start_date'],
+            compare_end_date=comparison['end_date'],
+            snapshot=snapshot
+        )
+    else:
+        selected = get_region_counts(
+            **filters, snapshot=snapshot, session=session
+        )
+        compared = None
+    return {
+        'token': token,
+        'version': snapshot.version,
+        'filters': filters,
+        'selected': selected,
+        'comparison': compared
+    }
+
+
+@callback(
+    Output('aggregate-store', 'data'),
+    FILTER_INPUTS,
+    [State('session-id', 'data'), *FILTER_STATES]
+)
+def update_aggregate_store(apply_clicks, reset_clicks, live_updates,
+                           session, *filter_values):
+    """
+    Count the arrests for the applied filters once, for the map and all
+    charts. Region clicks and map toggles render from the stored counts.
+    """
+    filters, comparison = applied_filters(*filter_values)
+    return stored_aggregate(
+        [apply_clicks or 0, reset_clicks or 0, live_updates or 0],
+        filters,
+        comparison,
+        session
+    )
+
+
+@callback(
+    Output('estimate-store', 'data'),
+    FILTER_INPUTS,
+    FILTER_STATES
+)
+def update_estimate_store(apply_clicks, reset_clicks, live_updates,
+                          *filter_values):
+    """
+    Estimate the same aggregate from the stratified sample, so large queries
+    show something while the exact counts are computed.
+    """
+    filters, comparison = applied_filters(*filter_values)
+
+    # Area queries only touch a few rows and are answered exactly
+    if filters.get('area'):
+        raise PreventUpdate
+    sample_filters = {
+        name: value for name, value in filters.items() if name != 'area'
+    }
+    snapshot = current_snapshot()
+    selected = get_estimated_region_counts(**sample_filters, snapshot=snapshot)
+    if selected is None:
+        raise PreventUpdate
+
+    estimate_comparison = None
+    if comparison:
+        estimate_comparison = get_estimated_region_counts(
+            **{
+                **sample_filters,
+                'start_date': comparison['start_date'],
+                'end_date': comparison['end_date']
+            },
+            snapshot=snapshot
+        )
+        if estimate_comparison is None:
+            raise PreventUpdate
+
+    return {
+        'token': [apply_clicks or 0, reset_clicks or 0, live_updates or 0],
+        'version': snapshot.version,
+        'filters': filters,
+        'selected': selected,
+        'comparison': estimate_comparison
+    }
+
+
+@callback(
+    [Output('aggregate-status', 'children'),
+     Output('aggregate-status', 'color')],
+    [Input('aggregate-store', 'data'),
+     Input('estimate-store', 'data')]
+)
+def update_aggregate_status(exact, estimate):
+    # Tell users whether the numbers on screen are estimated or exact
+    aggregate = latest_aggregate(exact, estimate)
+    if aggregate['selected'].get('estimated'):
+        snapshot = current_snapshot()
+        share = len(snapshot.sample['key']) / max(len(snapshot.codes['key']), 1)
+        return (
+            f"Estimated from a {share:.0%} sample, computing exact counts...",
+            "warning"
+        )
+    return "Exact counts", "success"
+
+
+# Debounce live edits in the browser: only the last edit in a short pause
+# reaches the server, through the live-trigger store
+clientside_callback(
+    ClientsideFunction(namespace='live', function_name='debounce'),
+    Output('live-trigger', 'data'),
+    [Input('crime-type-dropdown', 'value'),
+     Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date'),
+     Input('live-toggle', 'value')],
+    prevent_initial_call=True
+)
+
+
+# Give each browser tab a random id once, kept across reloads of the tab
+clientside_callback(
+    ClientsideFunction(namespace='session', function_name='start'),
+    Output('session-id', 'data'),
+    Input('session-id', 'modified_timestamp'),
+    State('session-id', 'data')
+)
@@ -1,6 +1,9 @@
+from urllib.parse import urlencode
+
 from dash import Output, Input, State, callback, callback_context
 import dash
-from src.data import min_date, max_date
+from src.cache import current_snapshot
+from src.utils import get_selected_area, get_selected_location, year_marks
 
 
 @callback(
@@ -26,16 +29,105 @@ def reset_crime_dropdown(n_clicks):
 
 @callback(
     [Output('date-picker-range', 'start_date'),
-     Output('date-picker-range', 'end_date')],
+     Output('date-picker-range', 'end_date'),
+     Output('compare-date-picker-range', 'start_date'),
+     Output('compare-date-picker-range', 'end_date'),
+     Output('compare-toggle', 'value'),
+     Output('year-slider', 'value')],
     Input('reset-button', 'n_clicks'),
     prevent_initial_call=True
 )
 def reset_date_range(n_clicks):
     ctx = callback_context
     if not ctx.triggered or ctx.triggered[0]['prop_id'] != 'reset-button.n_clicks':
-        return dash.no_update, dash.no_update
+        return (dash.no_update,) * 6
     
-    return min_date, max_date
+    options = current_snapshot().options
+    min_date, max_date = options['min_date'], options['max_date']
+    years = options['current_years']
+    return min_date, max_date, min_date, max_date, False, [years[0], years[-1]]
+
+@callback(
+    [Output('date-picker-range', 'start_date', allow_duplicate=True),
+     Output('date-picker-range', 'end_date', allow_duplicate=True)],
+    Input('year-slider', 'value'),
+    prevent_initial_call=True
+)
+def select_years(years):
+    # Cover the selected years, within the dates that have data
+    options = current_snapshot().options
+    return (
+        max(f"{years[0]}-01-01", options['earliest_date']),
+        min(f"{years[1]}-12-31", options['max_date'])
+    )
+
+@callback(
+    [Output('crime-type-dropdown', 'options'),
+     Output('date-picker-range', 'min_date_allowed'),
+     Output('date-picker-range', 'max_date_allowed'),
+     Output('compare-date-picker-range', 'min_date_allowed'),
+     Output('compare-date-picker-range', 'max_date_allowed'),
+     Output('year-slider', 'min'),
+     Output('year-slider', 'max'),
+     Output('year-slider', 'marks'),
+     Output('year-selector', 'style')],
+    Input('dataset-version', 'data')
+)
+def refresh_filter_options(version):
+    # Pages built from older data get the choices of the reloaded data
+    snapshot = current_snapshot()
+    if version == snapshot.version:
+        return (dash.no_update,) * 9
+
+    options = snapshot.options
+    years = options['arrest_years']
+    return (
+        [{"label": crime, "value": crime} for crime in options['crime_types']],
+        options['earliest_date'], options['max_date'],
+        options['earliest_date'], options['max_date'],
+        years[0], years[-1], year_marks(years),
+        {"display": "block" if snapshot.history_years else "none"}
+    )
+
+@callback(
+    Output('area-type', 'value'),
+    Input('reset-button', 'n_clicks'),
+    prevent_initial_call=True
+)
+def reset_area(n_clicks):
+    return "none"
+
+@callback(
+    [Output("radius-collapse", "is_open"),
+     Output("box-collapse", "is_open")],
+    Input("area-type", "value")
+)
+def toggle_area_inputs(area_type):
+    # Only show the inputs of the selected area type
+    return area_type == "radius", area_type == "box"
+
+@callback(
+    Output("area-store", "data"),
+    [Input("area-type", "value"),
+     Input("area-x", "value"),
+     Input("area-y", "value"),
+     Input("area-radius", "value"),
+     Input("area-x-min", "value"),
+     Input("area-y-min", "value"),
+     Input("area-x-max", "value"),
+     Input("area-y-max", "value")]
+)
+def update_area(area_type, x, y, radius, x_min, y_min, x_max, y_max):
+    # Combine the area inputs into one filter value
+    return get_selected_area(area_type, x, y, radius, x_min, y_min, x_max, y_max)
+
+@callback(
+    Output("compare-collapse", "is_open"),
+    Input("compare-toggle", "value")
+)
+def toggle_compare_dates(compare):
+    # Only show the comparison date range in comparison mode
+    return bool(compare)
 
 @callback(
     Output("footer-collapse", "is_open"),
@@ -54,4 +146,29 @@ def toggle_footer(n, is_open):
 def update_footer_button_text(is_open):
     if is_open:
         return "About ▲" 
-    return "About ▼" 
\ No newline at end of file
+    return "About ▼" 
+
+@callback(
+    [Output("download-csv-link", "href"),
+     Output("download-parquet-link", "href")],
+    [Input('aggregate-store', 'data'),
+     Input('map', 'signalData')]
+)
+def update_download_links(aggregate, clicked_region):
+    # Point the download links at the rows behind the charts: the applied
+    # filters, not the values still being edited in the sidebar
+    filters = aggregate['filters'] if aggregate else {}
+    area = filters.get('area')
+    selected_locations, _ = get_selected_location(clicked_region)
+    params = {
+        'start_date': filters.get('start_date') or '',
+        'end_date': filters.get('end_date') or '',
+        'crime_type': filters.get('crime_types') or [],
+        'location': selected_locations or []
+    }
+    if area:
+        params['radius' if area[0] == 'radius' else 'bbox'] = ",".join(
+            str(value) for value in area[1:]
+        )
+    query = urlencode(params, doseq=True)
+    return f"/download/arrests.csv?{query}", f"/download/arrests.parquet?{query}"
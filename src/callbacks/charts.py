@@ -1,108 +1,106 @@
-from dash import Output, Input, State, callback, callback_context
+from dash import (
+    ClientsideFunction,
+    Input,
+    Output,
+    State,
+    callback,
+    callback_context,
+    clientside_callback
+)
+from dash.exceptions import PreventUpdate
 
-from src.data import nyc_arrests
+from src.cache import current_snapshot, get_crosstab, get_drill_counts
+from .aggregate import latest_aggregate
 from src.utils import (
-    filter_data,
     get_selected_location,
-    filter_data_by_location,
+    format_area_label,
     create_pie_chart,
     create_bar_chart,
     create_empty_pie_chart,
-    create_empty_bar_chart
+    create_empty_bar_chart,
+    store_aggregates,
+    combine_periods,
+    create_comparison_bar_chart,
+    create_comparison_pie_chart,
+    create_heatmap,
+    CROSSTAB_PAIRS,
+    CROSSTAB_TITLES,
+    HIERARCHY_COLUMNS,
+    HIERARCHY_TITLES
 )
 
-@callback(
-    [Output('crime-bar-chart', 'figure'),
-     Output('gender-pie-chart', 'figure'),
-     Output('age-pie-chart', 'figure')],
-    [Input('map', 'signalData'),
-     Input('apply-button', 'n_clicks'),
-     Input('reset-button', 'n_clicks')],
-    [State('date-picker-range', 'start_date'),
-     State('date-picker-range', 'end_date'),
-     State('crime-type-dropdown', 'value')]
-)
-def update_all_pie_charts(
-    clicked_region, apply_clicks, reset_clicks,
-    start_date, end_date, crime_types
-):
-    ctx = callback_context
-    # Get the ID of the component that triggered the callback
-    triggered_id = None
-    if ctx.triggered:
-        triggered_id = ctx.triggered[0]['prop_id'].split('.')[0]
 
-    # First get unfiltered data
-    filtered_by_crime = nyc_arrests
+def format_crime_types(crime_types):
+    """
+    Describe the applied crime types for chart titles.
 
-    # Format crime types for display
+    Returns:
+    tuple: (crime type label, line break to put before it in pie titles)
+    """
     if not crime_types:
-        crime_type_display = ""
-        pie_sep = ""
-    elif len(crime_types) == 1:
-        crime_type_display = f" - {crime_types[0]}"
-        pie_sep = "<br>"
-    else:
-        crime_type_display = f" - Selected Crimes ({len(crime_types)})"
-        pie_sep = "<br>"
-
-    # Apply filter ONLY if the apply button was clicked
-    if triggered_id == "apply-button" or triggered_id == "map":
-        # Use vectorized filtering with the combined filter function
-        filtered_by_crime = filter_data(
-            nyc_arrests, 
-            start_date=start_date, 
-            end_date=end_date,
-            crime_types=crime_types if crime_types else None
-        )
+        return "", ""
+    if len(crime_types) == 1:
+        return f" - {crime_types[0]}", "<br>"
+    return f" - Selected Crimes ({len(crime_types)})", "<br>"
+
 
-    # Reset button was clicked - reset to original unfiltered data
-    if triggered_id == "reset-button":
-        filtered_by_crime = nyc_arrests
-        location_label_display = ""
-        crime_type_display = ""
+def update_all_pie_charts(clicked_region, exact, estimate):
+    # Charts render from the stored aggregate, so region clicks do not go
+    # back to the arrest table
+    aggregate = latest_aggregate(exact, estimate)
+    filters = aggregate['filters']
+    crime_types = filters.get('crime_types')
 
-    # Get selected location from map click
-    selected_location, location_label = get_selected_location(clicked_region)
+    # Format crime types for display, marking estimates
+    crime_type_display, pie_sep = format_crime_types(crime_types)
+    crime_type_display = (
+        f"{format_area_label(filters.get('area'))}{crime_type_display}"
+    )
+    if aggregate['selected'].get('estimated'):
+        crime_type_display = f"{crime_type_display} (Estimated)"
+
+    # Get selected locations from map click (shift-click selects several)
+    selected_locations, location_label = get_selected_location(clicked_region)
 
-    # Apply location filter if a location is selected
-    if selected_location is not None:
-        filtered_data = filter_data_by_location(
-            selected_location,
-            filtered_by_crime
+    # Comparison mode counts both periods side by side
+    if aggregate['comparison'] is not None:
+        return update_comparison_charts(
+            aggregate, selected_locations, location_label,
+            crime_types, crime_type_display, pie_sep
         )
-        if filtered_data is None or filtered_data.empty:
+
+    aggregates = None
+    location_label_display = ""
+    if selected_locations is not None:
+        aggregates = store_aggregates(aggregate['selected'], selected_locations)
+        if aggregates['total'] == 0:
             # If no data for selected location, just use crime-filtered data
-            filtered_data = filtered_by_crime
-            location_label_display = ""
+            aggregates = None
         else:
             location_label_display = f" in {location_label}"
-    else:
-        filtered_data = filtered_by_crime
-        location_label_display = ""
 
-    if filtered_data.empty:
+    if aggregates is None:
+        aggregates = store_aggregates(aggregate['selected'])
+
+    if aggregates['total'] == 0:
         return (
             create_empty_bar_chart(),
             create_empty_pie_chart(),
             create_empty_pie_chart()
         )
 
-    # For crime chart - obtain counts in one operation
-    crime_counts = filtered_data['OFNS_DESC'].value_counts().reset_index()
-    crime_counts.columns = ['OFNS_DESC', 'Arrests']
+    crime_counts = aggregates['offense']
 
     # Create appropriate crime chart based on filters
-    if (triggered_id == "apply-button" and crime_types and
-            len(crime_types) <= 3):
+    if crime_types and len(crime_types) <= 3:
         # Filter the pre-computed counts instead of filtering the DataFrame again
         crime_counts = crime_counts[crime_counts['OFNS_DESC'].isin(crime_types)]
         crime_title = (
             f"Selected Crime Types{location_label_display}{crime_type_display}"
         )
     else:
-        # Sort and get top 5 without additional filtering
-        crime_counts = crime_counts.sort_values(by='Arrests', ascending=False).head(5)
+        # Counts are already sorted, get top 5 without additional filtering
+        crime_counts = crime_counts.head(5)
         crime_title = (
             f"Top 5 Crime Types{location_label_display}"
             f"{crime_type_display}"
@@ -111,23 +109,237 @@ def update_all_pie_charts(
     # Create crime chart with the pre-computed data
     updated_crime_chart = create_bar_chart(crime_counts, crime_title)
 
-    # Gender aggregation - convert to proper DataFrame format in one step
-    gender_counts = filtered_data['PERP_SEX'].value_counts().reset_index()
-    gender_counts.columns = ['PERP_SEX', 'Arrests']
-    
-    # Age aggregation - convert to proper DataFrame format in one step
-    age_counts = filtered_data['AGE_GROUP'].value_counts().reset_index()
-    age_counts.columns = ['AGE_GROUP', 'Arrests']
-
     # Create charts with pre-computed data
     updated_gender_chart = create_pie_chart(
-        gender_counts,
+        aggregates['sex'],
         f"Arrests by Gender{location_label_display}{pie_sep}{crime_type_display}"
     )
 
     updated_age_chart = create_pie_chart(
-        age_counts,
+        aggregates['age'],
+        f"Arrests by Age Group{location_label_display}{pie_sep}{crime_type_display}"
+    )
+
+    return updated_crime_chart, updated_gender_chart, updated_age_chart
+
+
+def update_comparison_charts(
+    aggregate, selected_locations, location_label,
+    crime_types, crime_type_display, pie_sep
+):
+    """
+    Build the bar and pie charts for comparison mode from the stored
+    aggregates of both periods.
+
+    Returns:
+    tuple: (crime chart, gender chart, age chart)
+    """
+    location_label_display = f" in {location_label}" if location_label else ""
+
+    selected = store_aggregates(aggregate['selected'], selected_locations)
+    comparison = store_aggregates(aggregate['comparison'], selected_locations)
+
+    if selected['total'] == 0 and comparison['total'] == 0:
+        return (
+            create_empty_bar_chart(),
+            create_empty_pie_chart(),
+            create_empty_pie_chart()
+        )
+
+    crime_counts = combine_periods(selected['offense'], comparison['offense'])
+    if crime_types and len(crime_types) <= 3:
+        crime_counts = crime_counts[crime_counts['OFNS_DESC'].isin(crime_types)]
+        crime_title = (
+            f"Selected Crime Types{location_label_display}{crime_type_display}"
+        )
+    else:
+        crime_title = (
+            f"Top 5 Crime Types{location_label_display}{crime_type_display}"
+        )
+
+    updated_crime_chart = create_comparison_bar_chart(crime_counts, crime_title)
+
+    updated_gender_chart = create_comparison_pie_chart(
+        combine_periods(selected['sex'], comparison['sex']),
+        f"Arrests by Gender{location_label_display}{pie_sep}{crime_type_display}"
+    )
+
+    updated_age_chart = create_comparison_pie_chart(
+        combine_periods(selected['age'], comparison['age']),
         f"Arrests by Age Group{location_label_display}{pie_sep}{crime_type_display}"
     )
 
-    return updated_crime_chart, updated_gender_chart, updated_age_chart
\ No newline at end of file
+    return updated_crime_chart, updated_gender_chart, updated_age_chart
+
+
+
+def update_crosstab_heatmap(pair, clicked_region, aggregate, session=None):
+    # Use the filters applied with the stored aggregate
+    if aggregate is None:
+        raise PreventUpdate
+    filters = aggregate['filters']
+
+    selected_locations, location_label = get_selected_location(clicked_region)
+    location_label_display = f" in {location_label}" if location_label else ""
+
+    row_dimension, column_dimension = CROSSTAB_PAIRS[pair]
+    crosstab = get_crosstab(
+        row_dimension, column_dimension,
+        **filters, selected_locations=selected_locations, session=session
+    )
+    if crosstab['total'] == 0:
+        return create_empty_bar_chart()
+
+    crime_type_display, _ = format_crime_types(filters.get('crime_types'))
+    return create_heatmap(
+        crosstab,
+        f"Arrests by {CROSSTAB_TITLES[row_dimension]} and "
+        f"{CROSSTAB_TITLES[column_dimension]}{location_label_display}"
+        f"{format_area_label(filters.get('area'))}{crime_type_display}"
+    )
+
+
+# Draw prebuilt default charts in the browser, ask the server for the others
+clientside_callback(
+    ClientsideFunction(namespace='static_views', function_name='charts'),
+    Output('charts-request', 'data'),
+    [Input('map', 'signalData'),
+     Input('aggregate-store', 'data'),
+     Input('estimate-store', 'data')],
+    State('static-manifest', 'data')
+)
+
+
+@callback(
+    [Output('crime-bar-chart', 'figure'),
+     Output('gender-pie-chart', 'figure'),
+     Output('age-pie-chart', 'figure')],
+    Input('charts-request', 'data'),
+    [State('map', 'signalData'),
+     State('aggregate-store', 'data'),
+     State('estimate-store', 'data')],
+    prevent_initial_call=True
+)
+def draw_charts(request, clicked_region, exact, estimate):
+    return update_all_pie_charts(clicked_region, exact, estimate)
+
+
+clientside_callback(
+    ClientsideFunction(namespace='static_views', function_name='crosstab'),
+    Output('crosstab-request', 'data'),
+    [Input('crosstab-dropdown', 'value'),
+     Input('map', 'signalData'),
+     Input('aggregate-store', 'data')],
+    State('static-manifest', 'data')
+)
+
+
+@callback(
+    Output('crosstab-heatmap', 'figure'),
+    Input('crosstab-request', 'data'),
+    [State('crosstab-dropdown', 'value'),
+     State('map', 'signalData'),
+     State('aggregate-store', 'data'),
+     State('session-id', 'data')],
+    prevent_initial_call=True
+)
+def draw_crosstab(request, pair, clicked_region, aggregate, session):
+    return update_crosstab_heatmap(pair, clicked_region, aggregate, session)
+
+
+def drillable(aggregate):
+    """
+    Whether the offenses of a stored aggregate can be drilled into. The
+    precomputed hierarchy has no arrest coordinates, and historic years have
+    no PD descriptions or law codes.
+    """
+    if aggregate is None or aggregate['filters'].get('area'):
+        return False
+    periods = [aggregate['filters'], aggregate['comparison'] or {}]
+    return not any(
+        current_snapshot().split_dates(
+            period.get('start_date'), period.get('end_date')
+        )[0]
+        for period in periods
+    )
+
+
+@callback(
+    Output('drill-store', 'data'),
+    [Input('crime-bar-chart', 'clickData'),
+     Input('drill-back-button', 'n_clicks'),
+     Input('aggregate-store', 'data'),
+     Input('map', 'signalData')],
+    State('drill-store', 'data'),
+    prevent_initial_call=True
+)
+def update_drill_path(click_data, back_clicks, aggregate, clicked_region,
+                      path):
+    ctx = callback_context
+    triggered_id = ctx.triggered[0]['prop_id'] if ctx.triggered else None
+
+    if triggered_id == 'drill-back-button.n_clicks':
+        if not path:
+            raise PreventUpdate
+        return path[:-1]
+
+    if triggered_id == 'crime-bar-chart.clickData':
+        # Law codes are the last level
+        if not click_data or len(path) >= len(HIERARCHY_COLUMNS) - 1:
+            raise PreventUpdate
+        if not drillable(aggregate):
+            raise PreventUpdate
+        return path + [click_data['points'][0]['y']]
+
+    # New filters or regions start again from the crime types
+    if not path:
+        raise PreventUpdate
+    return []
+
+
+@callback(
+    [Output('crime-bar-chart', 'figure', allow_duplicate=True),
+     Output('drill-back-button', 'style')],
+    Input('drill-store', 'data'),
+    [State('map', 'signalData'),
+     State('aggregate-store', 'data'),
+     State('estimate-store', 'data')],
+    prevent_initial_call=True
+)
+def draw_drill(path, clicked_region, exact, estimate):
+    if not path:
+        return (
+            update_all_pie_charts(clicked_region, exact, estimate)[0],
+            {'display': 'none'}
+        )
+
+    # Children come from the precomputed hierarchy, so they are exact
+    if exact is None:
+        raise PreventUpdate
+    filters = exact['filters']
+    selected_locations, location_label = get_selected_location(clicked_region)
+    location_label_display = f" in {location_label}" if location_label else ""
+
+    def children(period):
+        return get_drill_counts(
+            path, period.get('start_date'), period.get('end_date'),
+            selected_locations
+        )
+
+    title = (
+        f"Top 5 {HIERARCHY_TITLES[HIERARCHY_COLUMNS[len(path)]]} - "
+        f"{' > '.join(path)}{location_label_display}"
+    )
+    counts = children(filters)
+    if exact['comparison'] is not None:
+        counts = combine_periods(counts, children(exact['comparison']))
+        chart = (
+            create_comparison_bar_chart(counts, title) if len(counts)
+            else create_empty_bar_chart()
+        )
+    else:
+        chart = (
+            create_bar_chart(counts, title) if len(counts)
+            else create_empty_bar_chart()
+        )
+    return chart, {}
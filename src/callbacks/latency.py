@@ -0,0 +1,44 @@
+from dash import Input, Output, callback
+from plotly.io.json import to_json_plotly
+
+from src.cache import LIVE_BUDGET_MS, current_snapshot, live_available
+from src.utils import create_heatmap
+from .charts import update_all_pie_charts
+from .map import create_map_chart
+
+
+def render_live_update(filters, aggregate, crosstab):
+    """
+    Build what one live update sends back, the precinct map spec (the larger
+    of the two views) and the bar, pie and heatmap figures, and encode it as
+    the response does. Only benchmarks time it, the budget leaves it out.
+    """
+    stored = {
+        'token': [0, 0, 0],
+        'filters': filters,
+        'selected': aggregate,
+        'comparison': None
+    }
+    return to_json_plotly([
+        create_map_chart(True, stored, None),
+        *update_all_pie_charts(None, stored, None),
+        create_heatmap(crosstab, "Arrests by Precinct and Race")
+    ])
+
+
+@callback(
+    [Output('live-toggle', 'disabled'),
+     Output('live-note', 'children')],
+    Input('dataset-version', 'data')
+)
+def update_live_switch(version):
+    # Only offer live updates while the current data meets the budget
+    snapshot = current_snapshot()
+    if live_available(snapshot):
+        return False, None
+    if snapshot.live_latency_ms is None:
+        return True, "Checking update speed, reload the page in a moment"
+    return True, (
+        f"Unavailable: updates take {snapshot.live_latency_ms:.0f} ms, "
+        f"over the {LIVE_BUDGET_MS:.0f} ms budget"
+    )
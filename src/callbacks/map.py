@@ -1,91 +1,126 @@
-from dash import Output, Input, callback, State, callback_context
+from dash import (
+    ClientsideFunction,
+    Input,
+    Output,
+    State,
+    callback,
+    clientside_callback
+)
 import altair as alt
 import pandas as pd
 
-from src.data import nyc_arrests, nyc_boroughs, nyc_precinct
-from src.utils import filter_data
-
-@callback(
-    Output('map', 'spec'),
-    [Input('map-toggle', 'value'),
-     Input('apply-button', 'n_clicks'),
-     Input('reset-button', 'n_clicks')],
-    [State('date-picker-range', 'start_date'),
-     State('date-picker-range', 'end_date'),
-     State('crime-type-dropdown', 'value')]
+from src.cache import current_snapshot
+from src.data import nyc_boroughs, nyc_precinct
+from src.routes import geometry_url
+from .aggregate import latest_aggregate
+from src.utils import (
+    combine_periods,
+    flagged_precincts,
+    format_area_label,
+    store_aggregates
 )
-def create_map_chart(
-    toggle_value, apply_clicks, reset_clicks, start_date, end_date, crime_types
-):
-
-    # Start with unfiltered data
-    filtered_arrests = nyc_arrests
-
-    # Check which input triggered the callback
-    ctx = callback_context
-    if ctx.triggered:
-        trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-
-        # Only apply filter if the apply button was clicked
-        if trigger_id == 'apply-button':
-            filtered_arrests = filter_data(
-                nyc_arrests,
-                start_date=start_date,
-                end_date=end_date,
-                crime_types=crime_types if crime_types else None
-            )
-
-        if trigger_id == 'reset-button':
-            filtered_arrests = nyc_arrests
+
+def create_map_chart(toggle_value, exact, estimate):
+
+    # Draw the newest stored aggregate, estimated until the exact one is in
+    aggregate = latest_aggregate(exact, estimate)
+    estimated = aggregate['selected'].get('estimated', False)
+    filters = aggregate['filters']
+    compare = aggregate['comparison'] is not None
+    area_title = format_area_label(filters.get('area'))
+    spike_filters = {
+        name: filters.get(name)
+        for name in ('start_date', 'end_date', 'crime_types')
+    }
 
     if toggle_value:  # Precinct view
-        arrest_data_grp_precinct_filtered = (
-            filtered_arrests
-            .groupby('ARREST_PRECINCT', as_index=False)
-            .agg(counts=('ARREST_PRECINCT', 'size'))
-        )
-        
-        geo_df = nyc_precinct.merge(
-            arrest_data_grp_precinct_filtered,
-            how="left",
-            left_on="precinct",
-            right_on="ARREST_PRECINCT",
-            copy=False
-        ).rename(
-            columns={"precinct": "Precinct", "counts": "Arrests"}
-        )[["Precinct", "Arrests", "geometry"]]
-        
-        # Handle NaN values in one vectorized operation
-        geo_df["Arrests"] = geo_df["Arrests"].fillna(0).astype(int)
+        region_col, dimension = 'ARREST_PRECINCT', 'precinct'
+        geo_data, geo_key = nyc_precinct, 'precinct'
         tooltip_label = 'Precinct'
         map_title = "NYC Precincts"
-        
     else:  # Borough view
-        arrest_data_grp_borough_filtered = (
-            filtered_arrests
-            .groupby('borough', as_index=False)
-            .agg(counts=('borough', 'size'))
-        )
-        
-        geo_df = nyc_boroughs.merge(
-            arrest_data_grp_borough_filtered,
-            how="left",
-            left_on="name",
-            right_on="borough",
-            copy=False
-        ).rename(
-            columns={"name": "Borough", "counts": "Arrests"}
-        )[["Borough", "Arrests", "geometry"]]
-        
-        # Handle NaN values in one vectorized operation
-        geo_df["Arrests"] = geo_df["Arrests"].fillna(0).astype(int)
+        region_col, dimension = 'borough', 'borough'
+        geo_data, geo_key = nyc_boroughs, 'name'
         tooltip_label = 'Borough'
         map_title = "NYC Boroughs"
 
+    # Region counts come from the stored aggregate, not the arrest table
+    if compare:
+        region_counts = combine_periods(
+            store_aggregates(aggregate['selected'])[dimension],
+            store_aggregates(aggregate['comparison'])[dimension]
+        )
+        count_cols = ['Selected', 'Comparison']
+    elif estimated:
+        region_counts = store_aggregates(aggregate['selected'])[dimension]
+        count_cols = ['Arrests', 'Margin']
+    else:
+        region_counts = store_aggregates(aggregate['selected'])[dimension]
+        count_cols = ['Arrests']
+
+    # Shapes are fetched once from their own URL, the spec only carries the
+    # counts of each region
+    geo_df = geo_data[[geo_key]].merge(
+        region_counts,
+        how="left",
+        left_on=geo_key,
+        right_on=region_col,
+        copy=False
+    ).rename(
+        columns={geo_key: tooltip_label}
+    )[[tooltip_label, *count_cols]]
+
+    # Handle NaN values in one vectorized operation
+    geo_df[count_cols] = geo_df[count_cols].fillna(0).astype(int)
+
+    # Outline precincts with flagged arrest spikes in the selected weeks
+    spike_tooltip = []
+    if toggle_value:
+        spikes = flagged_precincts(
+            current_snapshot().anomalies, **spike_filters
+        )
+        geo_df = geo_df.merge(
+            spikes, how="left", left_on=tooltip_label,
+            right_on='ARREST_PRECINCT'
+        ).drop(columns='ARREST_PRECINCT')
+        geo_df['Spikes'] = geo_df['Spikes'].fillna(0).astype(int)
+        geo_df['Top Spike'] = geo_df['Top Spike'].fillna('')
+        spike_tooltip = ['Spikes', 'Top Spike']
+    else:
+        geo_df['Spikes'] = 0
+
+    if compare:
+        # Show the change between periods on a diverging scale
+        geo_df["Change"] = geo_df["Selected"] - geo_df["Comparison"]
+        geo_df["Arrests"] = geo_df["Selected"] + geo_df["Comparison"]
+        map_color = alt.Color(
+            'Change:Q',
+            scale=alt.Scale(scheme='redblue', reverse=True, domainMid=0)
+        )
+        map_tooltip = [
+            tooltip_label,
+            alt.Tooltip('Selected', format=','),
+            alt.Tooltip('Comparison', format=','),
+            alt.Tooltip('Change', format='+,'),
+            *spike_tooltip
+        ]
+        map_title = f"Change in Arrests - {map_title}"
+    else:
+        map_color = alt.Color('Arrests:Q', scale=alt.Scale(scheme='blues'))
+        map_tooltip = [
+            tooltip_label, alt.Tooltip('Arrests', format=','), *spike_tooltip
+        ]
+        if estimated:
+            # 95% confidence interval of the estimate
+            map_tooltip.insert(2, alt.Tooltip('Margin', title='±', format=','))
+    map_title = f"{map_title}{area_title}"
+    if estimated:
+        map_title = f"{map_title} (Estimated)"
+
     select_region = alt.selection_point(
         fields=[tooltip_label],
         name='select_region',
-        toggle=False
+        toggle='event.shiftKey'  # Shift-click to select several regions
     )
 
     # Set opacity based on selection, grey out regions with no data
@@ -102,13 +137,29 @@ def create_map_chart(
         height=450,
         title=map_title
     ).mark_geoshape(
-        stroke='grey',
         cursor='pointer'
+    ).transform_lookup(
+        lookup=tooltip_label,
+        from_=alt.LookupData(
+            alt.UrlData(
+                geometry_url(dimension),
+                format=alt.DataFormat(property='features')
+            ),
+            key=f'properties.{geo_key}'
+        ),
+        as_='geo'
     ).project(
         'albersUsa'
     ).encode(
-        color=alt.Color('Arrests:Q', scale=alt.Scale(scheme='blues')),
-        tooltip=[tooltip_label, alt.Tooltip('Arrests', format=',')],
+        shape='geo:G',
+        stroke=alt.condition(
+            alt.datum.Spikes > 0, alt.value('#E63946'), alt.value('grey')
+        ),
+        strokeWidth=alt.condition(
+            alt.datum.Spikes > 0, alt.value(2.5), alt.value(1)
+        ),
+        color=map_color,
+        tooltip=map_tooltip,
         opacity=map_opacity
     ).add_params(
         select_region
@@ -131,3 +182,26 @@ def create_map_chart(
     ).to_dict()
 
     return map_chart
+
+
+# Draw prebuilt default maps in the browser, ask the server for the others
+clientside_callback(
+    ClientsideFunction(namespace='static_views', function_name='map'),
+    Output('map-request', 'data'),
+    [Input('map-toggle', 'value'),
+     Input('aggregate-store', 'data'),
+     Input('estimate-store', 'data')],
+    State('static-manifest', 'data')
+)
+
+
+@callback(
+    Output('map', 'spec'),
+    Input('map-request', 'data'),
+    [State('map-toggle', 'value'),
+     State('aggregate-store', 'data'),
+     State('estimate-store', 'data')],
+    prevent_initial_call=True
+)
+def draw_map(request, toggle_value, exact, estimate):
+    return create_map_chart(toggle_value, exact, estimate)
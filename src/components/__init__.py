@@ -1,5 +1,6 @@
 from .general import (
-    title_comp, collapse_button, sidebar, footer_toggle_button, footer_content
+    title_comp, collapse_button, sidebar, footer_toggle_button, footer_content,
+    data_stores
 )
-from .charts import crime_bar_chart, gender_pie_chart, age_pie_chart
+from .charts import summary_charts, crosstab_heatmap
 from .map import map_chart
\ No newline at end of file
@@ -1,31 +1,95 @@
-from dash import dcc
-
-from src.data import crime_pie_data, gender_data, age_data
-from src.utils import create_pie_chart, create_bar_chart
-
-# Crime frequency pie chart
-crime_bar_chart = dcc.Loading(
-    children=[dcc.Graph(
-        id='crime-bar-chart',
-        config={'displayModeBar': False},
-        figure=create_bar_chart(crime_pie_data.head(5), "Top 5 Crime Types")
-    )]
-)
+from functools import lru_cache
+
+import dash_bootstrap_components as dbc
+from dash import dcc, html
 
-# Gender distribution pie chart
-gender_pie_chart = dcc.Loading(
-    children=[dcc.Graph(
-        id='gender-pie-chart',
-        config={'displayModeBar': False},
-        figure=create_pie_chart(gender_data, "Arrests by Gender")
-    )]
+from src.utils import (
+    CROSSTAB_PAIRS,
+    CROSSTAB_TITLES,
+    create_bar_chart,
+    create_pie_chart
 )
 
-# Age distribution pie chart
-age_pie_chart = dcc.Loading(
-    children=[dcc.Graph(
-        id='age-pie-chart',
-        config={'displayModeBar': False},
-        figure=create_pie_chart(age_data, "Arrests by Age Group")
-    )]
+@lru_cache(maxsize=1)
+def summary_charts(snapshot):
+    """
+    Build the bar and pie charts with the citywide counts of a snapshot.
+    Every page starts with them, so they are built once per data version.
+
+    Parameters:
+    snapshot (DataSnapshot): Data the page is built from
+
+    Returns:
+    tuple: (crime bar chart, gender pie chart, age pie chart)
+    """
+    # Crime frequency bar chart, click a bar to drill down into its PD
+    # descriptions and law codes
+    crime_bar_chart = html.Div([
+        dbc.Button(
+            "Back",
+            id='drill-back-button',
+            color="secondary",
+            outline=True,
+            size="sm",
+            n_clicks=0,
+            style={'display': 'none'}
+        ),
+        dcc.Loading(
+            children=[dcc.Graph(
+                id='crime-bar-chart',
+                config={'displayModeBar': False},
+                figure=create_bar_chart(
+                    snapshot.crime_pie_data.head(5), "Top 5 Crime Types"
+                )
+            )]
+        ),
+        # Labels of the drilled-down bars, from the offense down
+        dcc.Store(id='drill-store', data=[])
+    ])
+
+    # Gender distribution pie chart
+    gender_pie_chart = dcc.Loading(
+        children=[dcc.Graph(
+            id='gender-pie-chart',
+            config={'displayModeBar': False},
+            figure=create_pie_chart(snapshot.gender_data, "Arrests by Gender")
+        )]
+    )
+
+    # Age distribution pie chart
+    age_pie_chart = dcc.Loading(
+        children=[dcc.Graph(
+            id='age-pie-chart',
+            config={'displayModeBar': False},
+            figure=create_pie_chart(snapshot.age_data, "Arrests by Age Group")
+        )]
+    )
+    return crime_bar_chart, gender_pie_chart, age_pie_chart
+
+
+# Cross-tab of two dimensions, picked from the dropdown
+crosstab_dropdown = dcc.Dropdown(
+    id='crosstab-dropdown',
+    options=[
+        {
+            'label': f"{CROSSTAB_TITLES[rows]} × {CROSSTAB_TITLES[columns]}",
+            'value': pair
+        }
+        for pair, (rows, columns) in CROSSTAB_PAIRS.items()
+    ],
+    value='precinct-race',
+    clearable=False
 )
+
+crosstab_heatmap = html.Div([
+    dbc.Row([
+        dbc.Col(html.Label("Cross-tab:"), width="auto"),
+        dbc.Col(crosstab_dropdown, md=4)
+    ], align="center"),
+    dcc.Loading(
+        children=[dcc.Graph(
+            id='crosstab-heatmap',
+            config={'displayModeBar': False}
+        )]
+    )
+])
@@ -1,7 +1,17 @@
 from dash import dcc, html
 import dash_bootstrap_components as dbc
 
-from src.data import all_crime_types, min_date, max_date
+from src.data import (
+    all_crime_types,
+    arrest_years,
+    current_years,
+    earliest_date,
+    history_years,
+    min_date,
+    max_date
+)
+from src.routes import static_manifest
+from src.utils import year_marks
 
 # Dropdown for selecting crime types
 crime_type_dropdown = dcc.Dropdown(
@@ -27,14 +37,55 @@ map_switch = dbc.Switch(
     className="mb-3"
 )
 
+# Live updates apply filter edits without pressing Apply, when the server
+# is fast enough
+live_switch = html.Div(
+    [
+        # Enabled on page load when the current data meets the budget
+        dbc.Switch(
+            id="live-toggle",
+            label="Live Update",
+            value=False,
+            disabled=True,
+            className="mb-1"
+        ),
+        html.Small(id="live-note", className="text-muted"),
+        dcc.Store(id="live-trigger", data=0)
+    ],
+    className="mb-3"
+)
+
+# Year selector, shown when historic years are available. It moves the date
+# range to the selected years.
+year_slider = html.Div(
+    [
+        html.Label("Select Years:"),
+        dcc.RangeSlider(
+            id="year-slider",
+            min=arrest_years[0],
+            max=arrest_years[-1],
+            step=1,
+            value=[current_years[0], current_years[-1]],
+            marks=year_marks(arrest_years),
+            tooltip={"placement": "bottom"}
+        )
+    ],
+    id="year-selector",
+    className="mb-3",
+    style={"display": "block" if history_years else "none"}
+)
+
+# Dates only show the year when there are several years to pick from
+date_format = 'YYYY-MM-DD' if history_years else 'MM-DD'
+
 # Date range picker
 date_filter = dcc.DatePickerRange(
     id='date-picker-range',
     start_date=min_date,  # Set the start date as the minimum date
     end_date=max_date,    # Set the end date as the maximum date
-    display_format='MM-DD',  # Format for the displayed date
+    display_format=date_format,  # Format for the displayed date
     className="mb-3",
-    min_date_allowed=min_date,  # Restrict selection to the min_date
+    min_date_allowed=earliest_date,  # Restrict selection to the data
     max_date_allowed=max_date,  # Restrict selection to the max_date
     style={
         "transform": "scale(0.75)",
@@ -43,6 +94,101 @@ date_filter = dcc.DatePickerRange(
     }
 )
 
+# Toggle switch for comparing two periods
+compare_switch = dbc.Switch(
+    id="compare-toggle",
+    label="Compare with Another Period",
+    value=False,
+    className="mb-3"
+)
+
+# Date range picker for the comparison period
+compare_date_filter = dcc.DatePickerRange(
+    id='compare-date-picker-range',
+    start_date=min_date,
+    end_date=max_date,
+    display_format=date_format,
+    className="mb-3",
+    min_date_allowed=earliest_date,
+    max_date_allowed=max_date,
+    style={
+        "transform": "scale(0.75)",
+        "transform-origin": "top left",
+        "white-space": "nowrap"
+    }
+)
+
+# Area filter: arrests near a point or inside a box, in state-plane feet
+area_type = dbc.RadioItems(
+    id="area-type",
+    options=[
+        {"label": "Anywhere", "value": "none"},
+        {"label": "Within Radius", "value": "radius"},
+        {"label": "In Box", "value": "box"}
+    ],
+    value="none",
+    inline=True,
+    className="mb-2"
+)
+
+radius_inputs = dbc.Collapse(
+    dbc.InputGroup(
+        [
+            dbc.Input(id="area-x", type="number", placeholder="X (ft)"),
+            dbc.Input(id="area-y", type="number", placeholder="Y (ft)"),
+            dbc.Input(
+                id="area-radius", type="number", min=0, value=500,
+                placeholder="Radius (m)"
+            )
+        ],
+        size="sm"
+    ),
+    id="radius-collapse",
+    is_open=False,
+    className="mb-3"
+)
+
+box_inputs = dbc.Collapse(
+    [
+        dbc.InputGroup(
+            [
+                dbc.Input(id="area-x-min", type="number", placeholder="X min (ft)"),
+                dbc.Input(id="area-y-min", type="number", placeholder="Y min (ft)")
+            ],
+            size="sm"
+        ),
+        dbc.InputGroup(
+            [
+                dbc.Input(id="area-x-max", type="number", placeholder="X max (ft)"),
+                dbc.Input(id="area-y-max", type="number", placeholder="Y max (ft)")
+            ],
+            size="sm"
+        )
+    ],
+    id="box-collapse",
+    is_open=False,
+    className="mb-3"
+)
+
+# Links to download the rows behind the current filters
+download_links = html.Div(
+    [
+        html.A(
+            "Download CSV",
+            id="download-csv-link",
+            href="/download/arrests.csv",
+            className="me-3"
+        ),
+        html.A(
+            "Download Parquet",
+            id="download-parquet-link",
+            href="/download/arrests.parquet"
+        )
+    ],
+    className="mb-3",
+    style={"font-size": "14px"}
+)
+
 # Sidebar toggle button
 collapse_button = dbc.Col(
     dbc.Button(
@@ -102,10 +248,36 @@ sidebar = html.Div(
     [
         html.H4("Filters", className="mb-3"),
         map_switch,
+        live_switch,
         html.Label("Select Crime Type:"),
         crime_type_dropdown,
+        year_slider,
         html.Label("Select Date Range:"),
         date_filter,
+        compare_switch,
+        dbc.Collapse(
+            [
+                html.Label("Select Comparison Date Range:"),
+                compare_date_filter
+            ],
+            id="compare-collapse",
+            is_open=False
+        ),
+        html.Label("Select Area:"),
+        area_type,
+        radius_inputs,
+        box_inputs,
+        dcc.Store(id="area-store", data=None),
+        dcc.Store(id="aggregate-store", data=None),
+        dcc.Store(id="estimate-store", data=None),
+        # Requests for the server to draw the views that were not prebuilt
+        dcc.Store(id="map-request", data=None),
+        dcc.Store(id="charts-request", data=None),
+        dcc.Store(id="crosstab-request", data=None),
+        # Random id of this browser tab, so the server can refine the tab's
+        # last query when the filters narrow
+        dcc.Store(id="session-id", storage_type="session"),
+        download_links,
         apply_button,
         reset_button
     ],
@@ -219,3 +391,20 @@ title_comp = html.H1(
         'border-radius': 3,
     }
 )
+
+
+def data_stores(snapshot):
+    """
+    Stores describing the data a page was built from.
+
+    Parameters:
+    snapshot (DataSnapshot): Data the page is built from
+
+    Returns:
+    list: The 'dataset-version' store and the 'static-manifest' store of the
+    prebuilt default views
+    """
+    return [
+        dcc.Store(id="dataset-version", data=snapshot.version),
+        dcc.Store(id="static-manifest", data=static_manifest(snapshot))
+    ]
@@ -3,12 +3,16 @@ import dash_vega_components as dvc
 from dash import dcc
 
 map_chart = dbc.Col(
-    dcc.Loading(
-        children=[dvc.Vega(
-            id='map',
-            spec={},
-            signalsToObserve=['select_region']
-        )]
-    ),
+    [
+        # Whether the numbers on screen are estimated or exact
+        dbc.Badge(id='aggregate-status', color="secondary", className="mb-2"),
+        dcc.Loading(
+            children=[dvc.Vega(
+                id='map',
+                spec={},
+                signalsToObserve=['select_region']
+            )]
+        )
+    ],
     md=6
 )
@@ -2,10 +2,31 @@ from .data import (
     all_crime_types,
     min_date,
     max_date,
-    crime_pie_data,
-    gender_data,
-    age_data,
     nyc_arrests,
     nyc_boroughs,
-    nyc_precinct
+    nyc_precinct,
+    borough_names,
+    precinct_borough,
+    anomalies,
+    earliest_date,
+    current_years,
+    arrest_years,
+    history_years,
+    history_labels,
+    read_year,
+    read_arrests,
+    read_anomalies,
+    read_history,
+    history,
+    loaded_signature,
+    data_signature,
+    version_of,
+    filter_options,
+    default_charts,
+    mapped_precincts,
+    read_static_manifest,
+    STATIC_DIR,
+    ANOMALY_PATH,
+    HISTORY_COLUMNS,
+    map_geometry
 )
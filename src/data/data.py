@@ -1,35 +1,221 @@
+import hashlib
+import json
+import os
+
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 
 nyc_boroughs = gpd.read_parquet("data/processed/borough_data.geoparquet")
 nyc_precinct = gpd.read_parquet("data/processed/precinct_data.geoparquet")
-nyc_arrests = pd.read_parquet("data/processed/arrest_data.parquet")
+ARREST_PATH = "data/processed/arrest_data.parquet"
+ANOMALY_PATH = "data/processed/anomalies.parquet"
+
+# Historic arrests, one parquet directory per year written by
+# src/data/preprocess_data.py. Years are only read when a query needs them.
+HISTORY_DIR = "data/processed/history"
+HISTORY_PATH = f"{HISTORY_DIR}/metadata.json"
+HISTORY_COLUMNS = [
+    'ARREST_DATE', 'ARREST_PRECINCT', 'OFNS_DESC', 'LAW_CAT_CD',
+    'AGE_GROUP', 'PERP_SEX', 'PERP_RACE', 'X_COORD_CD', 'Y_COORD_CD'
+]
+
+
+def mapped_precincts(arrests):
+    """
+    Keep the arrests of precincts with a shape on the map.
+
+    Precinct codes index lookup tables sized at startup (precinct_borough
+    below), so a precinct added or renumbered in newer data would not fit
+    them. src/data/preprocess_data.py drops those rows from the historic
+    data too.
+    """
+    known = arrests['ARREST_PRECINCT'].isin(nyc_precinct['precinct'])
+    if known.all():
+        return arrests
+    return arrests.loc[known].reset_index(drop=True)
+
+
+def read_arrests():
+    """Read the processed year-to-date arrests."""
+    return mapped_precincts(pd.read_parquet(ARREST_PATH))
+
+
+def read_anomalies():
+    """Read the weekly arrest spikes flagged by src/data/detect_anomalies.py."""
+    if os.path.exists(ANOMALY_PATH):
+        return pd.read_parquet(ANOMALY_PATH)
+    return pd.DataFrame({
+        'ARREST_PRECINCT': pd.Series(dtype='int64'),
+        'OFNS_DESC': pd.Series(dtype='object'),
+        'week_start': pd.Series(dtype='datetime64[ns]'),
+        'Arrests': pd.Series(dtype='int64'),
+        'Baseline': pd.Series(dtype='float64'),
+        'z_score': pd.Series(dtype='float64')
+    })
+
+
+def read_history():
+    """Read the years and labels of the historic data, if there is any."""
+    if os.path.exists(HISTORY_PATH):
+        with open(HISTORY_PATH) as file:
+            return json.load(file)
+    return {'years': {}, 'labels': {}}
+
+
+# Prebuilt default views, written by src/build_static.py
+STATIC_DIR = os.environ.get('ARREST_TRACKER_STATIC_DIR', 'data/static')
+
+
+def read_static_manifest():
+    """Read the list of prebuilt default views, if they were built."""
+    path = f"{STATIC_DIR}/manifest.json"
+    if os.path.exists(path):
+        with open(path) as file:
+            return json.load(file)
+    return None
+
+
+def geometry_json(geo_data, key):
+    """
+    Write the shapes of a map as GeoJSON with only their key property, for
+    the map to fetch once by URL instead of with every spec.
+
+    Parameters:
+    geo_data (gpd.GeoDataFrame): Shapes of the regions
+    key (str): Column that names each region
+
+    Returns:
+    dict: GeoJSON 'content' and a 'digest' of it, for cache-busting URLs
+    """
+    content = geo_data[[key, 'geometry']].to_json(drop_id=True)
+    return {
+        'content': content,
+        'digest': hashlib.sha256(content.encode()).hexdigest()[:12]
+    }
+
+
+def read_year(year):
+    """Read the columns needed for counting from one historic year."""
+    return mapped_precincts(
+        pd.read_parquet(f"{HISTORY_DIR}/year={year}", columns=HISTORY_COLUMNS)
+    )
+
+
+def data_signature():
+    """
+    Describe the processed data files by size and modification time, so a
+    replaced file gives a new signature.
+    """
+    parts = []
+    for path in (ARREST_PATH, ANOMALY_PATH, HISTORY_PATH):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            parts.append(f"{stat.st_size}-{stat.st_mtime_ns}")
+        else:
+            parts.append("-")
+    return "/".join(parts)
+
+
+def version_of(signature):
+    """Short version id of the data with the given signature."""
+    return hashlib.sha1(signature.encode()).hexdigest()[:12]
+
+
+def filter_options(arrests, history):
+    """
+    Work out the choices offered by the sidebar filters.
+
+    Parameters:
+    arrests (pd.DataFrame): Current arrest data
+    history (dict): Output of read_history
+
+    Returns:
+    dict: 'crime_types', the 'min_date' and 'max_date' of the current data,
+    the 'earliest_date' that can be selected, the 'current_years' and all
+    'arrest_years'
+    """
+    min_date = arrests['ARREST_DATE'].min().strftime('%Y-%m-%d')
+    max_date = arrests['ARREST_DATE'].max().strftime('%Y-%m-%d')
+    current_years = list(range(int(min_date[:4]), int(max_date[:4]) + 1))
+    return {
+        'crime_types': sorted(
+            set(arrests['OFNS_DESC'].dropna()) |
+            set(history['labels'].get('OFNS_DESC', []))
+        ),
+        'min_date': min_date,
+        'max_date': max_date,
+        # First date that can be selected, in the historic data if any
+        'earliest_date': min(
+            [min_date] + [year['min_date'] for year in history['years'].values()]
+        ),
+        'current_years': current_years,
+        'arrest_years': sorted(
+            set(int(year) for year in history['years']) | set(current_years)
+        )
+    }
+
+
+def default_charts(arrests):
+    """
+    Count the citywide arrests that the charts show before any filter is
+    applied.
 
-# Create default gender data for all arrests (citywide)
-gender_data = pd.DataFrame({
-    'PERP_SEX': nyc_arrests['PERP_SEX'].value_counts().index,
-    'Arrests': nyc_arrests['PERP_SEX'].value_counts().values
-})
+    Parameters:
+    arrests (pd.DataFrame): Current arrest data
 
-# Create default age data for all arrests (citywide)
-age_data = pd.DataFrame({
-    'AGE_GROUP': nyc_arrests['AGE_GROUP'].value_counts().index,
-    'Arrests': nyc_arrests['AGE_GROUP'].value_counts().values
-})
+    Returns:
+    dict: 'gender', 'age' and 'crimes' frames with an 'Arrests' column, the
+    crimes being the 10 most frequent
+    """
+    charts = {}
+    for name, column in (('gender', 'PERP_SEX'), ('age', 'AGE_GROUP')):
+        counts = arrests[column].value_counts()
+        charts[name] = pd.DataFrame({
+            column: counts.index,
+            'Arrests': counts.values
+        })
+    crimes = arrests['OFNS_DESC'].value_counts().head(10)
+    charts['crimes'] = pd.DataFrame({
+        'OFNS_DESC': crimes.index,
+        'Arrests': crimes.values
+    })
+    return charts
 
-arrest_crimes = nyc_arrests['OFNS_DESC'].value_counts().reset_index()
-arrest_crimes.columns = ['Crime Type', 'Frequency']
 
-# Get the top 10 most frequent crimes
-top_crimes = arrest_crimes.head(10)
+# Data at startup. The app swaps in newer data without restarting, see
+# current_snapshot in src/cache.py.
+loaded_signature = data_signature()
+nyc_arrests = read_arrests()
+anomalies = read_anomalies()
+history = read_history()
+history_years = sorted(int(year) for year in history['years'])
+history_labels = history['labels']
 
-all_crime_types = sorted(nyc_arrests['OFNS_DESC'].unique().tolist())
+options = filter_options(nyc_arrests, history)
+all_crime_types = options['crime_types']
+min_date = options['min_date']
+max_date = options['max_date']
+earliest_date = options['earliest_date']
+current_years = options['current_years']
+arrest_years = options['arrest_years']
 
-# Calculate min and max dates from the data
-min_date = nyc_arrests['ARREST_DATE'].min().strftime('%Y-%m-%d')
-max_date = nyc_arrests['ARREST_DATE'].max().strftime('%Y-%m-%d')
+# Map shapes, by the region dimension the map counts
+map_geometry = {
+    'precinct': geometry_json(nyc_precinct, 'precinct'),
+    'borough': geometry_json(nyc_boroughs, 'name')
+}
 
-# Data for crime frequency pie chart - rename columns in one step
-crime_pie_data = top_crimes.rename(
-    columns={'Crime Type': 'OFNS_DESC', 'Frequency': 'Arrests'}
+# Precinct -> borough lookup table, indexed directly by precinct code so that
+# location filters become a single array lookup per row
+borough_names = sorted(nyc_arrests['borough'].dropna().unique().tolist())
+precinct_pairs = nyc_arrests[['ARREST_PRECINCT', 'borough']].drop_duplicates()
+precinct_borough = np.full(
+    int(nyc_precinct['precinct'].max()) + 1,
+    -1,
+    dtype=np.int8
 )
+precinct_borough[precinct_pairs['ARREST_PRECINCT'].to_numpy()] = pd.Categorical(
+    precinct_pairs['borough'],
+    categories=borough_names
+).codes
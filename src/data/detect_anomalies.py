@@ -0,0 +1,84 @@
+"""
+Flag weeks where a precinct's arrests for an offense spike above its own
+baseline. Meant to run nightly after the data is refreshed:
+
+    python -m src.data.detect_anomalies
+
+Weeks are scored over the historic years written by
+src/data/preprocess_data.py and the current data, so the first weeks of the
+year have a baseline and spikes in earlier years are flagged too. The
+flagged weeks are written to data/processed/anomalies.parquet, which the
+app highlights on the precinct map.
+"""
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from src.data import (
+    ANOMALY_PATH,
+    HISTORY_COLUMNS,
+    history,
+    min_date,
+    nyc_arrests,
+    read_year
+)
+from src.utils import build_code_table, detect_anomalies, merge_labels
+
+
+def all_arrests(years):
+    """
+    Arrests of the given historic years and the current data, with the
+    columns needed for counting.
+
+    Historic rows from the first day of the current data on are left out,
+    as the current data answers those dates.
+    """
+    parts = [
+        arrests[arrests['ARREST_DATE'] < min_date]
+        for arrests in (read_year(year) for year in years)
+    ]
+    parts.append(nyc_arrests[HISTORY_COLUMNS])
+    return pd.concat(
+        [part.astype({'OFNS_DESC': object}) for part in parts],
+        ignore_index=True
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--window', type=int, default=8,
+                        help='Weeks in the rolling baseline')
+    parser.add_argument('--threshold', type=float, default=3.0,
+                        help='Smallest z-score that is flagged')
+    parser.add_argument('--min-count', type=int, default=5,
+                        help='Smallest weekly arrest count that is flagged')
+    parser.add_argument('--years', type=int, default=None,
+                        help='Most recent historic years to score, all by default')
+    parser.add_argument('--output', default=ANOMALY_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    years = sorted(int(year) for year in history['years'])
+    if args.years is not None:
+        years = years[-args.years:] if args.years > 0 else []
+    # All years share one set of labels, as in the app
+    labels = merge_labels(nyc_arrests, history['labels']) if years else None
+    anomalies = detect_anomalies(
+        build_code_table(all_arrests(years), categories=labels),
+        window=args.window,
+        threshold=args.threshold,
+        min_count=args.min_count
+    )
+    anomalies.to_parquet(args.output, engine="pyarrow", index=False)
+    print(
+        f"{len(anomalies)} flagged weeks in "
+        f"{anomalies['ARREST_PRECINCT'].nunique()} precincts, "
+        f"{time.perf_counter() - start:.2f}s",
+        file=sys.stderr
+    )
+
+
+if __name__ == '__main__':
+    main()
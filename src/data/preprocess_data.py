@@ -1,3 +1,7 @@
+import json
+import os
+import shutil
+
 import pandas as pd
 import geopandas as gpd
 
@@ -57,13 +61,6 @@ except:
     # Fallback to standard loading if optimized loading fails
     arrests_pd = pd.read_csv(arrest_path)
 
-arrests_pd = arrests_pd[arrests_pd["ARREST_PRECINCT"] != 483]
-
-arrests_pd["ARREST_DATE"] = pd.to_datetime(
-    arrests_pd["ARREST_DATE"],
-    format="%m/%d/%Y"
-)
-
 # Map borough names to borough codes - use vectorized mapping
 borough_mapping = {
     'B': 'Bronx',
@@ -72,9 +69,115 @@ borough_mapping = {
     'M': 'Manhattan',
     'Q': 'Queens'
 }
-arrests_pd['borough'] = arrests_pd['ARREST_BORO'].map(borough_mapping)
+
+
+def clean_arrests(arrests, precincts=None):
+    """
+    Drop unusable rows, parse dates and add borough names.
+
+    Parameters:
+    arrests (pd.DataFrame): Raw arrest rows
+    precincts (pd.Series): Precincts with a shape on the map. Rows of other
+    precincts are dropped when given.
+
+    Returns:
+    pd.DataFrame: A new frame, the input is left unchanged
+    """
+    keep = arrests["ARREST_PRECINCT"] != 483
+    if precincts is not None:
+        keep &= arrests["ARREST_PRECINCT"].isin(precincts)
+
+    return arrests.loc[keep].assign(
+        ARREST_DATE=lambda rows: pd.to_datetime(
+            rows["ARREST_DATE"],
+            format="%m/%d/%Y"
+        ),
+        borough=lambda rows: rows['ARREST_BORO'].map(borough_mapping)
+    )
+
+
+arrests_pd = clean_arrests(arrests_pd)
 
 # Store the processed data
 arrests_pd.to_parquet("data/processed/arrest_data.parquet", engine="pyarrow")
 precinct_gpd.to_parquet("data/processed/precinct_data.geoparquet", engine="pyarrow")
-borough_gpd.to_parquet("data/processed/borough_data.geoparquet", engine="pyarrow")
\ No newline at end of file
+borough_gpd.to_parquet("data/processed/borough_data.geoparquet", engine="pyarrow")
+
+# Columns whose labels are shared by all years, so their codes line up
+LABEL_COLUMNS = ['OFNS_DESC', 'LAW_CAT_CD', 'AGE_GROUP', 'PERP_SEX', 'PERP_RACE']
+
+# Load the NYPD historic arrests (2006 onward), if downloaded. The file has
+# millions of rows, so it is read in chunks and written as one parquet
+# directory per year that the app opens only when a query needs it.
+historic_path = "data/raw/NYPD_Arrests_Data__Historic_.csv"
+history_dir = "data/processed/history"
+if os.path.exists(historic_path):
+    # Older rows have missing codes and precincts
+    historic_dtypes = {
+        **dtype_dict,
+        'PD_CD': 'Int64',
+        'KY_CD': 'Int64',
+        'ARREST_PRECINCT': 'Int16',
+        'JURISDICTION_CODE': 'Int8'
+    }
+    shutil.rmtree(history_dir, ignore_errors=True)
+    years = {}
+    labels = {
+        column: set(arrests_pd[column].dropna()) for column in LABEL_COLUMNS
+    }
+    chunks = pd.read_csv(
+        historic_path,
+        dtype=historic_dtypes,
+        usecols=list(historic_dtypes.keys()),
+        chunksize=1_000_000
+    )
+    dropped = 0
+    for part, chunk in enumerate(chunks):
+        part_rows = len(chunk)
+        # Older years have precincts that were merged or renumbered since.
+        # They have no shape on the map, so their rows are dropped.
+        chunk = clean_arrests(
+            chunk.dropna(subset=["ARREST_PRECINCT"]),
+            precincts=precinct_gpd['precinct'].dropna()
+        ).astype({"ARREST_PRECINCT": "int16"})
+        dropped += part_rows - len(chunk)
+        for column in LABEL_COLUMNS:
+            labels[column] |= set(chunk[column].dropna())
+
+        for year, rows in chunk.groupby(chunk["ARREST_DATE"].dt.year):
+            os.makedirs(f"{history_dir}/year={year}", exist_ok=True)
+            rows.to_parquet(
+                f"{history_dir}/year={year}/part-{part}.parquet",
+                engine="pyarrow",
+                index=False
+            )
+            summary = years.setdefault(str(year), {
+                'rows': 0,
+                'min_date': rows["ARREST_DATE"].min(),
+                'max_date': rows["ARREST_DATE"].max()
+            })
+            summary['rows'] += len(rows)
+            summary['min_date'] = min(summary['min_date'], rows["ARREST_DATE"].min())
+            summary['max_date'] = max(summary['max_date'], rows["ARREST_DATE"].max())
+
+    print(f"Dropped {dropped:,} historic arrests without a mapped precinct")
+
+    # Written last, the app only uses the history once this file exists
+    with open(f"{history_dir}/metadata.json", "w") as file:
+        json.dump(
+            {
+                'years': {
+                    year: {
+                        'rows': summary['rows'],
+                        'min_date': summary['min_date'].strftime('%Y-%m-%d'),
+                        'max_date': summary['max_date'].strftime('%Y-%m-%d')
+                    }
+                    for year, summary in sorted(years.items())
+                },
+                'labels': {
+                    column: sorted(values) for column, values in labels.items()
+                }
+            },
+            file,
+            indent=2
+        )
@@ -0,0 +1,5 @@
+from .admin import admin
+from .api import api
+from .export import export
+from .profiling import profiling, PROFILE_MODE
+from .static_views import static_views, static_manifest, geometry_url
@@ -0,0 +1,265 @@
+import hmac
+import os
+import threading
+import time
+import tracemalloc
+from functools import lru_cache
+
+from flask import Blueprint, abort, current_app, g, jsonify, request
+
+from src.cache import CACHE_THRESHOLD, cache, current_snapshot, session_rows
+from src.data import nyc_boroughs, nyc_precinct
+from src.utils import deep_size, rss_bytes, worker_rss
+from .export import CHUNK_SIZE
+
+admin = Blueprint('admin', __name__, url_prefix='/admin')
+
+# Memory budget per worker, 0 means no budget
+MEMORY_BUDGET = int(os.environ.get('ARREST_TRACKER_MEMORY_BUDGET_MB', 0)) * 2**20
+
+# Caches are shrunk once resident memory passes this share of the budget
+SOFT_LIMIT = 0.85
+
+# Seconds between two changes of the cache size, so requests that arrive
+# while memory is high do not each empty the cache again
+RESIZE_INTERVAL = 30
+
+# Fewest entries the shared cache is shrunk to
+MIN_CACHE_THRESHOLD = 10
+
+# Tracing allocations slows every request down, so it is opt-in
+TRACE_CALLBACKS = os.environ.get('ARREST_TRACKER_TRACEMALLOC') == '1'
+
+ADMIN_TOKEN = os.environ.get('ARREST_TRACKER_ADMIN_TOKEN')
+
+# Requests that work on the arrest data, and so count against the budget
+DATA_PATHS = ('/_dash-update-component', '/download/', '/api/')
+
+# Working memory per row filtered by one aggregation: filter mask, date
+# comparisons and the masked joint keys
+AGGREGATION_ROW_BYTES = 16
+
+callback_peaks = {}
+budget_events = {
+    'refused_requests': 0, 'cache_shrinks': 0, 'cache_restores': 0
+}
+cache_limit = {'threshold': CACHE_THRESHOLD, 'resized_at': 0.0}
+resize_lock = threading.Lock()
+
+# Traced peaks cover every thread, so traced callbacks run one at a time
+trace_lock = threading.Lock()
+
+if TRACE_CALLBACKS:
+    tracemalloc.start()
+
+
+def is_admin_request():
+    """
+    Whether the current request may use admin features. With a token
+    configured it is required, otherwise only local requests are allowed.
+    """
+    if ADMIN_TOKEN:
+        token = request.headers.get('X-Admin-Token', '')
+        return hmac.compare_digest(token, ADMIN_TOKEN)
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+@lru_cache(maxsize=1)
+def row_bytes(snapshot):
+    """
+    Bytes per row of a snapshot's arrest data and of its code table, the
+    latter standing in for the code tables of historic years.
+    """
+    rows = max(len(snapshot.arrests), 1)
+    return deep_size(snapshot.arrests) // rows, deep_size(snapshot.codes) // rows
+
+
+def request_date_ranges():
+    """
+    Date ranges counted by the current data request: the query string of
+    downloads and API calls, or the date filters in a callback's inputs and
+    state, including the applied filters of the aggregate-store.
+
+    Returns:
+    list: (start_date, end_date) pairs, (None, None) for no date filter
+    """
+    if request.path != '/_dash-update-component':
+        return [(request.args.get('start_date'), request.args.get('end_date'))]
+
+    payload = request.get_json(silent=True) or {}
+    ranges, pickers = [], {}
+    for item in payload.get('inputs', []) + payload.get('state', []):
+        if not isinstance(item, dict):
+            continue
+        value = item.get('value')
+        if item.get('id') == 'aggregate-store' and isinstance(value, dict):
+            filters = value.get('filters') or {}
+            ranges.append((filters.get('start_date'), filters.get('end_date')))
+        elif item.get('property') in ('start_date', 'end_date'):
+            pickers.setdefault(str(item.get('id')), {})[item['property']] = value
+    ranges += [
+        (dates.get('start_date'), dates.get('end_date'))
+        for dates in pickers.values()
+    ]
+    return ranges or [(None, None)]
+
+
+def estimated_request_bytes(snapshot):
+    """
+    Estimate the working memory of the current data request from the data
+    it filters.
+
+    Masks cover every row of the current data whenever a date range reaches
+    it. Each historic year in a range adds its rows, and its code table in
+    case the year is no longer cached. Downloads only read the current data
+    and also hold one chunk of rows at a time.
+
+    Parameters:
+    snapshot (DataSnapshot): Data the request will use
+
+    Returns:
+    int: Estimated bytes
+    """
+    arrest_row_bytes, code_row_bytes = row_bytes(snapshot)
+    if request.path.startswith('/download/'):
+        return (
+            len(snapshot.arrests) * AGGREGATION_ROW_BYTES +
+            CHUNK_SIZE * arrest_row_bytes * 2
+        )
+
+    needed = 0
+    for start_date, end_date in request_date_ranges():
+        try:
+            years, current = snapshot.split_dates(start_date, end_date)
+        except ValueError:
+            # Malformed dates are refused by the request itself
+            years, current = [], (start_date, end_date)
+        if current is not None:
+            needed += len(snapshot.arrests) * AGGREGATION_ROW_BYTES
+        for year, _, _ in years:
+            needed += snapshot.history_rows.get(year, 0) * (
+                AGGREGATION_ROW_BYTES + code_row_bytes
+            )
+    return needed
+
+
+def resize_cache(threshold):
+    """
+    Replace the shared cache with an empty one that holds up to threshold
+    entries, through its CACHE_THRESHOLD setting.
+    """
+    cache.init_app(
+        current_app._get_current_object(),
+        config={'CACHE_THRESHOLD': threshold}
+    )
+    cache_limit['threshold'] = threshold
+    cache_limit['resized_at'] = time.monotonic()
+
+
+def fit_cache(rss):
+    """
+    Empty the shared cache and halve how many entries it may hold while
+    resident memory is over the soft limit, and restore its full size once
+    memory is back under it. The size changes at most once per
+    RESIZE_INTERVAL.
+
+    Parameters:
+    rss (int): Resident memory of the worker in bytes
+    """
+    over_limit = rss > MEMORY_BUDGET * SOFT_LIMIT
+    if not over_limit and cache_limit['threshold'] == CACHE_THRESHOLD:
+        return
+    # Requests that find the cache being resized leave it to that one
+    if not resize_lock.acquire(blocking=False):
+        return
+    try:
+        if time.monotonic() - cache_limit['resized_at'] < RESIZE_INTERVAL:
+            return
+        if over_limit:
+            resize_cache(max(cache_limit['threshold'] // 2, MIN_CACHE_THRESHOLD))
+            budget_events['cache_shrinks'] += 1
+        elif cache_limit['threshold'] < CACHE_THRESHOLD:
+            resize_cache(CACHE_THRESHOLD)
+            budget_events['cache_restores'] += 1
+    finally:
+        resize_lock.release()
+
+
+@admin.before_app_request
+def enforce_memory_budget():
+    """Refuse data requests that would push the worker over its budget."""
+    if TRACE_CALLBACKS and request.path == '/_dash-update-component':
+        trace_lock.acquire()
+        g.trace_locked = True
+        g.traced_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    if not MEMORY_BUDGET or not request.path.startswith(DATA_PATHS):
+        return None
+
+    fit_cache(rss_bytes())
+    rss = rss_bytes()
+
+    needed = estimated_request_bytes(current_snapshot())
+    if rss + needed > MEMORY_BUDGET:
+        budget_events['refused_requests'] += 1
+        response = jsonify({
+            'error': 'Memory budget exceeded, please retry shortly',
+            'rss_bytes': rss,
+            'budget_bytes': MEMORY_BUDGET
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    return None
+
+
+@admin.after_app_request
+def record_callback_peak(response):
+    """Record the traced allocation peak of each callback."""
+    if TRACE_CALLBACKS and 'traced_memory' in g:
+        callback = (request.get_json(silent=True) or {}).get('output', 'unknown')
+        peak = tracemalloc.get_traced_memory()[1] - g.traced_memory
+        stats = callback_peaks.setdefault(
+            callback, {'calls': 0, 'last_peak_bytes': 0, 'max_peak_bytes': 0}
+        )
+        stats['calls'] += 1
+        stats['last_peak_bytes'] = peak
+        stats['max_peak_bytes'] = max(stats['max_peak_bytes'], peak)
+    return response
+
+
+@admin.teardown_app_request
+def release_trace_lock(error=None):
+    """Let the next traced callback run, even when this one failed."""
+    if g.pop('trace_locked', False):
+        trace_lock.release()
+
+
+@admin.route('/memory')
+def memory():
+    """Memory held by the loaded data and caches, callback peaks and RSS."""
+    if not is_admin_request():
+        abort(403)
+
+    snapshot = current_snapshot()
+    return jsonify({
+        'pid': os.getpid(),
+        'rss_bytes': rss_bytes(),
+        'workers_rss_bytes': {
+            str(pid): rss for pid, rss in worker_rss().items()
+        },
+        'budget_bytes': MEMORY_BUDGET or None,
+        'objects_bytes': {
+            'nyc_arrests': deep_size(snapshot.arrests),
+            'nyc_boroughs': deep_size(nyc_boroughs),
+            'nyc_precinct': deep_size(nyc_precinct),
+            'arrest_codes': deep_size(snapshot.codes),
+            'offense_hierarchy': deep_size(snapshot.hierarchy),
+            'session_rows': session_rows.bytes,
+            'cache': cache.cache.bytes
+        },
+        'cache_threshold': cache_limit['threshold'],
+        'callback_peaks_bytes': callback_peaks if TRACE_CALLBACKS else None,
+        **budget_events
+    })
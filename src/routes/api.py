@@ -0,0 +1,81 @@
+import hashlib
+import json
+
+from flask import Blueprint, abort, jsonify, make_response, request
+
+from src.cache import current_snapshot, get_aggregates, normalize_filters
+from src.utils import AGGREGATE_COLUMNS
+from .export import parse_filter_args
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def filter_etag(version, filters):
+    """
+    Build an ETag from the dataset version and the filter signature.
+
+    Parameters:
+    version (str): Version of the data the response is built from
+    filters (tuple): Normalized filters from normalize_filters
+
+    Returns:
+    str: ETag value
+    """
+    signature = json.dumps([version, filters], default=str)
+    return hashlib.sha1(signature.encode()).hexdigest()
+
+
+def counts_to_dict(counts):
+    """Turn a [category, 'Arrests'] count table into a {category: count} dict."""
+    return {
+        str(category): int(arrests)
+        for category, arrests in counts.itertuples(index=False)
+    }
+
+
+@api.route('/counts', defaults={'dimension': None})
+@api.route('/counts/<dimension>')
+def counts(dimension):
+    """
+    Arrest counts by borough, precinct, offense, sex and age group for the
+    filters in the query string (same parameters as the download route).
+    """
+    if dimension is not None and dimension not in AGGREGATE_COLUMNS:
+        abort(404)
+
+    try:
+        filters = normalize_filters(**parse_filter_args(request.args))
+    except ValueError:
+        abort(400)
+
+    # Answer repeated polls before doing any work
+    snapshot = current_snapshot()
+    etag = filter_etag(snapshot.version, (dimension, filters))
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        try:
+            aggregates = get_aggregates(*filters, snapshot=snapshot)
+        except ValueError:
+            abort(400)
+
+        dimensions = [dimension] if dimension else list(AGGREGATE_COLUMNS)
+        start_date, end_date, crime_types, selected_locations, area = filters
+        response = jsonify({
+            'dataset_version': snapshot.version,
+            'filters': {
+                'start_date': start_date,
+                'end_date': end_date,
+                'crime_types': crime_types,
+                'locations': selected_locations,
+                'area': area
+            },
+            'total': aggregates['total'],
+            'counts': {
+                name: counts_to_dict(aggregates[name]) for name in dimensions
+            }
+        })
+
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
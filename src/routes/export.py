@@ -0,0 +1,163 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from flask import Blueprint, Response, abort, request
+
+from src.cache import current_snapshot
+from src.utils import area_rows, filter_mask
+
+export = Blueprint('export', __name__)
+
+# Rows written per chunk, keeps memory flat however many rows match
+CHUNK_SIZE = 50_000
+
+
+def parse_filter_args(args):
+    """
+    Read the dashboard filters from the query string.
+
+    Accepts start_date, end_date and repeated crime_type and location
+    parameters, e.g. ?crime_type=ROBBERY&location=Bronx&location=40, and an
+    area as radius=x,y,metres or bbox=x_min,y_min,x_max,y_max in state-plane
+    feet.
+
+    Parameters:
+    args (werkzeug.datastructures.MultiDict): Request query arguments
+
+    Returns:
+    dict: Filter keyword arguments, with the area as a tuple for area_rows
+    """
+    locations = [
+        int(location) if location.isdigit() else location
+        for location in args.getlist('location')
+    ]
+
+    area = None
+    if args.get('radius'):
+        area = ('radius', *map(float, args['radius'].split(',')))
+        if len(area) != 4:
+            raise ValueError("radius needs x,y,metres")
+    elif args.get('bbox'):
+        area = ('box', *map(float, args['bbox'].split(',')))
+        if len(area) != 5:
+            raise ValueError("bbox needs x_min,y_min,x_max,y_max")
+
+    return {
+        'start_date': args.get('start_date'),
+        'end_date': args.get('end_date'),
+        'crime_types': args.getlist('crime_type') or None,
+        'selected_locations': locations or None,
+        'area': area
+    }
+
+
+def stream_csv(data, rows):
+    """
+    Yield the selected rows as CSV text, one chunk at a time.
+
+    Parameters:
+    data (pd.DataFrame): Arrest data
+    rows (np.ndarray): Positions of the rows to export
+
+    Yields:
+    str: CSV text for each chunk, with the header on the first chunk
+    """
+    yield data.iloc[:0].to_csv(index=False)
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = data.iloc[rows[start:start + CHUNK_SIZE]]
+        yield chunk.to_csv(index=False, header=False)
+
+
+class ChunkSink:
+    """Write-only file object that hands back whatever was written so far."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_parquet(data, rows):
+    """
+    Yield the selected rows as a Parquet file, one row group per chunk.
+
+    Parameters:
+    data (pd.DataFrame): Arrest data
+    rows (np.ndarray): Positions of the rows to export
+
+    Yields:
+    bytes: Parquet file bytes written for each chunk
+    """
+    sink = ChunkSink()
+    # Infer the schema from real rows, an empty frame has no string types
+    schema = pa.Schema.from_pandas(data.head(CHUNK_SIZE), preserve_index=False)
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for start in range(0, len(rows), CHUNK_SIZE):
+            chunk = data.iloc[rows[start:start + CHUNK_SIZE]]
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            )
+            yield sink.drain()
+    finally:
+        # Also runs when the client disconnects: the server closes the
+        # generator, so no further chunks are built
+        writer.close()
+    yield sink.drain()
+
+
+@export.route('/download/arrests.<file_format>')
+def download_arrests(file_format):
+    """Stream the arrests matching the dashboard filters as CSV or Parquet."""
+    if file_format not in ('csv', 'parquet'):
+        abort(404)
+
+    # The stream keeps this snapshot's rows even if newer data is swapped in
+    snapshot = current_snapshot()
+    try:
+        filters = parse_filter_args(request.args)
+        area = filters.pop('area')
+        rows = np.flatnonzero(filter_mask(
+            snapshot.arrests,
+            **filters,
+            area_rows=area_rows(snapshot.codes['grid'], area) if area else None
+        ))
+    except ValueError:
+        abort(400)
+
+    if file_format == 'csv':
+        body, mimetype = stream_csv(snapshot.arrests, rows), 'text/csv'
+    else:
+        body, mimetype = (
+            stream_parquet(snapshot.arrests, rows),
+            'application/vnd.apache.parquet'
+        )
+
+    return Response(
+        body,
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': (
+                f'attachment; filename=nyc_arrests.{file_format}'
+            )
+        }
+    )
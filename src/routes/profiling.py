@@ -0,0 +1,91 @@
+import os
+import re
+import threading
+import uuid
+
+from flask import Blueprint, g, request
+
+from src.utils import StackSampler, write_folded
+from .admin import is_admin_request
+
+profiling = Blueprint('profiling', __name__)
+
+# Profiling is off unless set: '1' profiles every callback run, 'header'
+# only callback runs that admins request with the X-Profile header. The
+# hooks below are only registered (in app.py) when it is set, so there is
+# no overhead otherwise.
+PROFILE_MODE = os.environ.get('ARREST_TRACKER_PROFILE', '')
+if PROFILE_MODE not in ('', '1', 'header'):
+    raise ValueError(
+        f"ARREST_TRACKER_PROFILE must be '1' or 'header', not {PROFILE_MODE!r}"
+    )
+PROFILE_DIR = os.environ.get('ARREST_TRACKER_PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL = float(os.environ.get('ARREST_TRACKER_PROFILE_INTERVAL_MS', 2)) / 1000
+
+# Profiles kept on disk, the oldest are deleted past this
+PROFILE_KEEP = int(os.environ.get('ARREST_TRACKER_PROFILE_KEEP', 200))
+
+
+def profile_requested():
+    """Whether the current request should be profiled."""
+    if request.path != '/_dash-update-component':
+        return False
+    if PROFILE_MODE == 'header':
+        return request.headers.get('X-Profile') == '1' and is_admin_request()
+    return True
+
+
+@profiling.before_app_request
+def start_profile():
+    """Start sampling the thread that runs the callback."""
+    if not profile_requested():
+        return
+    # Keep caller-supplied request ids when they are safe as file names,
+    # with a random suffix so callers cannot overwrite other profiles
+    request_id = request.headers.get('X-Request-ID', '')
+    if re.fullmatch(r'[A-Za-z0-9_-]{1,64}', request_id):
+        request_id = f"{request_id}-{uuid.uuid4().hex[:8]}"
+    else:
+        request_id = uuid.uuid4().hex
+    callback = (request.get_json(silent=True) or {}).get('output', 'unknown')
+
+    g.profile_id = request_id
+    g.profile_sampler = StackSampler(
+        threading.get_ident(),
+        interval=PROFILE_INTERVAL,
+        root=f"callback:{callback}"
+    )
+    g.profile_sampler.start()
+
+
+@profiling.after_app_request
+def save_profile(response):
+    """Write the samples of a profiled request as a folded stack file."""
+    sampler = g.pop('profile_sampler', None)
+    if sampler is None:
+        return response
+    stacks = sampler.stop()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    write_folded(stacks, os.path.join(PROFILE_DIR, f"{g.profile_id}.folded"))
+    prune_profiles()
+    response.headers['X-Profile-Id'] = g.profile_id
+    return response
+
+
+def prune_profiles():
+    """Delete the oldest profiles once there are more than PROFILE_KEEP."""
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if not entry.name.endswith('.folded'):
+            continue
+        try:
+            profiles.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            # Deleted by a concurrent request
+            continue
+    profiles.sort()
+    for _, path in profiles[:max(len(profiles) - PROFILE_KEEP, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
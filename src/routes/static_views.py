@@ -0,0 +1,70 @@
+import os
+
+from flask import Blueprint, Response, abort, send_from_directory
+
+from src.cache import current_snapshot
+from src.data import STATIC_DIR, map_geometry, read_static_manifest
+
+static_views = Blueprint('static_views', __name__)
+
+# Where browsers fetch the prebuilt views from, e.g. a CDN in front of the app
+STATIC_URL = os.environ.get('ARREST_TRACKER_STATIC_URL', '/static-views/')
+
+# Files are named by a hash of their content and never change, so clients
+# and CDNs can keep them for a year
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def static_manifest(snapshot=None):
+    """
+    Get the prebuilt views for the layout, or None when they were not built
+    or were built from other data.
+
+    Parameters:
+    snapshot (DataSnapshot): Data the views must match, the current
+        snapshot by default
+
+    Returns:
+    dict: 'version' of the data, 'base' URL and the file name of each view
+    """
+    snapshot = snapshot or current_snapshot()
+    manifest = read_static_manifest()
+    if manifest is None or manifest['version'] != snapshot.version:
+        return None
+    return {**manifest, 'base': STATIC_URL}
+
+
+@static_views.route('/static-views/<name>.json')
+def static_view(name):
+    """Serve one prebuilt view with long-lived cache headers."""
+    if not name.isalnum():
+        abort(404)
+    response = send_from_directory(
+        os.path.abspath(os.path.join(STATIC_DIR, 'views')),
+        f'{name}.json',
+        max_age=STATIC_MAX_AGE
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def geometry_url(dimension):
+    """URL of the map shapes of a region dimension, named by their digest."""
+    return f"/geometry/{dimension}-{map_geometry[dimension]['digest']}.json"
+
+
+@static_views.route('/geometry/<dimension>-<digest>.json')
+def geometry(dimension, digest):
+    """Serve the map shapes, which only change with a new digest."""
+    if dimension not in map_geometry:
+        abort(404)
+    if digest != map_geometry[dimension]['digest']:
+        abort(404)
+    response = Response(
+        map_geometry[dimension]['content'], mimetype='application/json'
+    )
+    response.cache_control.max_age = STATIC_MAX_AGE
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
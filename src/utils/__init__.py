@@ -1,11 +1,88 @@
 from .helpers import (
     filter_data,
+    filter_mask,
+    date_mask,
     get_selected_location,
-    filter_data_by_location,
+    get_selected_area,
+    format_area_label,
+    year_marks,
+    location_mask,
+    location_lookup,
     create_pie_chart,
     create_bar_chart,
-    filter_data_by_crime_type,
     create_empty_bar_chart,  
     create_empty_pie_chart,
-    filter_data_by_date_range
+    category_codes,
+    count_by,
+    counts_frame,
+    aggregate_arrests,
+    AGGREGATE_COLUMNS,
+    CROSSTAB_COLUMNS,
+    CROSSTAB_TITLES,
+    CROSSTAB_PAIRS,
+    LAW_CATEGORY_NAMES,
+    combine_periods,
+    create_comparison_bar_chart,
+    create_comparison_pie_chart,
+    create_heatmap
 )
+from .kernel import (
+    build_code_table,
+    kernel_mask,
+    fused_counts,
+    joint_marginals,
+    region_marginals,
+    split_region_marginals,
+    marginals_from_regions,
+    compact_aggregate,
+    store_aggregates,
+    aggregates_from_marginals,
+    fused_aggregate,
+    fused_region_counts,
+    fused_region_rows,
+    period_labels,
+    fused_period_region_counts,
+    Z_95,
+    crosstab_matrix,
+    precinct_crosstab_matrix,
+    select_precincts,
+    crosstab_from_matrix,
+    crosstab_counts,
+    KEY_DIMENSIONS,
+    CROSSTAB_DIMENSIONS
+)
+from .parallel import (
+    start_pool,
+    restart_pool,
+    pool_started,
+    parallel_aggregate,
+    parallel_region_counts
+)
+from .memory import deep_size, rss_bytes, worker_rss
+from .cache_backend import SizedCache
+from .spatial import (
+    build_grid_index,
+    box_query,
+    radius_query,
+    area_rows,
+    FEET_PER_METRE
+)
+from .anomaly import (
+    weekly_counts,
+    rolling_zscores,
+    detect_anomalies,
+    flagged_precincts,
+    ANOMALY_COLUMNS
+)
+from .sample import build_sample, estimate_region_counts, estimated_rows
+from .profiling import StackSampler, collapse_stack, write_folded
+from .latency import live_queries, live_update_latency
+from .history import merge_labels, split_date_range, add_regions
+from .hierarchy import (
+    build_offense_hierarchy,
+    find_node,
+    drill_counts,
+    HIERARCHY_COLUMNS,
+    HIERARCHY_TITLES
+)
+from .refine import is_narrower, SessionRows
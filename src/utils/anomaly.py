@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+# Nanoseconds per day, for turning arrest dates into day and week numbers
+NS_PER_DAY = 24 * 60 * 60 * 10**9
+
+# Columns of the anomaly table written by the nightly run
+ANOMALY_COLUMNS = [
+    'ARREST_PRECINCT', 'OFNS_DESC', 'week_start', 'Arrests', 'Baseline',
+    'z_score'
+]
+
+
+def weekly_counts(table):
+    """
+    Count arrests per precinct x offense series and week in one bincount.
+
+    Weeks start on Monday. Every precinct code and offense gets a row, so the
+    matrix is dense; empty series are dropped by the caller.
+
+    Parameters:
+    table (dict): Output of build_code_table
+
+    Returns:
+    tuple: (counts with shape (precinct codes, offenses, weeks), first week
+    start as np.datetime64)
+    """
+    # 1970-01-01 was a Thursday, shift by 3 days so weeks start on Monday
+    weeks = (table['dates'] // NS_PER_DAY + 3) // 7
+    first_week = int(weeks.min()) if len(weeks) else 0
+    weeks = weeks - first_week
+    n_weeks = int(weeks.max()) + 1 if len(weeks) else 0
+
+    # Leave out the missing-offense bin
+    n_offenses = len(table['labels']['offense'])
+    known = table['offense'] < n_offenses
+    n_precincts = len(table['labels']['precinct'])
+
+    series = (
+        table['precinct'][known].astype(np.int64) * n_offenses +
+        table['offense'][known]
+    )
+    counts = np.bincount(
+        series * n_weeks + weeks[known],
+        minlength=n_precincts * n_offenses * n_weeks
+    ).reshape(n_precincts, n_offenses, n_weeks)
+
+    first_monday = (
+        np.datetime64('1970-01-01') + np.timedelta64(first_week * 7 - 3, 'D')
+    )
+    return counts, first_monday
+
+
+def rolling_zscores(counts, window=8, min_std=1.0):
+    """
+    Score each week against the mean and spread of the weeks before it, for
+    all series at once.
+
+    Rolling sums come from cumulative sums along the week axis, so the cost
+    does not depend on the window length.
+
+    Parameters:
+    counts (np.ndarray): Counts with weeks on the last axis
+    window (int): Number of preceding weeks in the baseline
+    min_std (float): Floor on the baseline spread. The spread is also kept
+        at least at the Poisson spread sqrt(mean), so quiet series do not
+        flag on one or two extra arrests
+
+    Returns:
+    tuple: (baseline mean, z-scores), both shaped like counts and NaN for the
+    first `window` weeks
+    """
+    counts = counts.astype(np.float64)
+    zeros = np.zeros(counts.shape[:-1] + (1,))
+    total = np.concatenate([zeros, np.cumsum(counts, axis=-1)], axis=-1)
+    total_sq = np.concatenate([zeros, np.cumsum(counts ** 2, axis=-1)], axis=-1)
+
+    # Week t uses weeks t - window .. t - 1
+    mean = np.full(counts.shape, np.nan)
+    std = np.full(counts.shape, np.nan)
+    mean[..., window:] = (total[..., window:-1] - total[..., :-window - 1]) / window
+    mean_sq = (total_sq[..., window:-1] - total_sq[..., :-window - 1]) / window
+    std[..., window:] = np.sqrt(np.maximum(mean_sq - mean[..., window:] ** 2, 0))
+
+    scale = np.maximum(np.maximum(std, np.sqrt(mean)), min_std)
+    z_scores = (counts - mean) / scale
+    return mean, z_scores
+
+
+def detect_anomalies(table, window=8, threshold=3.0, min_count=5):
+    """
+    Find weeks where a precinct's arrests for an offense jump well above
+    their own recent baseline.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    window (int): Number of preceding weeks in the baseline
+    threshold (float): Smallest z-score that is flagged
+    min_count (int): Smallest weekly count that is flagged
+
+    Returns:
+    pd.DataFrame: One row per flagged week (ANOMALY_COLUMNS), highest
+    z-score first
+    """
+    counts, first_monday = weekly_counts(table)
+    n_weeks = counts.shape[-1]
+    if n_weeks <= window:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+
+    # Score only the series that have arrests
+    flat = counts.reshape(-1, n_weeks)
+    active = np.flatnonzero(flat.any(axis=1))
+    baseline, z_scores = rolling_zscores(flat[active], window)
+
+    flagged = (z_scores >= threshold) & (flat[active] >= min_count)
+    series, week = np.nonzero(flagged)
+    precinct, offense = np.divmod(active[series], counts.shape[1])
+
+    anomalies = pd.DataFrame({
+        'ARREST_PRECINCT': table['labels']['precinct'][precinct],
+        'OFNS_DESC': table['labels']['offense'][offense],
+        'week_start': first_monday + week.astype('timedelta64[W]'),
+        'Arrests': flat[active][series, week],
+        'Baseline': baseline[series, week].round(2),
+        'z_score': z_scores[series, week].round(2)
+    })
+    return anomalies.sort_values('z_score', ascending=False, ignore_index=True)
+
+
+def flagged_precincts(anomalies, start_date=None, end_date=None, crime_types=None):
+    """
+    Summarise the flagged weeks per precinct for the map.
+
+    Parameters:
+    anomalies (pd.DataFrame): Output of detect_anomalies
+    start_date (str): Start date of the range, weeks overlapping it count
+    end_date (str): End date of the range
+    crime_types (list): Crime types to keep
+
+    Returns:
+    pd.DataFrame: Columns ['ARREST_PRECINCT', 'Spikes', 'Top Spike']
+    """
+    keep = np.ones(len(anomalies), dtype=bool)
+    if start_date and end_date:
+        week_start = anomalies['week_start'].to_numpy()
+        keep &= (
+            (week_start > np.datetime64(start_date) - np.timedelta64(7, 'D')) &
+            (week_start <= np.datetime64(end_date))
+        )
+    if crime_types:
+        keep &= anomalies['OFNS_DESC'].isin(crime_types).to_numpy()
+
+    # Rows are sorted by z-score, so the first row per precinct is the top one
+    spikes = anomalies[keep]
+    summary = spikes.groupby('ARREST_PRECINCT', sort=False).agg(
+        Spikes=('z_score', 'size'),
+        **{'Top Spike': ('OFNS_DESC', 'first')}
+    )
+    return summary.reset_index()
@@ -0,0 +1,79 @@
+import collections
+import pickle
+import threading
+import time
+
+from flask_caching.backends.base import BaseCache
+
+
+class SizedCache(BaseCache):
+    """
+    In-memory Flask-Caching backend that keeps track of the bytes it holds.
+
+    Like the simple backend, values are pickled. Entries are evicted least
+    recently used first once there are more than threshold of them, which is
+    set from CACHE_THRESHOLD.
+    """
+
+    def __init__(self, threshold=500, default_timeout=300):
+        super().__init__(default_timeout)
+        self.threshold = threshold
+        self.entries = collections.OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        return cls(config['CACHE_THRESHOLD'], kwargs['default_timeout'])
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                self._drop(key)
+                return None
+            self.entries.move_to_end(key)
+        return pickle.loads(entry[1])
+
+    def set(self, key, value, timeout=None):
+        timeout = self._normalize_timeout(timeout)
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self._drop(key)
+            self.entries[key] = (time.time() + timeout if timeout else 0, value)
+            self.bytes += len(value)
+            while len(self.entries) > self.threshold:
+                _, (_, dropped) = self.entries.popitem(last=False)
+                self.bytes -= len(dropped)
+        return True
+
+    def add(self, key, value, timeout=None):
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self.lock:
+            return self._drop(key)
+
+    def has(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and not self._expired(entry)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+        return True
+
+    def _expired(self, entry):
+        return entry[0] != 0 and entry[0] <= time.time()
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[1])
+        return entry is not None
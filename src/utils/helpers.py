@@ -1,184 +1,448 @@
+import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import pandas as pd
 
-# Filter data by date range
-def filter_data_by_date_range(data, start_date, end_date):
+from src.data import borough_names, precinct_borough
+
+
+def filter_mask(data, start_date=None, end_date=None, crime_types=None, selected_locations=None, area_rows=None):
     """
-    Filter data by selected date range - vectorized version
+    Build the combined boolean mask for the date, crime type, location and
+    area filters without copying any rows
 
     Parameters:
     data (pd.DataFrame): DataFrame to filter
-    start_date (str): Start date of the range
+    start_date (str): Start date of the range 
     end_date (str): End date of the range
+    crime_types (list): Crime types to filter by
+    selected_locations (list): The selected boroughs and/or precincts
+    area_rows (np.ndarray): Positions of the rows inside the selected area,
+        from the spatial index
 
     Returns:
-    pd.DataFrame: Filtered data
+    np.ndarray: Boolean mask aligned with the rows of data
     """
+    # Start with all rows selected
+    mask = np.ones(len(data), dtype=bool)
+    
+    # Date filter
     if start_date and end_date:
-        # Single boolean mask operation instead of chained filtering
-        date_mask = (data['ARREST_DATE'] >= start_date) & (data['ARREST_DATE'] <= end_date)
-        return data[date_mask]
-    return data
+        mask &= date_mask(data, start_date, end_date)
+    
+    # Crime type filter
+    if crime_types:
+        mask &= data['OFNS_DESC'].isin(crime_types).to_numpy()
+    
+    # Location filter
+    if selected_locations:
+        mask &= location_mask(data, selected_locations)
+
+    # Area filter
+    if area_rows is not None:
+        in_area = np.zeros(len(data), dtype=bool)
+        in_area[area_rows] = True
+        mask &= in_area
+    
+    return mask
 
 
-# Filter data by crime types
-def filter_data_by_crime_type(data, crime_types):
+def filter_data(data, start_date=None, end_date=None, crime_types=None, selected_locations=None):
     """
-    Filter data by selected crime types - vectorized version
+    Combined filter function to apply multiple filters in one pass
 
     Parameters:
     data (pd.DataFrame): DataFrame to filter
+    start_date (str): Start date of the range 
+    end_date (str): End date of the range
     crime_types (list): Crime types to filter by
+    selected_locations (list): The selected boroughs and/or precincts
 
     Returns:
     pd.DataFrame: Filtered data
     """
-    if not crime_types:  # Empty list means all crimes
-        return data
+    return data[filter_mask(
+        data,
+        start_date=start_date,
+        end_date=end_date,
+        crime_types=crime_types,
+        selected_locations=selected_locations
+    )]
 
-    crime_mask = data['OFNS_DESC'].isin(crime_types)
-    return data[crime_mask]
 
-def filter_data(data, start_date=None, end_date=None, crime_types=None, selected_location=None):
+# Vectorized date filter
+def date_mask(data, start_date, end_date):
     """
-    Combined filter function to apply multiple filters in one pass
+    Build a boolean mask for the rows inside an inclusive date range.
 
     Parameters:
     data (pd.DataFrame): DataFrame to filter
-    start_date (str): Start date of the range 
+    start_date (str): Start date of the range
     end_date (str): End date of the range
-    crime_types (list): Crime types to filter by
-    selected_location: The selected borough or precinct
 
     Returns:
-    pd.DataFrame: Filtered data
+    np.ndarray: Boolean mask aligned with the rows of data
     """
-    # Start with all rows selected
-    mask = pd.Series(True, index=data.index)
-    
-    # Date filter
-    if start_date and end_date:
-        date_mask = (data['ARREST_DATE'] >= start_date) & (data['ARREST_DATE'] <= end_date)
-        mask = mask & date_mask
-    
-    # Crime type filter
-    if crime_types:
-        crime_mask = data['OFNS_DESC'].isin(crime_types)
-        mask = mask & crime_mask
-    
-    # Location filter
-    if selected_location:
-        if selected_location in ['Bronx', 'Staten Island', 'Brooklyn', 'Manhattan', 'Queens']:
-            # Filter by borough
-            location_mask = (data['borough'] == selected_location)
-        else:
-            # Filter by precinct
-            location_mask = (data['ARREST_PRECINCT'] == selected_location)
-        mask = mask & location_mask
-    
-    return data[mask]
+    dates = data['ARREST_DATE'].to_numpy()
+    return (
+        (dates >= pd.Timestamp(start_date).to_datetime64()) &
+        (dates <= pd.Timestamp(end_date).to_datetime64())
+    )
+
+
+# Precinct lookup table for a location selection
+def location_lookup(selected_locations):
+    """
+    Build a boolean table, indexed by precinct code, of the precincts in any
+    of the selected boroughs or precincts.
 
+    Boroughs are expanded to their precincts through the precomputed
+    precinct -> borough table.
+
+    Parameters:
+    selected_locations (list): Borough names and/or precinct numbers
+
+    Returns:
+    np.ndarray: Boolean table indexed by precinct code
+    """
+    selected = np.zeros(len(precinct_borough), dtype=bool)
+    for location in selected_locations:
+        if location in borough_names:
+            selected |= precinct_borough == borough_names.index(location)
+        elif 0 <= int(location) < len(selected):
+            selected[int(location)] = True
+    return selected
+
+
+# Vectorized location filter
+def location_mask(data, selected_locations):
+    """
+    Build a boolean mask for the rows in any of the selected boroughs or
+    precincts.
+
+    Rows are checked with a single lookup in the precinct table, so the cost
+    does not grow with the number of selected locations.
+
+    Parameters:
+    data (pd.DataFrame): DataFrame to filter
+    selected_locations (list): Borough names and/or precinct numbers
 
-# Helper function to get the selected location from clicked_region
+    Returns:
+    np.ndarray: Boolean mask aligned with the rows of data
+    """
+    selected = location_lookup(selected_locations)
+    return selected[data['ARREST_PRECINCT'].to_numpy()]
+
+
+# Helper function to get the selected locations from clicked_region
 def get_selected_location(clicked_region):
     """
-    Extract the selected location (borough or precinct) from the clicked
-    region data.
+    Extract the selected locations (boroughs or precincts) from the clicked
+    region data. Several regions can be selected with shift-click.
 
     Parameters:
     clicked_region (dict): The signal data from the map click
 
     Returns:
-    tuple: (selected_location, location_label) or (None, None) if no valid
+    tuple: (selected_locations, location_label) or (None, None) if no valid
     selection
     """
     if not clicked_region or 'select_region' not in clicked_region:
         return None, None
 
     # Check if the clicked region is a borough or precinct
-    selected_location = clicked_region['select_region'].get('Borough', None)
+    selected_locations = clicked_region['select_region'].get('Borough', None)
 
-    if not selected_location:
-        selected_location = clicked_region['select_region'].get(
+    if not selected_locations:
+        selected_locations = clicked_region['select_region'].get(
             'Precinct', None
         )
 
-    # If selected_location is a list, get the first element
-    if isinstance(selected_location, list) and selected_location:
-        selected_location = selected_location[0]
+    if not selected_locations:
+        return None, None
+
+    # A single click gives one value, shift-click gives a list of values
+    if not isinstance(selected_locations, list):
+        selected_locations = [selected_locations]
 
     # Format the location label (add "Precinct" prefix for precinct numbers)
-    location_label = selected_location
-    if isinstance(selected_location, int):
-        location_label = f"Precinct {selected_location}"
+    if isinstance(selected_locations[0], int):
+        if len(selected_locations) == 1:
+            location_label = f"Precinct {selected_locations[0]}"
+        elif len(selected_locations) <= 3:
+            location_label = "Precincts " + ", ".join(
+                str(precinct) for precinct in selected_locations
+            )
+        else:
+            location_label = f"{len(selected_locations)} Precincts"
+    else:
+        if len(selected_locations) <= 3:
+            location_label = ", ".join(selected_locations)
+        else:
+            location_label = f"{len(selected_locations)} Boroughs"
+
+    return selected_locations, location_label
+
 
-    return selected_location, location_label
+# Helper function to get the area filter from the sidebar inputs
+def get_selected_area(area_type, x, y, radius, x_min, y_min, x_max, y_max):
+    """
+    Build the area filter from the sidebar inputs.
 
+    Parameters:
+    area_type (str): 'none', 'radius' or 'box'
+    x, y (float): Centre of the radius search, in state-plane feet
+    radius (float): Search radius in metres
+    x_min, y_min, x_max, y_max (float): Box corners, in state-plane feet
 
-# Helper function to filter data by location
-def filter_data_by_location(selected_location, data):
+    Returns:
+    list: ['radius', x, y, metres] or ['box', x_min, y_min, x_max, y_max],
+    or None when no complete area is selected
+    """
+    if area_type == 'radius' and None not in (x, y, radius):
+        return ['radius', x, y, radius]
+    if area_type == 'box' and None not in (x_min, y_min, x_max, y_max):
+        return [
+            'box',
+            min(x_min, x_max), min(y_min, y_max),
+            max(x_min, x_max), max(y_min, y_max)
+        ]
+    return None
+
+
+def format_area_label(area):
     """
-    Filter the arrest data by the selected borough or precinct.
+    Describe an area filter for chart titles.
 
     Parameters:
-    selected_location: The selected borough name or precinct number
-    data: The dataset to filter (could be already filtered by crime type)
+    area (list): Output of get_selected_area
 
     Returns:
-    pd.DataFrame: Filtered arrest data or None if no valid data
+    str: Label such as " within 500 m", or "" without an area
     """
-    if selected_location is None:
-        return None
+    if not area:
+        return ""
+    if area[0] == 'radius':
+        return f" within {area[3]:,.0f} m"
+    return " in Selected Box"
 
-    borough_mapping = {
-        'B': 'Bronx',
-        'S': 'Staten Island',
-        'K': 'Brooklyn',
-        'M': 'Manhattan',
-        'Q': 'Queens'
+
+# Helper function to label the year selector
+def year_marks(years):
+    """
+    Label every fifth year and the last year on the year selector.
+
+    Parameters:
+    years (list): Years that can be selected
+
+    Returns:
+    dict: {year: label}
+    """
+    return {
+        year: str(year) for year in years
+        if year % 5 == 0 or year == years[-1]
     }
 
-    
-    if selected_location in borough_mapping.values():
-        filtered_data = data[data['borough'] == selected_location]
-    else:
-        filtered_data = data[data['ARREST_PRECINCT'] == selected_location]
 
-    if filtered_data.empty:
-        return None
+# Integer codes for a column, used for bincount-style counting
+def category_codes(series, categories=None):
+    """
+    Get integer codes and their labels for a column.
 
-    return filtered_data
+    Categorical columns reuse their stored codes, so no extra pass over the
+    data is needed. Missing values get the code -1.
 
-def create_pie_chart(data, title):
+    Parameters:
+    series (pd.Series): Column to encode
+    categories (list): Optional fixed categories, so that separately loaded
+        data gets the same codes. Values not in them get the code -1.
+
+    Returns:
+    tuple: (codes, categories)
     """
-    Create a pie chart with consistent styling.
+    if categories is not None:
+        categories = pd.Index(categories)
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.set_categories(categories).cat.codes
+        else:
+            codes = pd.Categorical(series, categories=categories).codes
+        return np.asarray(codes), categories
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    return pd.factorize(series, sort=True)
+
+
+# Columns behind each aggregate dimension
+AGGREGATE_COLUMNS = {
+    'borough': 'borough',
+    'precinct': 'ARREST_PRECINCT',
+    'offense': 'OFNS_DESC',
+    'sex': 'PERP_SEX',
+    'age': 'AGE_GROUP'
+}
+
+# Columns that can be cross-tabulated against each other
+CROSSTAB_COLUMNS = {
+    'precinct': 'ARREST_PRECINCT',
+    'offense': 'OFNS_DESC',
+    'sex': 'PERP_SEX',
+    'age': 'AGE_GROUP',
+    'race': 'PERP_RACE',
+    'law': 'LAW_CAT_CD'
+}
+
+# Axis titles of the cross-tab dimensions
+CROSSTAB_TITLES = {
+    'precinct': 'Precinct',
+    'offense': 'Crime Type',
+    'sex': 'Gender',
+    'age': 'Age Group',
+    'race': 'Race',
+    'law': 'Law Category'
+}
+
+# Cross-tabs offered in the dashboard, as (rows, columns)
+CROSSTAB_PAIRS = {
+    'precinct-race': ('precinct', 'race'),
+    'offense-age': ('offense', 'age'),
+    'offense-law': ('offense', 'law'),
+    'offense-race': ('offense', 'race'),
+    'precinct-offense': ('precinct', 'offense'),
+    'age-race': ('age', 'race'),
+    'sex-age': ('sex', 'age')
+}
+
+# Readable names of the law category codes
+LAW_CATEGORY_NAMES = {
+    'F': 'Felony',
+    'M': 'Misdemeanor',
+    'V': 'Violation',
+    'I': 'Infraction'
+}
+
+
+def count_by(data, column, mask=None):
+    """
+    Count arrests per value of a column, optionally for masked rows only.
 
     Parameters:
-    data (pd.DataFrame): DataFrame with at least two columns - one for names
-        and one for values
-    title (str): Title for the pie chart
+    data (pd.DataFrame): Arrest data
+    column (str): Column to group by
+    mask (np.ndarray): Optional mask of rows to count
 
     Returns:
-    plotly.graph_objects.Figure: A pie chart figure
+    pd.DataFrame: Columns [column, 'Arrests'], sorted by count
+    """
+    codes, categories = category_codes(data[column])
+    if mask is not None:
+        codes = codes[mask]
+
+    return counts_frame(
+        column,
+        categories,
+        np.bincount(codes[codes >= 0], minlength=len(categories))
+    )
+
+
+def counts_frame(column, categories, counts, margins=None):
+    """
+    Turn a count array into a count table.
+
+    Parameters:
+    column (str): Name of the category column
+    categories (array-like): Label of each count
+    counts (np.ndarray): Count per category
+    margins (np.ndarray): Optional confidence interval half-width per
+        category, for estimated counts
+
+    Returns:
+    pd.DataFrame: Columns [column, 'Arrests'] (and 'Margin') for the
+    non-zero counts, sorted by count
+    """
+    counts = pd.DataFrame({column: np.asarray(categories), 'Arrests': counts})
+    if margins is not None:
+        counts['Margin'] = np.rint(margins).astype(np.int64)
+    counts = counts[counts['Arrests'] > 0]
+    return counts.sort_values(by='Arrests', ascending=False, ignore_index=True)
+
+
+def aggregate_arrests(data, mask=None):
+    """
+    Count arrests by borough, precinct, offense, sex and age group.
+
+    Parameters:
+    data (pd.DataFrame): Arrest data
+    mask (np.ndarray): Optional mask of rows to count
+
+    Returns:
+    dict: 'total' arrest count and one count DataFrame per dimension
+    """
+    aggregates = {
+        dimension: count_by(data, column, mask)
+        for dimension, column in AGGREGATE_COLUMNS.items()
+    }
+    aggregates['total'] = int(aggregates['sex']['Arrests'].sum())
+    return aggregates
+
+
+def combine_periods(selected, comparison):
+    """
+    Join the count tables of a selected and a comparison period.
+
+    Parameters:
+    selected (pd.DataFrame): Columns [column, 'Arrests'] for the selected period
+    comparison (pd.DataFrame): Same for the comparison period
+
+    Returns:
+    pd.DataFrame: Columns [column, 'Selected', 'Comparison'], sorted by the
+    selected period's counts
+    """
+    column = selected.columns[0]
+    # Estimated margins are not shown side by side
+    period_counts = selected[[column, 'Arrests']].merge(
+        comparison[[column, 'Arrests']], how='outer', on=column,
+        suffixes=('_selected', '_comparison')
+    ).rename(columns={
+        'Arrests_selected': 'Selected',
+        'Arrests_comparison': 'Comparison'
+    })
+    period_counts[['Selected', 'Comparison']] = (
+        period_counts[['Selected', 'Comparison']].fillna(0).astype(int)
+    )
+    return period_counts.sort_values(
+        by='Selected', ascending=False, ignore_index=True
+    )
+
+
+def get_pie_colors(name_col):
+    """
+    Get the pie chart color scheme for a category column.
+
+    Parameters:
+    name_col (str): Name of the category column
+
+    Returns:
+    list: Color sequence
     """
 
     # Color schemes
     crime_colors = [
-    '#1D3557',  
-    '#E63946',  
-    '#FFD700',  
-    '#A8DADC',  
-    '#F1FAEE',  
-    '#D62828',  
-    '#6A994E',  
-    '#4A5859',  
-    '#FF9F1C',  
-    '#03045E',  
-    '#9D0208',  
-    '#7B2CBF',  
-    '#FB8500',  
-    '#2A9D8F',  
-    '#264653'   
+    '#1D3557',
+    '#E63946',
+    '#FFD700',
+    '#A8DADC',
+    '#F1FAEE',
+    '#D62828',
+    '#6A994E',
+    '#4A5859',
+    '#FF9F1C',
+    '#03045E',
+    '#9D0208',
+    '#7B2CBF',
+    '#FB8500',
+    '#2A9D8F',
+    '#264653'
 ]
 
     gender_colors = ['#1D3557', '#E63946', '#FFD700']
@@ -192,13 +456,6 @@ def create_pie_chart(data, title):
         '#003049'   # Dark navy
     ]
 
-    # Get the column names - one will be 'Arrests',
-    # the other is the category name
-    columns = list(data.columns)
-
-    # The name column is the one that's not 'Arrests'
-    name_col = [col for col in columns if col != 'Arrests'][0]
-
     # Select the appropriate color scheme based on the category
     if name_col == 'OFNS_DESC':
         color_sequence = crime_colors
@@ -209,6 +466,34 @@ def create_pie_chart(data, title):
     else:
         color_sequence = crime_colors  # Default
 
+    return color_sequence
+
+
+def create_pie_chart(data, title):
+    """
+    Create a pie chart with consistent styling.
+
+    Parameters:
+    data (pd.DataFrame): DataFrame with at least two columns - one for names
+        and one for values
+    title (str): Title for the pie chart
+
+    Returns:
+    plotly.graph_objects.Figure: A pie chart figure
+    """
+
+    # Get the column names - one will be 'Arrests',
+    # the other is the category name
+    columns = list(data.columns)
+
+    # The name column is the one that's not 'Arrests' (or an estimate's
+    # 'Margin')
+    name_col = [col for col in columns if col not in ('Arrests', 'Margin')][0]
+
+    color_sequence = get_pie_colors(name_col)
+
+    # Estimated counts show their 95% confidence interval
+    estimated = 'Margin' in columns
     pie_chart = px.pie(
         data,
         names=name_col,
@@ -216,14 +501,16 @@ def create_pie_chart(data, title):
         title=title,
         labels={'Arrests': 'Number of Arrests'},
         color=name_col,
-        color_discrete_sequence=color_sequence
+        color_discrete_sequence=color_sequence,
+        custom_data=['Margin'] if estimated else None
     )
 
     # Customize the hover template for a cleaner look and match the map style
     pie_chart.update_traces(
         hovertemplate=(
-            '<b>%{label}</b><br>Arrests: %{value}<br>'
-            '%{percent:.2%} of Total<extra></extra>'
+            '<b>%{label}</b><br>Arrests: '
+            + ('~%{value:,} ± %{customdata[0]:,}' if estimated else '%{value}')
+            + '<br>%{percent:.2%} of Total<extra></extra>'
         ),
         textinfo='percent',
         textposition='inside'
@@ -322,8 +609,11 @@ def create_bar_chart(data, title):
     
     # Get the column names - one will be 'Arrests', the other is the category name
     columns = list(data.columns)
-    name_col = [col for col in columns if col != 'Arrests'][0]
-    
+    name_col = [col for col in columns if col not in ('Arrests', 'Margin')][0]
+
+    # Estimated counts get error bars with their 95% confidence interval
+    estimated = 'Margin' in columns
+
     # Create horizontal bar chart with consistent coloring
     bar_chart = px.bar(
         data,
@@ -332,13 +622,23 @@ def create_bar_chart(data, title):
         title=title,
         labels={'Arrests': 'Number of Arrests'},
         orientation='h',  # Horizontal orientation
-        color_discrete_sequence=[bar_color]  # Use single color for all bars
+        color_discrete_sequence=[bar_color],  # Use single color for all bars
+        error_x='Margin' if estimated else None,
+        custom_data=['Margin'] if estimated else None
     )
     
     # Customize hover information
-    bar_chart.update_traces(
-        hovertemplate='<b>%{y}</b><br>Arrests: %{x:,}<extra></extra>'
-    )
+    if estimated:
+        bar_chart.update_traces(
+            hovertemplate=(
+                '<b>%{y}</b><br>Arrests: ~%{x:,} ± %{customdata[0]:,}'
+                '<extra></extra>'
+            )
+        )
+    else:
+        bar_chart.update_traces(
+            hovertemplate='<b>%{y}</b><br>Arrests: %{x:,}<extra></extra>'
+        )
     
     # Improve layout and styling
     bar_chart.update_layout(
@@ -401,3 +701,211 @@ def create_empty_bar_chart():
         height=240
     )
     return fig
+
+
+def create_heatmap(crosstab, title):
+    """
+    Create a heatmap of a cross-tab.
+
+    Parameters:
+    crosstab (dict): Output of crosstab_counts
+    title (str): Title for the heatmap
+
+    Returns:
+    plotly.graph_objects.Figure: A heatmap figure
+    """
+    row_dimension, column_dimension = crosstab['dimensions']
+    labels = []
+    for dimension in crosstab['dimensions']:
+        dimension_labels = crosstab['labels'][dimension]
+        if dimension == 'law':
+            dimension_labels = [
+                LAW_CATEGORY_NAMES.get(code, code) for code in dimension_labels
+            ]
+        # Plotly treats numbers as a continuous axis, precincts are categories
+        labels.append([str(label) for label in dimension_labels])
+
+    counts = crosstab['counts']
+    heatmap = go.Figure(
+        go.Heatmap(
+            z=counts,
+            x=labels[1],
+            y=labels[0],
+            colorscale='Blues',
+            colorbar=dict(title='Arrests'),
+            hovertemplate=(
+                f"{CROSSTAB_TITLES[row_dimension]}: %{{y}}<br>"
+                f"{CROSSTAB_TITLES[column_dimension]}: %{{x}}<br>"
+                "Arrests: %{z:,}<extra></extra>"
+            )
+        )
+    )
+
+    heatmap.update_layout(
+        title=dict(
+            text=title,
+            font=dict(size=14),
+            x=0.5,
+            y=0.97
+        ),
+        # Grow with the number of rows so labels stay readable
+        height=min(max(300, 18 * counts.shape[0] + 150), 1400),
+        margin=dict(l=10, r=10, t=40, b=10),
+        plot_bgcolor='white',
+        xaxis=dict(
+            title=CROSSTAB_TITLES[column_dimension],
+            type='category',
+            tickfont=dict(size=10),
+            automargin=True
+        ),
+        yaxis=dict(
+            title=CROSSTAB_TITLES[row_dimension],
+            type='category',
+            autorange='reversed',
+            tickfont=dict(size=10),
+            automargin=True
+        )
+    )
+
+    return heatmap
+
+
+def create_comparison_bar_chart(data, title):
+    """
+    Create a grouped bar chart comparing two periods side by side.
+
+    Parameters:
+    data (pd.DataFrame): DataFrame with a category column and the
+        'Selected' and 'Comparison' count columns
+    title (str): Title for the bar chart
+
+    Returns:
+    plotly.graph_objects.Figure: A grouped bar chart figure
+    """
+    # Take only top 5 crimes
+    if len(data) > 5:
+        data = data.head(5)
+
+    name_col = [
+        col for col in data.columns if col not in ('Selected', 'Comparison')
+    ][0]
+
+    bar_chart = px.bar(
+        data.melt(
+            id_vars=name_col,
+            value_vars=['Selected', 'Comparison'],
+            var_name='Period',
+            value_name='Arrests'
+        ),
+        y=name_col,
+        x='Arrests',
+        color='Period',
+        barmode='group',
+        title=title,
+        labels={'Arrests': 'Number of Arrests'},
+        orientation='h',
+        color_discrete_sequence=['#1D3557', '#A8DADC']
+    )
+
+    bar_chart.update_traces(
+        hovertemplate='<b>%{y}</b><br>Arrests: %{x:,}<extra>%{fullData.name}</extra>'
+    )
+
+    bar_chart.update_layout(
+        dragmode=False,
+        height=240,
+        margin=dict(l=10, r=10, t=30, b=10),
+        title=dict(
+            text=title,
+            font=dict(size=14),
+            x=0.5,
+            y=0.95
+        ),
+        legend=dict(title='', orientation='h', y=-0.25),
+        plot_bgcolor='white',
+        yaxis=dict(
+            title='',
+            automargin=True,
+            tickfont=dict(size=11),
+            fixedrange=True
+        ),
+        xaxis=dict(
+            title='Number of Arrests',
+            tickfont=dict(size=11),
+            showgrid=True,
+            gridcolor='lightgray',
+            gridwidth=0.5,
+            fixedrange=True
+        )
+    )
+
+    return bar_chart
+
+
+def create_comparison_pie_chart(data, title):
+    """
+    Create two pie charts side by side, one for each compared period.
+
+    Parameters:
+    data (pd.DataFrame): DataFrame with a category column and the
+        'Selected' and 'Comparison' count columns
+    title (str): Title for the chart
+
+    Returns:
+    plotly.graph_objects.Figure: A figure with two pie charts
+    """
+    name_col = [
+        col for col in data.columns if col not in ('Selected', 'Comparison')
+    ][0]
+
+    # Keep the same color for a category in both pies
+    color_sequence = get_pie_colors(name_col)
+    colors = [
+        color_sequence[i % len(color_sequence)] for i in range(len(data))
+    ]
+
+    pie_chart = make_subplots(
+        rows=1,
+        cols=2,
+        specs=[[{'type': 'domain'}, {'type': 'domain'}]],
+        subplot_titles=['Selected', 'Comparison']
+    )
+    for col, period in enumerate(['Selected', 'Comparison'], start=1):
+        pie_chart.add_trace(
+            go.Pie(
+                labels=data[name_col],
+                values=data[period],
+                name=period,
+                sort=False,
+                marker=dict(colors=colors),
+                hovertemplate=(
+                    '<b>%{label}</b><br>Arrests: %{value}<br>'
+                    '%{percent:.2%} of Total<extra>%{fullData.name}</extra>'
+                ),
+                textinfo='percent',
+                textposition='inside'
+            ),
+            row=1,
+            col=col
+        )
+
+    pie_chart.update_annotations(font_size=11, yshift=-5)
+    pie_chart.update_layout(
+        showlegend=False,
+        hoverlabel=dict(
+            bgcolor="white",
+            font_size=14,
+            font_family="Arial"
+        ),
+        uniformtext_minsize=10,
+        uniformtext_mode='hide',
+        height=220,
+        margin=dict(l=10, r=10, t=70, b=10),
+        title=dict(
+            text=title,
+            font=dict(size=14),
+            x=0.5,
+            y=0.95
+        )
+    )
+    return pie_chart
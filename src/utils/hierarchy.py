@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+from .helpers import location_lookup
+
+# Levels of the offense drill-down, from the broadest to the most detailed
+HIERARCHY_COLUMNS = ['OFNS_DESC', 'PD_DESC', 'LAW_CODE']
+HIERARCHY_TITLES = {
+    'OFNS_DESC': 'Crime Types',
+    'PD_DESC': 'PD Descriptions',
+    'LAW_CODE': 'Law Codes'
+}
+
+# Label of missing descriptions and law codes
+MISSING_LABEL = '(Not recorded)'
+
+
+def build_offense_hierarchy(data):
+    """
+    Precompute arrest counts per offense, PD description and law code, per
+    date and precinct, laid out so that any node's children are contiguous.
+
+    Nodes of each level are sorted by their parent and then by label, so the
+    children of a node are one range of the next level, given by offsets.
+    Counts are grouped by leaf (offense, PD description, law code), date and
+    precinct and sorted by leaf, so every node's counts are also one range.
+
+    Parameters:
+    data (pd.DataFrame): Arrest data with the hierarchy columns
+
+    Returns:
+    dict: 'labels' (list of node labels per level), 'index' (node number by
+    (parent, label) per level), 'offsets' (children range of each node per
+    level but the last), 'leaf_nodes' (node of each leaf per level),
+    'leaf_rows' (count range of each leaf) and the grouped 'leaves',
+    'dates', 'precincts' and 'counts'
+    """
+    keys = pd.DataFrame({
+        column: data[column].astype(object).fillna(MISSING_LABEL).astype(str)
+        for column in HIERARCHY_COLUMNS
+    })
+    keys['dates'] = data['ARREST_DATE'].dt.normalize().to_numpy()
+    keys['precincts'] = data['ARREST_PRECINCT'].to_numpy()
+    grouped = keys.groupby(
+        [*HIERARCHY_COLUMNS, 'dates', 'precincts'], sort=True, observed=True
+    ).size().reset_index(name='counts')
+
+    # Leaves are the distinct paths, in the sorted order of the groups
+    paths = grouped[HIERARCHY_COLUMNS]
+    leaf_start = np.flatnonzero(
+        np.r_[True, (paths.iloc[1:].to_numpy() != paths.iloc[:-1].to_numpy())
+              .any(axis=1)]
+    ) if len(paths) else np.zeros(0, dtype=np.int64)
+    leaf_paths = paths.iloc[leaf_start].reset_index(drop=True)
+    leaf_rows = np.append(leaf_start, len(grouped)).astype(np.int64)
+
+    labels, index, offsets, leaf_nodes = [], [], [], []
+    parents = np.zeros(len(leaf_paths), dtype=np.int64)
+    for depth, column in enumerate(HIERARCHY_COLUMNS):
+        # A new node starts wherever the parent or this level's label changes
+        level_labels = leaf_paths[column].to_numpy()
+        starts = np.r_[True, (
+            (parents[1:] != parents[:-1]) |
+            (level_labels[1:] != level_labels[:-1])
+        )] if len(leaf_paths) else np.zeros(0, dtype=bool)
+        nodes = np.cumsum(starts) - 1
+        node_parents = parents[starts]
+        if depth > 0:
+            # Children of each parent node are one range of this level
+            offsets.append(np.searchsorted(
+                node_parents, np.arange(len(labels[-1]) + 1)
+            ).astype(np.int64))
+        labels.append(level_labels[starts].tolist())
+        index.append({
+            (int(parent), label): node
+            for node, (parent, label) in enumerate(
+                zip(node_parents, labels[-1])
+            )
+        })
+        leaf_nodes.append(nodes.astype(np.int64))
+        parents = nodes
+
+    return {
+        'labels': labels,
+        'index': index,
+        'offsets': offsets,
+        'leaf_nodes': leaf_nodes,
+        'leaf_rows': leaf_rows,
+        'leaves': np.repeat(
+            np.arange(len(leaf_paths), dtype=np.int64), np.diff(leaf_rows)
+        ),
+        'dates': grouped['dates'].to_numpy().astype('datetime64[ns]')
+                 .astype(np.int64),
+        'precincts': grouped['precincts'].to_numpy(),
+        'counts': grouped['counts'].to_numpy(dtype=np.int64)
+    }
+
+
+def find_node(hierarchy, path):
+    """
+    Find the node of a drill-down path.
+
+    Parameters:
+    hierarchy (dict): Output of build_offense_hierarchy
+    path (list): Labels from the offense down
+
+    Returns:
+    int: Node number at the level of the last label, or None when the path
+    is not in the hierarchy
+    """
+    node = 0
+    for depth, label in enumerate(path):
+        node = hierarchy['index'][depth].get((node, label))
+        if node is None:
+            return None
+    return node
+
+
+def drill_counts(hierarchy, path, start_date=None, end_date=None,
+                 selected_locations=None):
+    """
+    Count the arrests of each child of a drill-down node.
+
+    Only the node's own range of precomputed counts is read: the children
+    are a contiguous range of the next level, and their leaves a contiguous
+    range of the counts.
+
+    Parameters:
+    hierarchy (dict): Output of build_offense_hierarchy
+    path (list): Labels from the offense down, at least one
+    start_date (str): Start date of the range
+    end_date (str): End date of the range
+    selected_locations (list): The selected boroughs and/or precincts
+
+    Returns:
+    pd.DataFrame: Child labels and 'Arrests', largest first, without
+    children that have no arrests
+    """
+    depth = len(path)
+    column = HIERARCHY_COLUMNS[depth]
+    node = find_node(hierarchy, path)
+    if node is None:
+        return pd.DataFrame({column: [], 'Arrests': []})
+
+    # Follow the first and last child down to the range of leaves
+    first, last = node, node + 1
+    for offsets in hierarchy['offsets'][depth - 1:]:
+        first, last = offsets[first], offsets[last]
+    rows = slice(hierarchy['leaf_rows'][first], hierarchy['leaf_rows'][last])
+
+    counts = hierarchy['counts'][rows]
+    if start_date and end_date:
+        dates = hierarchy['dates'][rows]
+        counts = counts * (
+            (dates >= pd.Timestamp(start_date).value) &
+            (dates <= pd.Timestamp(end_date).value)
+        )
+    if selected_locations:
+        counts = counts * location_lookup(selected_locations)[
+            hierarchy['precincts'][rows]
+        ]
+
+    children = slice(*hierarchy['offsets'][depth - 1][[node, node + 1]])
+    child = hierarchy['leaf_nodes'][depth][hierarchy['leaves'][rows]]
+    totals = np.bincount(
+        child - children.start,
+        weights=counts,
+        minlength=children.stop - children.start
+    ).astype(np.int64)
+
+    result = pd.DataFrame({
+        column: hierarchy['labels'][depth][children],
+        'Arrests': totals
+    })
+    result = result[result['Arrests'] > 0]
+    return result.sort_values(
+        'Arrests', ascending=False, kind='stable'
+    ).reset_index(drop=True)
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from .helpers import CROSSTAB_COLUMNS, category_codes
+from .kernel import CROSSTAB_DIMENSIONS, split_region_marginals
+
+
+def merge_labels(data, history_labels):
+    """
+    Combine the labels of the current data with those of the historic years,
+    so that every year's code table uses the same codes.
+
+    Parameters:
+    data (pd.DataFrame): Current arrest data
+    history_labels (dict): Labels of the historic years per column name
+
+    Returns:
+    dict: Sorted labels per dimension, for build_code_table
+    """
+    labels = {}
+    for dimension in CROSSTAB_DIMENSIONS[1:]:
+        column = CROSSTAB_COLUMNS[dimension]
+        _, categories = category_codes(data[column])
+        labels[dimension] = sorted(
+            set(categories) | set(history_labels.get(column, []))
+        )
+    return labels
+
+
+def split_date_range(start_date, end_date, years, current_start):
+    """
+    Split a date range into the historic years it touches and the part left
+    for the current data, so queries only open the years they need.
+
+    The current data answers every date from its first day on, historic
+    years answer the dates before it. Without a date range only the current
+    data is queried.
+
+    Parameters:
+    start_date (str): Start date of the range
+    end_date (str): End date of the range
+    years (list): Years with historic data
+    current_start (str): First date of the current data
+
+    Returns:
+    tuple: (list of (year, start_date, end_date) per historic year in the
+    range, with None dates where the whole year is in it, and the
+    (start_date, end_date) left for the current data, or None when the
+    range ends before it)
+    """
+    if not (start_date and end_date) or not years:
+        return [], (start_date, end_date)
+
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    current = pd.Timestamp(current_start)
+
+    parts = []
+    for year in years:
+        year_start = pd.Timestamp(year=year, month=1, day=1)
+        year_end = pd.Timestamp(year=year, month=12, day=31)
+        # The current data takes over from its first day
+        clipped = year_end >= current
+        if clipped:
+            year_end = current - pd.Timedelta(days=1)
+        if year_end < year_start or end < year_start or start > year_end:
+            continue
+        if start <= year_start and end >= year_end and not clipped:
+            parts.append((year, None, None))
+        else:
+            parts.append((
+                year,
+                max(start, year_start).strftime('%Y-%m-%d'),
+                min(end, year_end).strftime('%Y-%m-%d')
+            ))
+
+    if not parts:
+        return parts, (start_date, end_date)
+    if end < current:
+        return parts, None
+    return parts, (current.strftime('%Y-%m-%d'), end_date)
+
+
+def add_regions(table, parts):
+    """
+    Add up precinct x dimension counts of several years.
+
+    Parameters:
+    table (dict): Output of build_code_table, for the shape of the counts
+    parts (list): Outputs of split_region_marginals
+
+    Returns:
+    dict: Output of split_region_marginals
+    """
+    shape = table['shape']
+    total = split_region_marginals(
+        table, np.zeros(shape[0] * sum(shape[1:]), dtype=np.int64)
+    )
+    for part in parts:
+        for dimension, counts in part.items():
+            total[dimension] = total[dimension] + counts
+    return total
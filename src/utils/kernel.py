@@ -0,0 +1,681 @@
+import numpy as np
+import pandas as pd
+
+from src.data import borough_names, precinct_borough
+from .helpers import (
+    AGGREGATE_COLUMNS,
+    CROSSTAB_COLUMNS,
+    category_codes,
+    counts_frame,
+    location_lookup
+)
+from .spatial import area_rows, build_grid_index
+
+# Dimensions folded into the joint key, outermost first. Borough counts are
+# derived from the precinct axis through the precinct -> borough table.
+KEY_DIMENSIONS = ['precinct', 'offense', 'sex', 'age']
+
+# z value of a two-sided 95% confidence interval for estimated counts
+Z_95 = 1.96
+
+# Dimensions that only have their own code column, for cross-tabs
+CROSSTAB_DIMENSIONS = KEY_DIMENSIONS + ['race', 'law']
+
+
+def build_code_table(data, categories=None):
+    """
+    Precompute the integer columns used by the fused filter-and-count kernel.
+
+    Every row gets one joint key combining its precinct, offense, sex and age
+    group codes, so a single bincount gives the counts for all of them.
+    Missing values get their own trailing bin on each axis.
+
+    Parameters:
+    data (pd.DataFrame): Arrest data
+    categories (dict): Optional fixed labels per dimension, so that tables
+        built from different years share codes and their counts can be added
+
+    Returns:
+    dict: 'key', 'dates' and one code array per cross-tab dimension, aligned
+    with the rows, the 'labels' of every dimension, the 'shape' of the joint
+    count array, and a spatial 'grid' index over the arrest coordinates
+    """
+    codes = {'precinct': data['ARREST_PRECINCT'].to_numpy().astype(np.int32)}
+    labels = {'precinct': np.arange(len(precinct_borough))}
+    for dimension in CROSSTAB_DIMENSIONS[1:]:
+        dimension_codes, dimension_labels = category_codes(
+            data[CROSSTAB_COLUMNS[dimension]],
+            categories[dimension] if categories else None
+        )
+        # Move missing values (-1) to the extra trailing bin
+        dimension_codes = dimension_codes.astype(np.int32)
+        dimension_codes[dimension_codes < 0] = len(dimension_labels)
+        codes[dimension] = dimension_codes
+        labels[dimension] = np.asarray(dimension_labels)
+
+    shape = tuple(len(labels[dimension]) + 1 for dimension in KEY_DIMENSIONS)
+    key = np.zeros(len(data), dtype=np.int32)
+    for dimension, size in zip(KEY_DIMENSIONS, shape):
+        key *= size
+        key += codes[dimension]
+
+    return {
+        'key': key,
+        'dates': data['ARREST_DATE'].to_numpy().view('int64'),
+        **codes,
+        'labels': labels,
+        'shape': shape,
+        'grid': build_grid_index(data['X_COORD_CD'], data['Y_COORD_CD'])
+    }
+
+
+def kernel_mask(table, start_date=None, end_date=None, crime_types=None,
+                selected_locations=None, rows=slice(None)):
+    """
+    Build the filter mask from the precomputed integer columns.
+
+    Crime types and locations become small lookup tables indexed by code,
+    so each filter is one lookup per row. Returns None when nothing is
+    filtered.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    start_date (str): Start date of the range
+    end_date (str): End date of the range
+    crime_types (list): Crime types to filter by
+    selected_locations (list): The selected boroughs and/or precincts
+    rows (slice or np.ndarray): Rows of the table to filter
+
+    Returns:
+    np.ndarray: Boolean mask over the selected rows, or None
+    """
+    mask = None
+    if start_date and end_date:
+        dates = table['dates'][rows]
+        mask = (
+            (dates >= pd.Timestamp(start_date).value) &
+            (dates <= pd.Timestamp(end_date).value)
+        )
+
+    if crime_types:
+        # Trailing False entry for the missing-value bin
+        offense_lookup = np.append(
+            np.isin(table['labels']['offense'], list(crime_types)), False
+        )
+        crime_mask = offense_lookup[table['offense'][rows]]
+        mask = crime_mask if mask is None else mask & crime_mask
+
+    if selected_locations:
+        precinct_lookup = location_lookup(selected_locations)
+        location_mask = precinct_lookup[table['precinct'][rows]]
+        mask = location_mask if mask is None else mask & location_mask
+
+    return mask
+
+
+def fused_counts(table, mask=None, rows=slice(None), weights=None):
+    """
+    Count the filtered rows for every precinct, offense, sex and age group
+    combination in one bincount pass, without building a filtered frame.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    mask (np.ndarray): Optional mask from kernel_mask
+    rows (slice or np.ndarray): Rows of the table to count
+    weights (np.ndarray): Optional weight per row of the table, summed
+        instead of counting rows
+
+    Returns:
+    np.ndarray: Joint counts with shape table['shape']
+    """
+    key = table['key'][rows]
+    if weights is not None:
+        weights = weights[rows]
+    if mask is not None:
+        key = key[mask]
+        weights = weights[mask] if weights is not None else None
+    return np.bincount(
+        key, weights=weights, minlength=int(np.prod(table['shape']))
+    ).reshape(table['shape'])
+
+
+def joint_marginals(joint):
+    """
+    Sum joint counts down to one count array per dimension.
+
+    Parameters:
+    joint (np.ndarray): Joint counts from fused_counts
+
+    Returns:
+    np.ndarray: Per-dimension counts (missing-value bins included),
+    concatenated in KEY_DIMENSIONS order
+    """
+    return np.concatenate([
+        joint.sum(axis=tuple(i for i in range(joint.ndim) if i != axis))
+        for axis in range(joint.ndim)
+    ])
+
+
+def region_marginals(joint):
+    """
+    Sum joint counts down to precinct x offense, precinct x sex and
+    precinct x age group counts.
+
+    Parameters:
+    joint (np.ndarray): Joint counts from fused_counts
+
+    Returns:
+    np.ndarray: The three count matrices (missing-value bins included),
+    flattened and concatenated
+    """
+    return np.concatenate([
+        joint.sum(axis=(2, 3)).ravel(),
+        joint.sum(axis=(1, 3)).ravel(),
+        joint.sum(axis=(1, 2)).ravel()
+    ])
+
+
+def split_region_marginals(table, flat):
+    """
+    Turn the output of region_marginals back into count matrices.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    flat (np.ndarray): Output of region_marginals (or a sum of them)
+
+    Returns:
+    dict: Precinct x dimension counts for 'offense', 'sex' and 'age'
+    """
+    n_precincts = table['shape'][0]
+    regions = {}
+    offset = 0
+    for dimension, size in zip(KEY_DIMENSIONS[1:], table['shape'][1:]):
+        regions[dimension] = flat[offset:offset + n_precincts * size].reshape(
+            n_precincts, size
+        )
+        offset += n_precincts * size
+    return regions
+
+
+def marginals_from_regions(regions):
+    """
+    Sum precinct x dimension counts down to the output of joint_marginals.
+
+    Parameters:
+    regions (dict): Output of split_region_marginals
+
+    Returns:
+    np.ndarray: Per-dimension counts in KEY_DIMENSIONS order
+    """
+    return np.concatenate([
+        regions['sex'].sum(axis=1),
+        *(regions[dimension].sum(axis=0) for dimension in KEY_DIMENSIONS[1:])
+    ])
+
+
+def compact_aggregate(table, regions, variances=None):
+    """
+    Shrink precinct x dimension counts to a small JSON-friendly aggregate
+    that the dashboard keeps in a dcc.Store.
+
+    Only precincts with arrests are kept, and missing-value bins are dropped
+    from the offense, sex and age axes.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    regions (dict): Output of split_region_marginals
+    variances (dict): Variances of estimated counts, in the same layout as
+        regions. Estimates are rounded and marked as 'estimated'.
+
+    Returns:
+    dict: 'precinct' codes, their 'borough' names, the 'arrests' per
+    precinct, the 'labels' of each dimension and the 'counts' matrices
+    (and their 'variances' for estimates)
+    """
+    arrests = regions['sex'].sum(axis=1)
+    active = np.flatnonzero(arrests)
+    boroughs = precinct_borough[active] if len(active) else np.zeros(0, dtype=int)
+    compact = {
+        'precinct': active.tolist(),
+        'borough': [
+            borough_names[code] if code >= 0 else None for code in boroughs
+        ],
+        'arrests': np.rint(arrests[active]).astype(np.int64).tolist(),
+        'labels': {
+            dimension: table['labels'][dimension].tolist()
+            for dimension in KEY_DIMENSIONS[1:]
+        },
+        'counts': {
+            dimension: np.rint(counts[active, :-1]).astype(np.int64).tolist()
+            for dimension, counts in regions.items()
+        },
+        'estimated': variances is not None
+    }
+    if variances is not None:
+        compact['arrest_variances'] = variances['sex'].sum(axis=1)[active].tolist()
+        compact['variances'] = {
+            dimension: counts[active, :-1].tolist()
+            for dimension, counts in variances.items()
+        }
+    return compact
+
+
+def store_aggregates(compact, selected_locations=None):
+    """
+    Count arrests by borough, precinct, offense, sex and age group from a
+    compact aggregate, optionally for the selected locations only.
+
+    Parameters:
+    compact (dict): Output of compact_aggregate
+    selected_locations (list): The selected boroughs and/or precincts
+
+    Returns:
+    dict: Same layout as aggregate_arrests
+    """
+    precincts = np.asarray(compact['precinct'], dtype=np.int64)
+    arrests = np.asarray(compact['arrests'], dtype=np.int64)
+    keep = np.ones(len(precincts), dtype=bool)
+    if selected_locations:
+        keep = location_lookup(selected_locations)[precincts]
+
+    # Estimates carry variances, summed before taking the interval width
+    estimated = compact.get('estimated', False)
+    variances = {}
+    if estimated:
+        variances['precinct'] = np.asarray(compact['arrest_variances'])[keep]
+
+    def margins(dimension):
+        if not estimated:
+            return None
+        return Z_95 * np.sqrt(variances[dimension])
+
+    aggregates = {
+        'precinct': counts_frame(
+            AGGREGATE_COLUMNS['precinct'], precincts[keep], arrests[keep],
+            margins('precinct')
+        )
+    }
+    boroughs = pd.Series(compact['borough'], dtype=object)[keep].to_numpy()
+    borough_counts = pd.Series(arrests[keep]).groupby(boroughs).sum()
+    if estimated:
+        variances['borough'] = pd.Series(variances['precinct']).groupby(
+            boroughs
+        ).sum().to_numpy()
+    aggregates['borough'] = counts_frame(
+        AGGREGATE_COLUMNS['borough'],
+        borough_counts.index,
+        borough_counts.to_numpy(),
+        margins('borough')
+    )
+    for dimension in KEY_DIMENSIONS[1:]:
+        size = len(compact['labels'][dimension])
+        counts = np.asarray(compact['counts'][dimension], dtype=np.int64)
+        counts = (
+            counts[keep].sum(axis=0) if len(counts)
+            else np.zeros(size, dtype=np.int64)
+        )
+        if estimated:
+            dimension_variances = np.asarray(compact['variances'][dimension])
+            variances[dimension] = (
+                dimension_variances[keep].sum(axis=0)
+                if len(dimension_variances) else np.zeros(size)
+            )
+        aggregates[dimension] = counts_frame(
+            AGGREGATE_COLUMNS[dimension],
+            compact['labels'][dimension],
+            counts,
+            margins(dimension)
+        )
+    aggregates['total'] = int(arrests[keep].sum())
+    return aggregates
+
+
+def aggregates_from_marginals(table, marginals):
+    """
+    Turn per-dimension counts into the count tables used by the dashboard.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    marginals (np.ndarray): Output of joint_marginals
+
+    Returns:
+    dict: Same layout as aggregate_arrests
+    """
+    aggregates = {}
+    offset = 0
+    for dimension, size in zip(KEY_DIMENSIONS, table['shape']):
+        # Drop the missing-value bin
+        counts = marginals[offset:offset + size - 1]
+        offset += size
+        aggregates[dimension] = counts_frame(
+            AGGREGATE_COLUMNS[dimension],
+            table['labels'][dimension],
+            counts
+        )
+        if dimension == 'precinct':
+            known = precinct_borough >= 0
+            aggregates['borough'] = counts_frame(
+                AGGREGATE_COLUMNS['borough'],
+                borough_names,
+                np.bincount(
+                    precinct_borough[known],
+                    weights=counts[known],
+                    minlength=len(borough_names)
+                ).astype(np.int64)
+            )
+
+    aggregates['total'] = int(marginals[:table['shape'][0]].sum())
+    return aggregates
+
+
+def fused_aggregate(table, start_date=None, end_date=None, crime_types=None,
+                    selected_locations=None, area=None):
+    """
+    Filter and count arrests by borough, precinct, offense, sex and age group
+    in a single pass over the precomputed integer columns.
+
+    With an area filter only the rows returned by the spatial index are
+    filtered and counted.
+
+    Returns:
+    dict: Same layout as aggregate_arrests
+    """
+    rows = area_rows(table['grid'], area) if area else slice(None)
+    mask = kernel_mask(
+        table,
+        start_date=start_date,
+        end_date=end_date,
+        crime_types=crime_types,
+        selected_locations=selected_locations,
+        rows=rows
+    )
+    return aggregates_from_marginals(
+        table, joint_marginals(fused_counts(table, mask, rows))
+    )
+
+
+def fused_region_counts(table, start_date=None, end_date=None,
+                        crime_types=None, area=None):
+    """
+    Filter and count arrests by precinct x offense, precinct x sex and
+    precinct x age group in a single pass over the integer columns.
+
+    Returns:
+    dict: Output of split_region_marginals
+    """
+    rows = area_rows(table['grid'], area) if area else slice(None)
+    mask = kernel_mask(
+        table,
+        start_date=start_date,
+        end_date=end_date,
+        crime_types=crime_types,
+        rows=rows
+    )
+    return split_region_marginals(
+        table, region_marginals(fused_counts(table, mask, rows))
+    )
+
+
+def fused_region_rows(table, start_date=None, end_date=None,
+                      crime_types=None, area=None, rows=None):
+    """
+    Like fused_region_counts, but also return the rows that matched, and
+    optionally only look at the rows of an earlier, wider filter.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    start_date (str): Start date of the range
+    end_date (str): End date of the range
+    crime_types (list): Crime types to filter by
+    area (tuple): Area filter, see area_rows
+    rows (np.ndarray): Sorted rows to filter instead of the whole table
+
+    Returns:
+    tuple: (output of split_region_marginals, sorted np.ndarray of the
+    matching rows)
+    """
+    if area:
+        selected = area_rows(table['grid'], area)
+        if rows is not None:
+            selected = np.intersect1d(rows, selected, assume_unique=True)
+        rows = selected
+    elif rows is None:
+        rows = slice(None)
+    mask = kernel_mask(
+        table,
+        start_date=start_date,
+        end_date=end_date,
+        crime_types=crime_types,
+        rows=rows
+    )
+    if isinstance(rows, slice):
+        rows = (
+            np.arange(len(table['key'])) if mask is None
+            else np.flatnonzero(mask)
+        )
+    elif mask is not None:
+        rows = rows[mask]
+    regions = split_region_marginals(
+        table, region_marginals(fused_counts(table, rows=rows))
+    )
+    return regions, rows
+
+
+def period_labels(table, period, comparison_period, rows=slice(None)):
+    """
+    Label each row with the periods it falls in, so both periods of a
+    comparison can be counted in a single pass.
+
+    Labels are bit flags: 1 for the selected period, 2 for the comparison
+    period, 3 when the periods overlap and 0 for rows in neither.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    period (tuple): (start_date, end_date) of the selected period. Without
+        dates it covers every row, None covers none
+    comparison_period (tuple): Same for the comparison period
+    rows (slice or np.ndarray): Rows of the table to label
+
+    Returns:
+    np.ndarray: Period label per row
+    """
+    dates = table['dates'][rows]
+    labels = np.zeros(len(dates), dtype=np.int32)
+    for shift, dates_range in enumerate((period, comparison_period)):
+        if dates_range is None:
+            continue
+        start_date, end_date = dates_range
+        if start_date and end_date:
+            labels |= np.left_shift(
+                (dates >= pd.Timestamp(start_date).value) &
+                (dates <= pd.Timestamp(end_date).value),
+                shift,
+                dtype=np.int32
+            )
+        else:
+            labels |= 1 << shift
+    return labels
+
+
+def fused_period_region_counts(table, period, comparison_period,
+                               crime_types=None, area=None):
+    """
+    Filter and count arrests of a selected and a comparison period by
+    precinct x offense, precinct x sex and precinct x age group in one
+    bincount over (period label, joint key) pairs.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    period (tuple): See period_labels
+    comparison_period (tuple): See period_labels
+    crime_types (list): Crime types to filter by
+    area (tuple): Area filter, see area_rows
+
+    Returns:
+    tuple: (selected, comparison), each an output of split_region_marginals
+    """
+    rows = area_rows(table['grid'], area) if area else slice(None)
+    labels = period_labels(table, period, comparison_period, rows)
+    mask = kernel_mask(table, crime_types=crime_types, rows=rows)
+    if mask is not None:
+        labels *= mask
+
+    # The label picks one of four blocks of joint keys. Rows in neither
+    # period land in block 0, which is cheaper than dropping them first.
+    size = int(np.prod(table['shape']))
+    labels *= size
+    labels += table['key'][rows]
+    counts = np.bincount(labels, minlength=4 * size).reshape(
+        4, *table['shape']
+    )
+
+    # Rows labelled 3 are in both periods
+    return tuple(
+        split_region_marginals(
+            table, region_marginals(counts[bit] + counts[3])
+        )
+        for bit in (1, 2)
+    )
+
+
+def crosstab_matrix(table, row_dimension, column_dimension, mask=None,
+                    rows=slice(None)):
+    """
+    Count the filtered rows for every pair of codes of two dimensions with
+    one 2D bincount over their combined codes.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    row_dimension (str): Dimension on the rows, from CROSSTAB_DIMENSIONS
+    column_dimension (str): Dimension on the columns
+    mask (np.ndarray): Optional mask from kernel_mask
+    rows (slice or np.ndarray): Rows of the table to count
+
+    Returns:
+    np.ndarray: Counts with one row and column per label, missing values
+    left out
+    """
+    row_codes = table[row_dimension][rows]
+    column_codes = table[column_dimension][rows]
+    if mask is not None:
+        row_codes, column_codes = row_codes[mask], column_codes[mask]
+
+    # One extra bin per axis holds the missing values
+    n_rows = len(table['labels'][row_dimension]) + 1
+    n_columns = len(table['labels'][column_dimension]) + 1
+    return np.bincount(
+        row_codes.astype(np.int64) * n_columns + column_codes,
+        minlength=n_rows * n_columns
+    ).reshape(n_rows, n_columns)[:-1, :-1]
+
+
+def precinct_crosstab_matrix(table, row_dimension, column_dimension,
+                             mask=None, rows=slice(None)):
+    """
+    Count the filtered rows like crosstab_matrix, kept apart per precinct,
+    so a region selection only sums precincts instead of filtering the rows
+    again.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    row_dimension (str): Dimension on the rows, from CROSSTAB_DIMENSIONS
+    column_dimension (str): Dimension on the columns
+    mask (np.ndarray): Optional mask from kernel_mask
+    rows (slice or np.ndarray): Rows of the table to count
+
+    Returns:
+    np.ndarray: Counts by precinct code, row and column. With precincts on
+    the rows, the output of crosstab_matrix, which is already per precinct
+    """
+    if row_dimension == 'precinct':
+        return crosstab_matrix(table, row_dimension, column_dimension, mask, rows)
+
+    precinct_codes = table['precinct'][rows]
+    row_codes = table[row_dimension][rows]
+    column_codes = table[column_dimension][rows]
+    if mask is not None:
+        precinct_codes = precinct_codes[mask]
+        row_codes, column_codes = row_codes[mask], column_codes[mask]
+
+    # Precinct codes have no missing values, the other axes keep one extra
+    # bin for them
+    n_precincts = len(table['labels']['precinct'])
+    n_rows = len(table['labels'][row_dimension]) + 1
+    n_columns = len(table['labels'][column_dimension]) + 1
+    return np.bincount(
+        (precinct_codes.astype(np.int64) * n_rows + row_codes) * n_columns
+        + column_codes,
+        minlength=n_precincts * n_rows * n_columns
+    ).reshape(n_precincts, n_rows, n_columns)[:, :-1, :-1]
+
+
+def select_precincts(counts, row_dimension, selected_locations):
+    """
+    Sum the output of precinct_crosstab_matrix over the selected precincts.
+
+    Parameters:
+    counts (np.ndarray): Output of precinct_crosstab_matrix
+    row_dimension (str): Dimension on the rows
+    selected_locations (tuple): Borough names and/or precinct numbers, all
+    precincts when empty
+
+    Returns:
+    np.ndarray: Counts like crosstab_matrix for the selected precincts
+    """
+    if row_dimension == 'precinct':
+        if not selected_locations:
+            return counts
+        return counts * location_lookup(selected_locations)[:, None]
+    if not selected_locations:
+        return counts.sum(axis=0)
+    return counts[location_lookup(selected_locations)].sum(axis=0)
+
+
+def crosstab_from_matrix(table, row_dimension, column_dimension, counts):
+    """
+    Turn the output of crosstab_matrix (or a sum of them) into a cross-tab
+    of the rows and columns that have arrests, largest totals first.
+
+    Returns:
+    dict: 'counts' array for the rows and columns that have arrests, their
+    'labels' per dimension, the 'dimensions' and the 'total'
+    """
+    row_totals, column_totals = counts.sum(axis=1), counts.sum(axis=0)
+    row_order = np.argsort(-row_totals, kind='stable')[:np.count_nonzero(row_totals)]
+    column_order = np.argsort(-column_totals, kind='stable')[
+        :np.count_nonzero(column_totals)
+    ]
+
+    return {
+        'counts': counts[np.ix_(row_order, column_order)],
+        'labels': {
+            row_dimension: table['labels'][row_dimension][row_order],
+            column_dimension: table['labels'][column_dimension][column_order]
+        },
+        'dimensions': (row_dimension, column_dimension),
+        'total': int(counts.sum())
+    }
+
+
+def crosstab_counts(table, row_dimension, column_dimension, mask=None,
+                    rows=slice(None)):
+    """
+    Cross-tabulate two dimensions of the filtered rows with one 2D bincount
+    over their combined codes, instead of a pivot table.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    row_dimension (str): Dimension on the rows, from CROSSTAB_DIMENSIONS
+    column_dimension (str): Dimension on the columns
+    mask (np.ndarray): Optional mask from kernel_mask
+    rows (slice or np.ndarray): Rows of the table to count
+
+    Returns:
+    dict: Output of crosstab_from_matrix
+    """
+    return crosstab_from_matrix(
+        table,
+        row_dimension,
+        column_dimension,
+        crosstab_matrix(table, row_dimension, column_dimension, mask, rows)
+    )
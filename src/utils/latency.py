@@ -0,0 +1,79 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from .kernel import (
+    compact_aggregate,
+    crosstab_from_matrix,
+    crosstab_matrix,
+    fused_region_counts,
+    kernel_mask
+)
+
+
+def live_queries(table):
+    """
+    Representative filter combinations a live session sends: the full date
+    range, one year, the last quarter and a few crime types.
+
+    Parameters:
+    table (dict): Output of build_code_table
+
+    Returns:
+    list: Keyword arguments for fused_region_counts
+    """
+    first = pd.Timestamp(int(table['dates'].min()))
+    last = pd.Timestamp(int(table['dates'].max()))
+    # Most common crime types, leaving out the missing-value bin
+    labels = table['labels']['offense']
+    offenses = np.bincount(table['offense'], minlength=len(labels) + 1)[:-1]
+    top_offenses = labels[np.argsort(-offenses)[:3]].tolist()
+    year_start = max(first, last - pd.DateOffset(years=1))
+    return [
+        {},
+        {'start_date': str(first.date()), 'end_date': str(last.date())},
+        {'start_date': str(year_start.date()), 'end_date': str(last.date())},
+        {
+            'start_date': str((last - pd.DateOffset(months=3)).date()),
+            'end_date': str(last.date()),
+            'crime_types': top_offenses
+        },
+        {'crime_types': top_offenses[:1]}
+    ]
+
+
+def live_update_latency(table, repeats=3, render=None):
+    """
+    Time the server-side work behind one live update without the cache:
+    filter, count and compact the per-precinct aggregate and count the
+    default cross-tab. This is what the latency budget covers.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    repeats (int): Runs per query, the median is kept
+    render (callable): Optionally also called with the filters, the compact
+        aggregate and the cross-tab to build and encode the response, for
+        benchmarks that report the whole path
+
+    Returns:
+    float: Median milliseconds of the slowest query
+    """
+    slowest = 0.0
+    for filters in live_queries(table):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            aggregate = compact_aggregate(
+                table, fused_region_counts(table, **filters)
+            )
+            crosstab = crosstab_from_matrix(
+                table, 'precinct', 'race', crosstab_matrix(
+                    table, 'precinct', 'race', kernel_mask(table, **filters)
+                )
+            )
+            if render is not None:
+                render(filters, aggregate, crosstab)
+            times.append((time.perf_counter() - start) * 1000)
+        slowest = max(slowest, float(np.median(times)))
+    return slowest
@@ -0,0 +1,90 @@
+import os
+import resource
+import sys
+
+import numpy as np
+import pandas as pd
+import shapely
+
+
+def deep_size(obj):
+    """
+    Estimate the memory held by an object, including what it points to.
+
+    Parameters:
+    obj: DataFrame, GeoDataFrame, numpy array, dict/list of those, or any
+        other Python object
+
+    Returns:
+    int: Size in bytes
+    """
+    if isinstance(obj, pd.DataFrame):
+        size = int(obj.memory_usage(deep=True, index=True).sum())
+        # Geometry columns only report their pointers, add the coordinates
+        for column in obj.columns:
+            if str(obj[column].dtype) == 'geometry':
+                size += int(shapely.get_num_coordinates(obj[column].values).sum()) * 16
+        return size
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True, index=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(deep_size(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(deep_size(value) for value in obj)
+    return sys.getsizeof(obj)
+
+
+def rss_bytes(pid='self'):
+    """
+    Resident set size of a process, from /proc where available.
+
+    Parameters:
+    pid (int or str): Process id, 'self' for the current process
+
+    Returns:
+    int: Resident memory in bytes
+    """
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Peak RSS is the best portable fallback for the current process
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def worker_rss():
+    """
+    Resident memory of this worker and its sibling workers (processes with
+    the same parent, e.g. gunicorn workers). Only this process is reported
+    where /proc is not available.
+
+    Returns:
+    dict: {pid: resident bytes}
+    """
+    workers = {os.getpid(): rss_bytes()}
+    parent = os.getppid()
+    try:
+        pids = [int(pid) for pid in os.listdir('/proc') if pid.isdigit()]
+        with open('/proc/self/cmdline', 'rb') as cmdline:
+            command = cmdline.read()
+    except OSError:
+        return workers
+
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat') as stat:
+                # The parent pid is the 2nd field after the command name
+                fields = stat.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{pid}/cmdline', 'rb') as cmdline:
+                same_command = cmdline.read() == command
+            if int(fields[1]) == parent and same_command and pid not in workers:
+                workers[pid] = rss_bytes(pid)
+        except (OSError, IndexError, ValueError):
+            continue
+    return workers
@@ -0,0 +1,232 @@
+import atexit
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from .kernel import (
+    aggregates_from_marginals,
+    fused_counts,
+    kernel_mask,
+    marginals_from_regions,
+    region_marginals,
+    split_region_marginals
+)
+
+# Shared state, set up by start_pool before the worker processes are forked.
+# The code table lives in shared memory sorted by month, so every partition
+# is a contiguous row range and workers never receive pickled DataFrames.
+_pool = None
+_source = None         # Code table the pool was started on
+_table = None          # Month-sorted code table from build_code_table
+_partitions = None     # [start, stop) row range per month
+_month_bounds = None   # [first, last] nanosecond per month
+_output = None         # (slots, partitions, bins) partial counts
+_free_slots = None
+_segments = []
+_settings = {}         # workers and slots of the running pool
+
+
+def _shared_array(array):
+    """Copy an array into a new shared memory block and return a view of it."""
+    segment = SharedMemory(create=True, size=max(array.nbytes, 1))
+    _segments.append(segment)
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)
+    shared[...] = array
+    return shared
+
+
+def _release_shared_memory():
+    for segment in _segments:
+        segment.close()
+        segment.unlink()
+    _segments.clear()
+
+
+def start_pool(table, workers, slots=4):
+    """
+    Partition the arrest code table by month and start a process pool that
+    counts the partitions in parallel.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    workers (int): Number of worker processes
+    slots (int): Number of aggregations that can run at the same time
+    """
+    global _pool, _source, _table, _partitions, _month_bounds, _output
+    global _free_slots
+
+    if not _settings:
+        atexit.register(_shutdown_pool)
+    _settings.update(workers=workers, slots=slots)
+
+    # Sort rows by month so that each partition is a contiguous range
+    months = table['dates'].view('datetime64[ns]').astype('datetime64[M]')
+    order = np.argsort(months, kind='stable')
+    unique_months, starts = np.unique(months[order], return_index=True)
+    _partitions = np.column_stack([starts, np.append(starts[1:], len(order))])
+    _month_bounds = np.column_stack([
+        unique_months.astype('datetime64[ns]').view('int64'),
+        (unique_months + 1).astype('datetime64[ns]').view('int64') - 1
+    ])
+
+    _source = table
+    _table = {
+        name: _shared_array(table[name][order])
+        for name in ('key', 'dates', 'offense', 'precinct')
+    }
+    _table['labels'] = table['labels']
+    _table['shape'] = table['shape']
+
+    # Partitions return precinct x offense/sex/age counts, which also give
+    # the per-dimension totals
+    shape = table['shape']
+    _output = _shared_array(np.zeros(
+        (slots, len(_partitions), shape[0] * sum(shape[1:])), dtype=np.int64
+    ))
+    _free_slots = queue.Queue()
+    for slot in range(slots):
+        _free_slots.put(slot)
+
+    # Fork the workers now, while the shared state is in place
+    _pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('fork')
+    )
+    list(_pool.map(int, range(workers)))
+
+
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown()
+    _release_shared_memory()
+
+
+def restart_pool(table):
+    """
+    Wait for the running aggregations, stop the process pool, release its
+    shared memory and start it again with the same settings on another code
+    table.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    """
+    global _pool
+    # Every running aggregation holds a slot until it has read its counts
+    for _ in range(_settings['slots']):
+        _free_slots.get()
+    _pool.shutdown()
+    _pool = None
+    _release_shared_memory()
+    start_pool(table, **_settings)
+
+
+def pool_started():
+    """Whether parallel aggregation is enabled."""
+    return _pool is not None
+
+
+def _count_partition(slot, partition, filters):
+    """
+    Count one month partition into its row of the shared count array.
+
+    Runs in a worker process.
+    """
+    rows = slice(*_partitions[partition])
+    mask = kernel_mask(_table, **filters, rows=rows)
+    _output[slot, partition] = region_marginals(fused_counts(_table, mask, rows))
+    return partition
+
+
+def _parallel_counts(start_date=None, end_date=None, crime_types=None,
+                     selected_locations=None, table=None):
+    """
+    Count the month partitions in the process pool and sum their counts.
+
+    Months outside the date range are skipped, and months fully inside it
+    are counted without checking dates.
+
+    Returns:
+    dict: Output of split_region_marginals, or None when the pool no longer
+    holds the given code table
+    """
+    filters = {
+        'crime_types': list(crime_types) if crime_types else None,
+        'selected_locations': (
+            list(selected_locations) if selected_locations else None
+        )
+    }
+    date_range = None
+    if start_date and end_date:
+        date_range = (
+            pd.Timestamp(start_date).value,
+            pd.Timestamp(end_date).value
+        )
+
+    slot = _free_slots.get()
+    # The pool may have been restarted on new data while this query waited
+    if table is not None and table is not _source:
+        _free_slots.put(slot)
+        return None
+    try:
+        futures = []
+        for partition, (first, last) in enumerate(_month_bounds):
+            partition_filters = filters
+            if date_range is not None:
+                if last < date_range[0] or first > date_range[1]:
+                    continue
+                if first < date_range[0] or last > date_range[1]:
+                    partition_filters = {
+                        **filters,
+                        'start_date': start_date,
+                        'end_date': end_date
+                    }
+            futures.append(_pool.submit(
+                _count_partition, slot, partition, partition_filters
+            ))
+        partitions = [future.result() for future in futures]
+        counts = _output[slot, partitions].sum(axis=0)
+    finally:
+        _free_slots.put(slot)
+
+    return split_region_marginals(_table, counts)
+
+
+def parallel_aggregate(start_date=None, end_date=None, crime_types=None,
+                       selected_locations=None, table=None):
+    """
+    Count arrests by borough, precinct, offense, sex and age group, one
+    month partition per task in the process pool.
+
+    Parameters:
+    table (dict): Optional code table the counts must come from
+
+    Returns:
+    dict: Same layout as aggregate_arrests, or None when the pool no longer
+    holds the table
+    """
+    regions = _parallel_counts(
+        start_date, end_date, crime_types, selected_locations, table
+    )
+    if regions is None:
+        return None
+    return aggregates_from_marginals(_table, marginals_from_regions(regions))
+
+
+def parallel_region_counts(start_date=None, end_date=None, crime_types=None,
+                           table=None):
+    """
+    Count arrests by precinct x offense, precinct x sex and precinct x age
+    group, one month partition per task in the process pool.
+
+    Parameters:
+    table (dict): Optional code table the counts must come from
+
+    Returns:
+    dict: Output of split_region_marginals, or None when the pool no longer
+    holds the table
+    """
+    return _parallel_counts(start_date, end_date, crime_types, table=table)
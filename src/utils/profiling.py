@@ -0,0 +1,72 @@
+import collections
+import sys
+import threading
+
+
+def collapse_stack(frame, root=None):
+    """
+    Turn a frame and its callers into one line of a folded stack file.
+
+    Parameters:
+    frame (frame): Innermost frame
+    root (str): Optional name to put at the bottom of the stack
+
+    Returns:
+    str: Frames from outermost to innermost, joined by ';'
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get('__name__', code.co_filename)
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    if root:
+        names.append(root)
+    return ';'.join(reversed(names))
+
+
+class StackSampler(threading.Thread):
+    """
+    Sample the stack of one thread at a fixed interval.
+
+    Only the sampler thread does any work, the profiled code runs unchanged.
+    """
+
+    def __init__(self, thread_id, interval=0.002, root=None):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root = root
+        self.stacks = collections.Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame, self.root)] += 1
+
+    def stop(self):
+        """
+        Stop sampling.
+
+        Returns:
+        collections.Counter: Number of samples per collapsed stack
+        """
+        self._done.set()
+        self.join()
+        return self.stacks
+
+
+def write_folded(stacks, path):
+    """
+    Write sampled stacks in the folded format read by flamegraph.pl and
+    speedscope: one 'frame;frame;frame count' line per stack.
+
+    Parameters:
+    stacks (collections.Counter): Output of StackSampler.stop
+    path (str): File to write
+    """
+    with open(path, 'w') as file:
+        for stack, count in stacks.most_common():
+            file.write(f"{stack} {count}\n")
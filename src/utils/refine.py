@@ -0,0 +1,100 @@
+import collections
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+def is_narrower(filters, previous):
+    """
+    Whether every row matching filters also matches previous filters, so
+    the new query only needs to look at the rows of the previous one.
+
+    Parameters:
+    filters (tuple): (start_date, end_date, crime_types, area), normalized
+    previous (tuple): The same for the earlier query
+
+    Returns:
+    bool: True when filters select a subset of the previous rows
+    """
+    start_date, end_date, crime_types, area = filters
+    previous_start, previous_end, previous_crimes, previous_area = previous
+
+    # A range inside the previous one, or no previous range at all
+    if previous_start and previous_end:
+        if not (start_date and end_date):
+            return False
+        if pd.Timestamp(start_date) < pd.Timestamp(previous_start):
+            return False
+        if pd.Timestamp(end_date) > pd.Timestamp(previous_end):
+            return False
+
+    # Some of the previous crime types, or no previous crime filter
+    if previous_crimes:
+        if not crime_types or not set(crime_types) <= set(previous_crimes):
+            return False
+
+    # Areas are only compared for equality
+    if previous_area and tuple(area or ()) != tuple(previous_area):
+        return False
+    return True
+
+
+class SessionRows:
+    """
+    The rows matched by each session's last query, so the next, narrower
+    query of that session only filters those rows.
+
+    Sessions are evicted least recently used first once the stored rows take
+    more than max_bytes, or there are more than max_sessions. Entries of an
+    older data version are never used.
+    """
+
+    def __init__(self, max_bytes, max_sessions=1024):
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.entries = collections.OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, session, version, filters):
+        """
+        Get the rows of the session's last query if filters narrow it.
+
+        Returns:
+        np.ndarray: Sorted rows, or None
+        """
+        with self.lock:
+            entry = self.entries.get(session)
+            if entry is None or entry['version'] != version:
+                return None
+            self.entries.move_to_end(session)
+        if not is_narrower(filters, entry['filters']):
+            return None
+        return entry['rows']
+
+    def put(self, session, version, filters, rows):
+        """Store the rows of the session's last query, replacing its entry."""
+        rows = rows.astype(np.int32)
+        with self.lock:
+            self._drop(session)
+            if rows.nbytes > self.max_bytes:
+                return
+            self.entries[session] = {
+                'version': version, 'filters': filters, 'rows': rows
+            }
+            self.bytes += rows.nbytes
+            while (self.bytes > self.max_bytes or
+                   len(self.entries) > self.max_sessions):
+                _, entry = self.entries.popitem(last=False)
+                self.bytes -= entry['rows'].nbytes
+
+    def forget(self, session):
+        """Drop the session's entry."""
+        with self.lock:
+            self._drop(session)
+
+    def _drop(self, session):
+        entry = self.entries.pop(session, None)
+        if entry is not None:
+            self.bytes -= entry['rows'].nbytes
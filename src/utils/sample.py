@@ -0,0 +1,86 @@
+import numpy as np
+
+from .kernel import (
+    fused_counts,
+    kernel_mask,
+    region_marginals,
+    split_region_marginals
+)
+
+
+def build_sample(table, fraction=0.02, min_rows=20, seed=0):
+    """
+    Draw a stratified sample of the code table for approximate answers.
+
+    Strata are precinct x month, so every precinct and month is represented.
+    Each row is kept with its stratum's inclusion probability: `fraction`,
+    raised so that small strata keep about `min_rows` rows. Rows carry the
+    inverse of that probability as their weight.
+
+    Parameters:
+    table (dict): Output of build_code_table
+    fraction (float): Share of rows to keep in large strata
+    min_rows (int): Rows to keep per stratum, where it has that many
+    seed (int): Seed of the random draw
+
+    Returns:
+    dict: Sampled 'key', 'dates', 'offense' and 'precinct' arrays, their
+    'weights', and the 'labels' and 'shape' of the table
+    """
+    months = table['dates'].view('datetime64[ns]').astype('datetime64[M]')
+    month_codes = (months - months.min()).astype(np.int64)
+    strata = (
+        table['precinct'].astype(np.int64) * (int(month_codes.max()) + 1) +
+        month_codes
+    )
+
+    sizes = np.bincount(strata)
+    probability = np.minimum(
+        np.maximum(fraction, min_rows / np.maximum(sizes, 1)), 1.0
+    )
+    keep = np.random.default_rng(seed).random(len(strata)) < probability[strata]
+
+    sample = {
+        name: table[name][keep]
+        for name in ('key', 'dates', 'offense', 'precinct')
+    }
+    sample['weights'] = 1.0 / probability[strata[keep]]
+    sample['labels'] = table['labels']
+    sample['shape'] = table['shape']
+    return sample
+
+
+def estimate_region_counts(sample, start_date=None, end_date=None,
+                           crime_types=None):
+    """
+    Estimate precinct x offense/sex/age group counts from the sample.
+
+    Counts are weighted bincounts of the sampled rows. Their variance uses
+    the Horvitz-Thompson estimator for independently drawn rows, the sum of
+    w * (w - 1) over the counted rows.
+
+    Returns:
+    tuple: (estimated counts, variances), each an output of
+    split_region_marginals
+    """
+    mask = kernel_mask(
+        sample,
+        start_date=start_date,
+        end_date=end_date,
+        crime_types=crime_types
+    )
+    weights = sample['weights']
+    estimates = fused_counts(sample, mask, weights=weights)
+    variances = fused_counts(sample, mask, weights=weights * (weights - 1))
+    return (
+        split_region_marginals(sample, region_marginals(estimates)),
+        split_region_marginals(sample, region_marginals(variances))
+    )
+
+
+def estimated_rows(sample, start_date=None, end_date=None):
+    """Estimated number of arrest rows in a date range."""
+    if not (start_date and end_date):
+        return float(sample['weights'].sum())
+    mask = kernel_mask(sample, start_date=start_date, end_date=end_date)
+    return float(sample['weights'][mask].sum())
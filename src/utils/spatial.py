@@ -0,0 +1,128 @@
+import numpy as np
+
+# Arrest coordinates are in state-plane feet
+FEET_PER_METRE = 3.28084
+
+
+def build_grid_index(x, y, cell_size=1000):
+    """
+    Build a uniform grid index over point coordinates.
+
+    Rows are sorted by grid cell (row-major), so the rows of a run of
+    neighbouring cells in one grid row are one contiguous slice of the index.
+    Rows without coordinates are left out.
+
+    Parameters:
+    x (np.ndarray): X coordinate of each row
+    y (np.ndarray): Y coordinate of each row
+    cell_size (float): Width of a grid cell, in the units of x and y
+
+    Returns:
+    dict: The sorted row positions, the start of each cell in them, the grid
+    geometry and the coordinates
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if len(valid) == 0:
+        valid_x = valid_y = np.zeros(1)
+    else:
+        valid_x, valid_y = x[valid], y[valid]
+
+    x0, y0 = valid_x.min(), valid_y.min()
+    n_cols = int((valid_x.max() - x0) // cell_size) + 1
+    n_rows = int((valid_y.max() - y0) // cell_size) + 1
+
+    cells = (
+        ((y[valid] - y0) // cell_size).astype(np.int64) * n_cols +
+        ((x[valid] - x0) // cell_size).astype(np.int64)
+    )
+    order = valid[np.argsort(cells, kind='stable')]
+    starts = np.concatenate([
+        [0], np.cumsum(np.bincount(cells, minlength=n_cols * n_rows))
+    ])
+
+    return {
+        'order': order,
+        'starts': starts,
+        'x0': x0,
+        'y0': y0,
+        'cell_size': cell_size,
+        'n_cols': n_cols,
+        'n_rows': n_rows,
+        'x': x,
+        'y': y
+    }
+
+
+def _box_candidates(index, x_min, y_min, x_max, y_max):
+    """Rows in the grid cells overlapping a box (a superset of the answer)."""
+    cell_size = index['cell_size']
+    col_min = max(int((x_min - index['x0']) // cell_size), 0)
+    col_max = min(int((x_max - index['x0']) // cell_size), index['n_cols'] - 1)
+    row_min = max(int((y_min - index['y0']) // cell_size), 0)
+    row_max = min(int((y_max - index['y0']) // cell_size), index['n_rows'] - 1)
+    if col_min > col_max or row_min > row_max:
+        return np.zeros(0, dtype=index['order'].dtype)
+
+    # One contiguous slice of the index per grid row
+    starts = index['starts']
+    first = np.arange(row_min, row_max + 1) * index['n_cols']
+    return np.concatenate([
+        index['order'][starts[cell + col_min]:starts[cell + col_max + 1]]
+        for cell in first
+    ])
+
+
+def box_query(index, x_min, y_min, x_max, y_max):
+    """
+    Find the rows inside a bounding box.
+
+    Parameters:
+    index (dict): Output of build_grid_index
+    x_min, y_min, x_max, y_max (float): Box corners
+
+    Returns:
+    np.ndarray: Sorted positions of the rows inside the box
+    """
+    rows = _box_candidates(index, x_min, y_min, x_max, y_max)
+    x, y = index['x'][rows], index['y'][rows]
+    inside = (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)
+    return np.sort(rows[inside])
+
+
+def radius_query(index, x, y, radius):
+    """
+    Find the rows within a distance of a point.
+
+    Parameters:
+    index (dict): Output of build_grid_index
+    x, y (float): Centre of the circle
+    radius (float): Radius, in the units of the coordinates
+
+    Returns:
+    np.ndarray: Sorted positions of the rows inside the circle
+    """
+    rows = _box_candidates(index, x - radius, y - radius, x + radius, y + radius)
+    dx, dy = index['x'][rows] - x, index['y'][rows] - y
+    return np.sort(rows[dx * dx + dy * dy <= radius * radius])
+
+
+def area_rows(index, area):
+    """
+    Run the query for an area filter.
+
+    Parameters:
+    index (dict): Output of build_grid_index
+    area (tuple): ('radius', x, y, metres) or ('box', x_min, y_min, x_max,
+        y_max), with coordinates in state-plane feet
+
+    Returns:
+    np.ndarray: Sorted positions of the rows inside the area
+    """
+    if area[0] == 'radius':
+        _, x, y, metres = area
+        return radius_query(index, x, y, metres * FEET_PER_METRE)
+    if area[0] == 'box':
+        return box_query(index, *area[1:])
+    raise ValueError(f"Unknown area type: {area[0]}")
@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+# The app reads the processed data on import
+if not os.path.exists("data/processed/arrest_data.parquet"):
+    pytest.skip("processed arrest data is missing", allow_module_level=True)
+
+from src.cache import LIVE_BUDGET_MS, current_snapshot
+from src.utils import live_update_latency
+
+
+def test_live_updates_meet_budget():
+    latency = live_update_latency(current_snapshot().codes)
+    assert latency <= LIVE_BUDGET_MS, (
+        f"live update aggregation takes {latency:.1f} ms, "
+        f"over the {LIVE_BUDGET_MS:.0f} ms budget"
+    )